@@ -1,27 +1,80 @@
+import argparse
 import pymysql
-from config import MYSQL_CONFIG
-from mongo_logger import connect_mongo, log_query, show_most_popular_queries, show_last_unique_queries
-import time
+from config import PAGINATION_CONFIG, STREAMING_CONFIG
+from mysql_connector import show_pool_stats
+from pagination import FilmPager
+from result_cache import show_cache_stats
+from mongo_logger import show_log_buffer_stats, show_most_popular_queries, show_last_unique_queries
+from startup import Backends
+
+from film_details import show_details_stats
+from instrumentation import metrics, show_metrics
+from log_retention import show_query_type_stats
+from slow_queries import show_slow_query_report
+from prefix_index import completion
+from formatter import (print_films, print_films_stream, select_film, select_film_by_ids,  # импорт из formatter.py
+                       open_film_details, prefetch_details, print_facets)
+
+
+def stream_results(service, query_type, parameters):
+    """
+    Потоковый вывод результата поиска без загрузки его целиком в память и
+    выбор фильма из выведенных. Возвращает число найденных строк.
+    """
+    rows = service.stream(query_type, parameters)
+    try:
+        film_ids = print_films_stream(rows, group_by='year',
+                                      lookahead=STREAMING_CONFIG['lookahead'],
+                                      chunk_size=STREAMING_CONFIG['chunk_size'])
+    finally:
+        rows.close()  # освобождаем соединение, даже если вывод прерван
+    if film_ids:
+        print(f"\nВсего найдено: {len(film_ids)}")
+        select_film_by_ids(service.pool, film_ids, details=service.details,
+                           titles=service.reference.titles)
+    return len(film_ids)
+
+
+def narrow_results(service, query_type, results, group_by='year'):
+    """
+    Показывает фасеты результата и позволяет сузить его по жанру, году или
+    рейтингу в памяти, без повторного запроса. Возвращает итоговые строки.
+    """
+    if service.facets is None:
+        return results
 
-from formatter import print_films, select_film, show_film_details  # импорт из formatter.py
+    while True:
+        with metrics.span(query_type, "facets"):
+            facets = service.facet_counts(results)
+        print()
+        print_facets(facets)
+        choice = input("\nУточнить по жанру, году или рейтингу (Enter — к выбору фильма): ").strip()
+        if not choice:
+            return results
+
+        if choice.isdigit():
+            filters = {"year": int(choice)}
+        elif choice.upper() in service.ratings():
+            filters = {"rating": choice}
+        else:
+            filters = {"genre": choice}
+        try:
+            with metrics.span(query_type, "facets"):
+                narrowed = service.refine(results, **filters)
+        except ValueError as e:
+            print(e)
+            continue
 
+        if not narrowed:
+            print("После уточнения ничего не осталось.")
+            continue
+        results = narrowed
+        print(f"\nОсталось {len(results)} фильмов:")
+        with metrics.span(query_type, "format"):
+            print_films(results, group_by=group_by)
 
-def connect_mysql():
-    try:
-        connection = pymysql.connect(
-            host=MYSQL_CONFIG['host'],
-            user=MYSQL_CONFIG['user'],
-            password=MYSQL_CONFIG['password'],
-            database=MYSQL_CONFIG['database'],
-            cursorclass=pymysql.cursors.DictCursor
-        )
-        return connection
-    except pymysql.MySQLError as e:
-        print(f"Ошибка подключения к MySQL: {e}")
-        return None
-
-
-def search_by_title(cursor, mongo_db):
+
+def search_by_title(service):
     while True:
         keyword = input("Введите ключевое слово для поиска в названии фильма (или 'b' для возврата): ").strip()
         if keyword.lower() in ('b', 'back', 'q'):
@@ -30,32 +83,19 @@ def search_by_title(cursor, mongo_db):
             print("Пустой ввод. Попробуйте снова.")
             continue
 
-        start_time = time.time()
-
-        query = """
-            SELECT f.film_id, f.title, f.release_year, f.rating, c.name AS genre
-            FROM film f
-            JOIN film_category fc ON f.film_id = fc.film_id
-            JOIN category c ON fc.category_id = c.category_id
-            WHERE f.title LIKE %s
-            ORDER BY f.release_year, f.title;
-        """
-        cursor.execute(query, (f"%{keyword}%",))
-        results = cursor.fetchall()
-
-        duration = time.time() - start_time
-
-        try:
-            if mongo_db is not None:
-                log_query(mongo_db, "title", {"keyword": keyword}, len(results), duration)
-        except Exception as e:
-            print(f"Ошибка логирования запроса в MongoDB: {e}")
-
-        if results:
-            print(f"\nНайдено {len(results)} фильмов по запросу '{keyword}':")
-            print_films(results, group_by='year')
-            select_film(cursor, results)
+        if STREAMING_CONFIG['enabled']:
+            found = stream_results(service, "title", {"keyword": keyword})
         else:
+            results = service.search_title(keyword).rows
+            found = len(results)
+            if results:
+                print(f"\nНайдено {len(results)} фильмов по запросу '{keyword}':")
+                with metrics.span("title", "format"):
+                    print_films(results, group_by='year')
+                results = narrow_results(service, "title", results)
+                select_film(service.pool, results, details=service.details)
+
+        if not found:
             print(f"Ничего не найдено по запросу '{keyword}'.")
 
         again = input("\nВыполнить ещё поиск в этом меню? (y — да, любая другая — возврат): ").strip().lower()
@@ -63,21 +103,17 @@ def search_by_title(cursor, mongo_db):
             return
 
 
-def search_by_genre_and_year(cursor, mongo_db):
-    cursor.execute("SELECT DISTINCT name FROM category ORDER BY name;")
-    genres = [row['name'] for row in cursor.fetchall()]
+def search_by_genre_and_year(service):
+    genres, min_year, max_year = service.genres_and_years()
 
     print("\nДоступные жанры:")
     print(', '.join(genres))
 
-    cursor.execute("SELECT MIN(release_year) AS min_year, MAX(release_year) AS max_year FROM film;")
-    year_range = cursor.fetchone()
-    min_year, max_year = year_range['min_year'], year_range['max_year']
-
     print(f"\nДоступный диапазон лет: от {min_year} до {max_year}\n")
 
     while True:
-        genre = input("Введите жанр (или 'b' для возврата): ").strip()
+        with completion(service.reference.genre_index):
+            genre = input("Введите жанр (Tab — дополнить, 'b' — возврат): ").strip()
         if genre.lower() in ('b', 'back', 'q'):
             return
 
@@ -102,33 +138,28 @@ def search_by_genre_and_year(cursor, mongo_db):
             print(f"Годы должны быть в диапазоне от {min_year} до {max_year}. Попробуйте снова.\n")
             continue
 
-        start_time = time.time()
-
-        query = """
-                SELECT f.film_id, f.title, f.release_year, f.rating, c.name AS genre
-                FROM film f
-                         JOIN film_category fc ON f.film_id = fc.film_id
-                         JOIN category c ON fc.category_id = c.category_id
-                WHERE c.name LIKE %s
-                  AND f.release_year BETWEEN %s AND %s
-                ORDER BY f.release_year, f.title;
-                """
-        cursor.execute(query, (f"%{genre}%", year_from, year_to))
-        results = cursor.fetchall()
-
-        duration = time.time() - start_time
-
-        try:
-            if mongo_db is not None:
-                log_query(mongo_db, "genre_year", {"genre": genre, "year_from": year_from, "year_to": year_to},
-                          len(results), duration)
-        except Exception as e:
-            print(f"Ошибка логирования запроса в MongoDB: {e}")
+        matches = service.reference.match_genres(genre)
+        if not matches:
+            print("Такого жанра нет в списке. Попробуйте снова.\n")
+            continue
+        if len(matches) > 1:
+            print(f"Под ввод подходит несколько жанров: {', '.join(m.name for m in matches)}. Уточните.\n")
+            continue
+        genre = matches[0].name
 
-        if results:
-            print_films(results, group_by='year')
-            select_film(cursor, results)
+        if STREAMING_CONFIG['enabled']:
+            found = stream_results(service, "genre_year",
+                                   {"genre": genre, "year_from": year_from, "year_to": year_to})
         else:
+            results = service.search_genre_year(genre, year_from, year_to).rows
+            found = len(results)
+            if results:
+                with metrics.span("genre_year", "format"):
+                    print_films(results, group_by='year')
+                results = narrow_results(service, "genre_year", results)
+                select_film(service.pool, results, details=service.details)
+
+        if not found:
             print("Ничего не найдено по заданным параметрам.")
 
         again = input("\nИскать снова? (y — да, любая другая — возврат в меню): ").strip().lower()
@@ -136,38 +167,55 @@ def search_by_genre_and_year(cursor, mongo_db):
             return
 
 
-def show_films_with_pagination(cursor, mongo_db):
-    page_size = 10
+def show_films_with_pagination(service, page_size=None):
+    page_size = page_size or service.page_size
+    pager = FilmPager(
+        service.pool,
+        page_size=page_size,
+        cache_pages=PAGINATION_CONFIG['cache_pages'],
+        prefetch=PAGINATION_CONFIG['prefetch'],
+        cache=service.cache,
+    )
+    try:
+        _paginate(pager, service)
+    finally:
+        pager.close()
+
+
+def _paginate(pager, service):
+    page_size = pager.page_size
     page = 0
 
     while True:
         offset = page * page_size
-        start_time = time.time()
+        trace = metrics.trace("pagination")
 
-        query = """
-            SELECT f.film_id, f.title, f.release_year, f.rating, c.name AS genre
-            FROM film f
-            JOIN film_category fc ON f.film_id = fc.film_id
-            JOIN category c ON fc.category_id = c.category_id
-            ORDER BY f.release_year, f.title
-            LIMIT %s OFFSET %s;
-        """
-        cursor.execute(query, (page_size, offset))
-        results = cursor.fetchall()
+        with trace.span("fetch"):
+            results, cache_hit = pager.get_page(page)
 
-        duration = time.time() - start_time
+        duration = trace.elapsed()
 
         try:
-            if mongo_db is not None:
-                log_query(mongo_db, "pagination", {"page_size": page_size, "page": page + 1}, len(results), duration)
+            with trace.span("log"):
+                service.log("pagination", {"page_size": page_size, "page": page + 1}, len(results), duration,
+                            cache_hit=cache_hit, stages=trace.stages_ms(),
+                            statement=None if cache_hit else pager.statement(page))
         except Exception as e:
             print(f"Ошибка логирования запроса в MongoDB: {e}")
 
         if not results:
+            trace.finish(total=duration)
             print("Достигнут конец списка фильмов.")
             return
 
-        print_films(results, group_by='year', start_index=offset + 1)
+        with trace.span("format"):
+            print_films(results, group_by='year', start_index=offset + 1)
+        trace.finish(total=duration)
+        prefetch_details(service.pool, service.details, [film.film_id for film in results])
+
+        # Пока пользователь читает текущую страницу, следующая загружается в фоне
+        if len(results) == page_size:
+            pager.prefetch(page + 1)
 
         print("\nНавигация:")
         print("Введите номер фильма для просмотра деталей.")
@@ -189,9 +237,9 @@ def show_films_with_pagination(cursor, mongo_db):
         elif action.isdigit():
             idx = int(action) - (offset + 1)
             if 0 <= idx < len(results):
-                film_id = results[idx]['film_id']
+                film_id = results[idx].film_id
                 try:
-                    show_film_details(cursor, film_id)
+                    open_film_details(service.pool, film_id, service.details)
                 except Exception as e:
                     print(f"Ошибка при показе деталей фильма: {e}")
                 # После показа деталей — НЕ выводим список повторно, просто ждем следующее действие
@@ -202,112 +250,213 @@ def show_films_with_pagination(cursor, mongo_db):
             print("Некорректный ввод. Попробуйте снова.")
 
 
-def search_by_rating(cursor, mongo_db):
-    print("\nДоступные рейтинги: G, PG, PG-13, R, NC-17")
-    valid_ratings = {'G', 'PG', 'PG-13', 'R', 'NC-17'}
+def search_by_rating(service):
+    ratings = service.ratings()
+    print(f"\nДоступные рейтинги: {', '.join(ratings)}")
 
     while True:
         rating = input("Введите рейтинг (или 'b' для возврата): ").strip().upper()
         if rating.lower() in ('b', 'back', 'q'):
             return
 
-        if rating not in valid_ratings:
+        if rating not in ratings:
             print("Недопустимый рейтинг. Попробуйте снова.")
             continue
 
-        start_time = time.time()
+        if STREAMING_CONFIG['enabled']:
+            found = stream_results(service, "rating", {"rating": rating})
+        else:
+            results = service.search_rating(rating).rows
+            found = len(results)
+            if results:
+                with metrics.span("rating", "format"):
+                    print_films(results, group_by='year')
+                results = narrow_results(service, "rating", results)
+                select_film(service.pool, results, details=service.details)
+
+        if not found:
+            print(f"Фильмы с рейтингом {rating} не найден")
 
-        query = """
-            SELECT f.film_id, f.title, f.release_year, f.rating, c.name AS genre
-            FROM film f
-            JOIN film_category fc ON f.film_id = fc.film_id
-            JOIN category c ON fc.category_id = c.category_id
-            WHERE f.rating = %s
-            ORDER BY f.release_year, f.title;
-        """
-        cursor.execute(query, (rating,))
-        results = cursor.fetchall()
+        again = input("\nИскать снова? (y — да, любая другая — возврат): ").strip().lower()
+        if again != 'y':
+            return
 
-        duration = time.time() - start_time
 
-        try:
-            if mongo_db is not None:
-                log_query(mongo_db, "rating", {"rating": rating}, len(results), duration)
-        except Exception as e:
-            print(f"Ошибка логирования запроса в MongoDB: {e}")
+def search_by_fulltext(service):
+    if service.fulltext is None:
+        print("Полнотекстовый поиск отключён или индекс не построен.")
+        return
+
+    while True:
+        text = input("Введите слова для поиска в названии и описании (или 'b' для возврата): ").strip()
+        if text.lower() in ('b', 'back', 'q'):
+            return
+        if not text:
+            print("Пустой ввод. Попробуйте снова.")
+            continue
+
+        results = service.search_fulltext(text).rows
 
         if results:
-            print_films(results, group_by='year')
-            select_film(cursor, results)
+            print(f"\nНайдено {len(results)} наиболее подходящих фильмов по запросу '{text}' (по релевантности):")
+            with metrics.span("fulltext", "format"):
+                print_films(results, group_by=None)
+            results = narrow_results(service, "fulltext", results, group_by=None)
+            select_film(service.pool, results, details=service.details)
         else:
-            print(f"Фильмы с рейтингом {rating} не найден")
+            print(f"Ничего не найдено по запросу '{text}'.")
 
-        again = input("\nИскать снова? (y — да, любая другая — возврат): ").strip().lower()
+        again = input("\nВыполнить ещё поиск в этом меню? (y — да, любая другая — возврат): ").strip().lower()
         if again != 'y':
             return
 
 
-def main():
-    mysql_conn = connect_mysql()
-    if mysql_conn is None:
-        print("Не удалось подключиться к MySQL. Завершение работы.")
-        return
+# Пункты меню, которым нужен поиск (MySQL), и пункты аналитики по логу в MongoDB
+SEARCH_CHOICES = ('1', '2', '3', '4', '7', '9')
+ANALYTICS_CHOICES = ('5', '6', '10', '11')
 
-    mongo_db = connect_mongo()
-    if mongo_db is None:
-        print("Не удалось подключиться к MongoDB. Логирование не будет работать.")
-        # Явно указываем None, чтобы избежать ошибок при проверках
-        mongo_db = None
+
+def main(metrics_out=None):
+    # Подключения открываются в фоне, меню показывается сразу
+    backends = Backends()
+    service = mongo_db = None
 
     try:
-        with mysql_conn:
-            with mysql_conn.cursor() as cursor:
-                while True:
-                    print("\nМеню:")
-                    print("1. Поиск фильма по названию")
-                    print("2. Поиск фильма по жанру и диапазону годов")
-                    print("3. Вывести все фильмы с постраничным просмотром")
-                    print("4. Поиск фильма по рейтингу")
-                    print("5. Показать 10 самых популярных запросов")
-                    print("6. Показать 10 последних уникальных запросов")
-                    print("0. Выход")
-
-                    choice = input("Выберите действие: ").strip()
-
-                    if choice == '1':
-                        search_by_title(cursor, mongo_db)
-                    elif choice == '2':
-                        search_by_genre_and_year(cursor, mongo_db)
-                    elif choice == '3':
-                        show_films_with_pagination(cursor, mongo_db)
-                    elif choice == '4':
-                        search_by_rating(cursor, mongo_db)
-                    elif choice == '5':
-                        if mongo_db is not None:
-                            try:
-                                show_most_popular_queries(mongo_db)
-                            except Exception as e:
-                                print(f"Ошибка при получении популярных запросов: {e}")
-                        else:
-                            print("Нет подключения к MongoDB для отображения статистики.")
-                    elif choice == '6':
-                        if mongo_db is not None:
-                            try:
-                                show_last_unique_queries(mongo_db)
-                            except Exception as e:
-                                print(f"Ошибка при получении последних уникальных запросов: {e}")
-                        else:
-                            print("Нет подключения к MongoDB для отображения статистики.")
-                    elif choice == '0':
-                        print("Выход из программы.")
-                        break
+        while True:
+            print("\nМеню:")
+            print("1. Поиск фильма по названию")
+            print("2. Поиск фильма по жанру и диапазону годов")
+            print("3. Вывести все фильмы с постраничным просмотром")
+            print("4. Поиск фильма по рейтингу")
+            print("5. Показать 10 самых популярных запросов")
+            print("6. Показать 10 последних уникальных запросов")
+            print("7. Статистика кэшей и пула соединений")
+            print("8. Время выполнения запросов по этапам (p50/p95/p99)")
+            print("9. Полнотекстовый поиск по названию и описанию")
+            print("10. Статистика запросов по типам за 7 дней")
+            print("11. Медленные запросы: планы выполнения и ухудшения")
+            print("0. Выход")
+
+            choice = input("Выберите действие: ").strip()
+
+            if choice in SEARCH_CHOICES and service is None:
+                service = backends.service()
+                if service is None:
+                    print("Не удалось подключиться к MySQL. Завершение работы.")
+                    break
+            elif choice in ANALYTICS_CHOICES:
+                mongo_db = backends.mongo_db()
+
+            try:
+                if choice == '1':
+                    search_by_title(service)
+                elif choice == '2':
+                    search_by_genre_and_year(service)
+                elif choice == '3':
+                    show_films_with_pagination(service)
+                elif choice == '4':
+                    search_by_rating(service)
+                elif choice == '5':
+                    if mongo_db is not None:
+                        try:
+                            show_most_popular_queries(mongo_db)
+                        except Exception as e:
+                            print(f"Ошибка при получении популярных запросов: {e}")
+                    else:
+                        print("Нет подключения к MongoDB для отображения статистики.")
+                elif choice == '6':
+                    if mongo_db is not None:
+                        try:
+                            show_last_unique_queries(mongo_db)
+                        except Exception as e:
+                            print(f"Ошибка при получении последних уникальных запросов: {e}")
+                    else:
+                        print("Нет подключения к MongoDB для отображения статистики.")
+                elif choice == '7':
+                    show_cache_stats(service.cache)
+                    show_details_stats(service.details)
+                    show_pool_stats(service.pool)
+                    show_log_buffer_stats()
+                elif choice == '8':
+                    show_metrics(metrics)
+                    path = input("\nСохранить отчёт в JSON? Укажите путь (Enter — пропустить): ").strip()
+                    if path:
+                        metrics.dump(path)
+                        print(f"Отчёт записан в {path}")
+                elif choice == '9':
+                    search_by_fulltext(service)
+                elif choice == '10':
+                    if mongo_db is not None:
+                        show_query_type_stats(mongo_db)
                     else:
-                        print("Некорректный выбор. Попробуйте снова.")
+                        print("Нет подключения к MongoDB для отображения статистики.")
+                elif choice == '11':
+                    if mongo_db is not None:
+                        show_slow_query_report(mongo_db)
+                    else:
+                        print("Нет подключения к MongoDB для отображения статистики.")
+                elif choice == '0':
+                    print("Выход из программы.")
+                    break
+                else:
+                    print("Некорректный выбор. Попробуйте снова.")
+            except pymysql.MySQLError as e:
+                # Соединение вернётся в пул или будет переоткрыто при следующем запросе
+                print(f"Ошибка MySQL: {e}. Попробуйте ещё раз.")
     except Exception as e:
         print(f"Произошла ошибка в работе программы: {e}")
-
-
+    finally:
+        stats = backends.close()
+        if stats is not None and (stats['dropped'] or stats['failed']):
+            print(f"Логирование: записано {stats['flushed']}, потеряно {stats['dropped'] + stats['failed']} записей.")
+        if metrics_out:
+            metrics.dump(metrics_out)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Поиск фильмов в базе Sakila")
+    parser.add_argument("--replay", metavar="WORKLOAD.jsonl",
+                        help="прогнать запросы из JSONL-файла без интерактивного меню")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="число параллельных потоков при --replay (по умолчанию 4)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="сколько раз повторить нагрузку при --replay")
+    parser.add_argument("--log-replay", action="store_true",
+                        help="писать запросы --replay в лог MongoDB (по умолчанию не пишутся)")
+    parser.add_argument("--export-workload", metavar="WORKLOAD.jsonl",
+                        help="выгрузить нагрузку из лога запросов MongoDB в JSONL-файл")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="максимальное число запросов при --export-workload")
+    parser.add_argument("--serve", action="store_true",
+                        help="запустить HTTP/JSON-сервер поиска для нескольких клиентов вместо меню")
+    parser.add_argument("--host", help="адрес сервера при --serve (по умолчанию из SEARCH_SERVER_HOST)")
+    parser.add_argument("--port", type=int, help="порт сервера при --serve (по умолчанию из SEARCH_SERVER_PORT)")
+    parser.add_argument("--metrics-out", metavar="METRICS.json",
+                        help="записать замеры времени по этапам в JSON при завершении")
+    parser.add_argument("--export", choices=("title", "genre_year", "rating", "listing"),
+                        help="выгрузить результат поиска или полный список фильмов в файл вместо меню")
+    parser.add_argument("--output", metavar="FILE",
+                        help="файл выгрузки при --export: .csv или .jsonl, с .gz — сжатый gzip")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="формат выгрузки, если не ясен из расширения")
+    parser.add_argument("--gzip", action="store_true", help="сжать выгрузку gzip независимо от расширения")
+    parser.add_argument("--keyword", help="ключевое слово для --export title")
+    parser.add_argument("--genre", help="жанр для --export genre_year")
+    parser.add_argument("--year-from", type=int, help="начальный год для --export genre_year")
+    parser.add_argument("--year-to", type=int, help="конечный год для --export genre_year")
+    parser.add_argument("--rating", help="рейтинг для --export rating")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.serve:
+        from search_server import run_cli
+        run_cli(args)
+    elif args.export:
+        from exporter import run_cli
+        run_cli(args)
+    elif args.replay or args.export_workload:
+        from replay import run_cli
+        run_cli(args)
+    else:
+        main(metrics_out=args.metrics_out)
@@ -0,0 +1,407 @@
+"""
+Минимальная замена MongoDB в памяти процесса: реализует только те операции
+коллекций и стадии агрегации, которые использует mongo_logger.
+"""
+import copy
+import itertools
+import threading
+from datetime import datetime
+
+from pymongo import InsertOne, ReplaceOne, UpdateMany, UpdateOne, DeleteMany, DeleteOne
+from pymongo.errors import OperationFailure
+
+_MISSING = object()
+
+
+def _get(doc, path):
+    value = doc
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _freeze(value):
+    """Хэшируемое представление значения для ключей $group."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _sort_key(value):
+    # Порядок типов как в MongoDB: null < числа < строки < объекты < даты
+    if value is _MISSING or value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (5, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, dict):
+        return (3, repr(_freeze(value)))
+    return (4, value)
+
+
+_DATE_PARTS = {'$year': 'year', '$month': 'month', '$dayOfMonth': 'day', '$hour': 'hour'}
+
+
+def _evaluate(expression, doc):
+    if isinstance(expression, str) and expression.startswith('$'):
+        value = _get(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, dict):
+        if len(expression) == 1:
+            operator, argument = next(iter(expression.items()))
+            if operator == '$ifNull':
+                for item in argument:
+                    value = _evaluate(item, doc)
+                    if value is not None:
+                        return value
+                return None
+            if operator == '$cond':
+                condition, if_true, if_false = argument
+                return _evaluate(if_true if _evaluate(condition, doc) else if_false, doc)
+            if operator in ('$lt', '$lte', '$gt', '$gte'):
+                left, right = (_evaluate(item, doc) for item in argument)
+                if left is None or right is None:
+                    return operator in ('$lt', '$lte') and left is None
+                return {'$lt': left < right, '$lte': left <= right,
+                        '$gt': left > right, '$gte': left >= right}[operator]
+            if operator in _DATE_PARTS:
+                value = _evaluate(argument, doc)
+                return None if value is None else getattr(value, _DATE_PARTS[operator])
+            if operator == '$dateFromParts':
+                parts = {name: _evaluate(argument.get(name, default), doc)
+                         for name, default in (('year', 1970), ('month', 1), ('day', 1), ('hour', 0))}
+                return datetime(parts['year'], parts['month'], parts['day'], parts['hour'])
+            if operator.startswith('$'):
+                raise NotImplementedError(f"оператор выражения {operator} не поддерживается")
+        return {key: _evaluate(value, doc) for key, value in expression.items()}
+    if isinstance(expression, list):
+        return [_evaluate(item, doc) for item in expression]
+    return expression
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        if key == '$or':
+            if not any(_matches(doc, sub) for sub in condition):
+                return False
+            continue
+        if key == '$and':
+            if not all(_matches(doc, sub) for sub in condition):
+                return False
+            continue
+        value = _get(doc, key)
+        if isinstance(condition, dict) and any(op.startswith('$') for op in condition):
+            for operator, operand in condition.items():
+                if operator == '$exists':
+                    if (value is not _MISSING) != bool(operand):
+                        return False
+                elif operator == '$in':
+                    if value is _MISSING or value not in operand:
+                        return False
+                elif operator == '$ne':
+                    if value is not _MISSING and value == operand:
+                        return False
+                elif operator in ('$gt', '$gte', '$lt', '$lte'):
+                    if value is _MISSING or value is None:
+                        return False
+                    if operator == '$gt' and not value > operand:
+                        return False
+                    if operator == '$gte' and not value >= operand:
+                        return False
+                    if operator == '$lt' and not value < operand:
+                        return False
+                    if operator == '$lte' and not value <= operand:
+                        return False
+                else:
+                    raise NotImplementedError(f"оператор запроса {operator} не поддерживается")
+        elif (None if value is _MISSING else value) != condition:
+            return False
+    return True
+
+
+def _sort_documents(docs, spec):
+    if isinstance(spec, dict):
+        spec = list(spec.items())
+    for field, direction in reversed(spec):
+        docs.sort(key=lambda d: _sort_key(_get(d, field)), reverse=direction < 0)
+    return docs
+
+
+def _project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    include = {k for k, v in projection.items() if v and k != '_id'}
+    if include:
+        result = {k: copy.deepcopy(doc[k]) for k in include if k in doc}
+        if projection.get('_id', 1) and '_id' in doc:
+            result['_id'] = doc['_id']
+        return result
+    return {k: copy.deepcopy(v) for k, v in doc.items() if projection.get(k, 1)}
+
+
+def _apply_update(doc, update):
+    for operator, fields in update.items():
+        for field, value in fields.items():
+            current = doc.get(field, _MISSING)
+            if operator == '$set':
+                doc[field] = copy.deepcopy(value)
+            elif operator == '$setOnInsert':
+                continue
+            elif operator == '$inc':
+                doc[field] = (0 if current is _MISSING else current) + value
+            elif operator == '$max':
+                if current is _MISSING or value > current:
+                    doc[field] = value
+            elif operator == '$min':
+                if current is _MISSING or value < current:
+                    doc[field] = value
+            elif operator == '$unset':
+                doc.pop(field, None)
+            else:
+                raise NotImplementedError(f"оператор обновления {operator} не поддерживается")
+
+
+class FakeCursor:
+    def __init__(self, docs, projection=None):
+        self._docs = docs
+        self._projection = projection
+        self._limit = 0
+
+    def sort(self, key, direction=None):
+        spec = [(key, direction or 1)] if isinstance(key, str) else key
+        _sort_documents(self._docs, spec)
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def __iter__(self):
+        docs = self._docs[:self._limit] if self._limit else self._docs
+        return (_project(d, self._projection) for d in docs)
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self._docs = []
+        self._by_id = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self.indexes = []
+
+    # ---------- запись ----------
+
+    def insert_one(self, document):
+        with self._lock:
+            document.setdefault('_id', next(self._ids))
+            stored = copy.deepcopy(document)
+            self._docs.append(stored)
+            self._by_id[_freeze(stored['_id'])] = stored
+
+    def insert_many(self, documents, ordered=True):
+        for document in documents:
+            self.insert_one(document)
+
+    def update_one(self, query, update, upsert=False):
+        self._update(query, update, upsert, many=False)
+
+    def update_many(self, query, update, upsert=False):
+        self._update(query, update, upsert, many=True)
+
+    def replace_one(self, query, replacement, upsert=False):
+        with self._lock:
+            for doc in self._find(query):
+                doc_id = doc['_id']
+                doc.clear()
+                doc.update(copy.deepcopy(replacement))
+                doc['_id'] = doc_id
+                return
+            if upsert:
+                new = copy.deepcopy(replacement)
+                if '_id' in query:
+                    new['_id'] = query['_id']
+                self.insert_one(new)
+
+    def delete_many(self, query):
+        with self._lock:
+            remove = {id(d) for d in self._find(query)}
+            for doc in self._docs:
+                if id(doc) in remove:
+                    self._by_id.pop(_freeze(doc['_id']), None)
+            self._docs = [d for d in self._docs if id(d) not in remove]
+
+    def bulk_write(self, operations, ordered=True):
+        for op in operations:
+            if isinstance(op, UpdateOne):
+                self.update_one(op._filter, op._doc, upsert=op._upsert)
+            elif isinstance(op, UpdateMany):
+                self.update_many(op._filter, op._doc, upsert=op._upsert)
+            elif isinstance(op, ReplaceOne):
+                self.replace_one(op._filter, op._doc, upsert=op._upsert)
+            elif isinstance(op, InsertOne):
+                self.insert_one(op._doc)
+            elif isinstance(op, (DeleteMany, DeleteOne)):
+                self.delete_many(op._filter)
+            else:
+                raise NotImplementedError(f"операция {type(op).__name__} не поддерживается")
+
+    def drop(self):
+        with self._lock:
+            self._docs, self._by_id = [], {}
+
+    def create_index(self, keys, **options):
+        name = '_'.join(f"{k}_{v}" for k, v in keys) if isinstance(keys, list) else str(keys)
+        for index_keys, index_options in self.indexes:
+            if index_keys == keys and index_options != options:
+                raise OperationFailure(f"индекс {name} уже существует с другими параметрами")
+        if (keys, options) not in self.indexes:
+            self.indexes.append((keys, options))
+        return name
+
+    def index_information(self):
+        info = {'_id_': {'key': [('_id', 1)]}}
+        for keys, options in self.indexes:
+            info['_'.join(f"{k}_{v}" for k, v in keys)] = {'key': list(keys), **options}
+        return info
+
+    def drop_index(self, name):
+        self.indexes = [(keys, options) for keys, options in self.indexes
+                        if '_'.join(f"{k}_{v}" for k, v in keys) != name]
+
+    # ---------- чтение ----------
+
+    def find(self, query=None, projection=None):
+        with self._lock:
+            return FakeCursor(list(self._find(query or {})), projection)
+
+    def find_one(self, query=None, projection=None, sort=None):
+        cursor = self.find(query, projection)
+        if sort:
+            cursor.sort(sort)
+        for doc in cursor.limit(1):
+            return doc
+        return None
+
+    def count_documents(self, query):
+        with self._lock:
+            return sum(1 for _ in self._find(query))
+
+    def estimated_document_count(self):
+        return len(self._docs)
+
+    def aggregate(self, pipeline, **options):
+        with self._lock:
+            docs = [copy.deepcopy(d) for d in self._docs]
+        for stage in pipeline:
+            (operator, spec), = stage.items()
+            if operator == '$match':
+                docs = [d for d in docs if _matches(d, spec)]
+            elif operator == '$sort':
+                docs = _sort_documents(docs, spec)
+            elif operator == '$limit':
+                docs = docs[:spec]
+            elif operator == '$project':
+                docs = [_project(d, spec) for d in docs]
+            elif operator == '$group':
+                docs = self._group(docs, spec)
+            else:
+                raise NotImplementedError(f"стадия {operator} не поддерживается")
+        return iter(docs)
+
+    # ---------- внутреннее ----------
+
+    def _find(self, query):
+        if set(query) == {'_id'} and not isinstance(query['_id'], dict):
+            doc = self._by_id.get(_freeze(query['_id']))
+            return [doc] if doc is not None else []
+        return [d for d in self._docs if _matches(d, query)]
+
+    def _update(self, query, update, upsert, many):
+        with self._lock:
+            found = self._find(query)
+            for doc in found if many else found[:1]:
+                _apply_update(doc, update)
+            if not found and upsert:
+                new = {k: v for k, v in query.items() if not k.startswith('$') and not isinstance(v, dict)}
+                _apply_update(new, update)
+                for field, value in update.get('$setOnInsert', {}).items():
+                    new[field] = copy.deepcopy(value)
+                self.insert_one(new)
+
+    @staticmethod
+    def _group(docs, spec):
+        groups = {}
+        order = []
+        for doc in docs:
+            key_value = _evaluate(spec['_id'], doc)
+            key = _freeze(key_value)
+            state = groups.get(key)
+            if state is None:
+                state = groups[key] = {'_id': key_value, '__avg': {}}
+                order.append(key)
+            for field, accumulator in spec.items():
+                if field == '_id':
+                    continue
+                (operator, expression), = accumulator.items()
+                value = _evaluate(expression, doc)
+                if operator == '$sum':
+                    state[field] = state.get(field, 0) + (value if isinstance(value, (int, float)) else 0)
+                elif operator == '$avg':
+                    total, count = state['__avg'].get(field, (0, 0))
+                    if isinstance(value, (int, float)):
+                        total, count = total + value, count + 1
+                    state['__avg'][field] = (total, count)
+                elif operator == '$max':
+                    if value is not None and (field not in state or value > state[field]):
+                        state[field] = value
+                elif operator == '$min':
+                    if value is not None and (field not in state or value < state[field]):
+                        state[field] = value
+                elif operator == '$first':
+                    state.setdefault(field, value)
+                elif operator == '$last':
+                    state[field] = value
+                else:
+                    raise NotImplementedError(f"аккумулятор {operator} не поддерживается")
+        result = []
+        for key in order:
+            state = groups[key]
+            for field, (total, count) in state.pop('__avg').items():
+                state[field] = total / count if count else None
+            result.append(state)
+        return result
+
+
+class FakeDatabase:
+    def __init__(self, name='benchmark'):
+        self.name = name
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = self._collections[name] = FakeCollection(name)
+            return collection
+
+    def command(self, name, value=None, **arguments):
+        if name != 'collMod':
+            raise NotImplementedError(f"команда {name} не поддерживается")
+        # collMod меняет expireAfterSeconds существующего индекса (как MongoDB 5.1+)
+        collection = self[value]
+        index = arguments['index']
+        key = list(index['keyPattern'].items())
+        for i, (keys, options) in enumerate(collection.indexes):
+            if keys == key:
+                collection.indexes[i] = (keys, {**options, 'expireAfterSeconds': index['expireAfterSeconds']})
+                return {'ok': 1}
+        raise OperationFailure("индекс не найден")
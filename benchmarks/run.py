@@ -0,0 +1,291 @@
+"""
+Воспроизводимые замеры производительности поиска, пагинации, деталей фильма,
+аналитических отчётов и вывода таблиц на синтетическом каталоге.
+
+Запуск из корня проекта:
+    python -m benchmarks.run --scale 100000 --output bench.json
+    python -m benchmarks.run --scale 100000 --baseline bench.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Имя коллекции лога должно быть задано до импорта config
+os.environ.setdefault('MONGO_COLLECTION', 'query_logs')
+
+from benchmarks.fake_mongo import FakeDatabase  # noqa: E402
+from benchmarks.sqlite_sakila import CATEGORIES, RATINGS, WORDS, SQLiteConnection, build_database  # noqa: E402
+from config import MONGO_CONFIG  # noqa: E402
+from facets import AVAILABLE as FACETS_AVAILABLE, FacetIndex  # noqa: E402
+from film_catalog import FilmCatalog  # noqa: E402
+from film_details import FilmDetailsCache  # noqa: E402
+from film_record import to_records  # noqa: E402
+from fulltext import FullTextIndex  # noqa: E402
+from formatter import open_film_details, print_films, show_film_details  # noqa: E402
+import mongo_logger  # noqa: E402
+import pymysql.cursors  # noqa: E402
+from mysql_connector import MySQLPool  # noqa: E402
+from pagination import fetch_page  # noqa: E402
+from result_cache import estimate_size  # noqa: E402
+from search_api import RATING_QUERY, SearchService  # noqa: E402
+
+PAGE_SIZE = 10
+PAGE_DEPTHS = (1, 10, 100, 1000, 10000)
+RENDER_SIZES = (100, 1000, 10000)
+
+# Прежнее представление результата: строка DictCursor на каждую пару фильм × жанр
+DICT_ROWS_QUERY = """
+    SELECT f.film_id, f.title, f.release_year, f.rating, c.name AS genre
+    FROM film f
+    JOIN film_category fc ON f.film_id = fc.film_id
+    JOIN category c ON fc.category_id = c.category_id
+    WHERE f.rating = %s
+    ORDER BY f.release_year, f.title;
+"""
+
+
+def measure(func, repeat, warmup=1):
+    """Выполняет func warmup + repeat раз и возвращает статистику времени в миллисекундах."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "runs": repeat,
+        "min_ms": samples[0],
+        "median_ms": statistics.median(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        "max_ms": samples[-1],
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def populate_query_log(mongo_db, count, seed):
+    """Заполняет лог запросов синтетической историей через mongo_logger.log_query."""
+    rng = random.Random(seed)
+    keywords = [w.lower() for w in WORDS[:40]]
+    # Как при запуске приложения: сводка строится до записи лога, отчёты читают её
+    mongo_logger.ensure_rollup(mongo_db)
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            query_type, parameters = "title", {"keyword": rng.choice(keywords)}
+        elif kind < 0.75:
+            year_from = rng.randint(1990, 2020)
+            query_type, parameters = "genre_year", {
+                "genre": rng.choice(CATEGORIES), "year_from": year_from, "year_to": year_from + rng.randint(0, 4)}
+        elif kind < 0.9:
+            query_type, parameters = "rating", {"rating": rng.choice(RATINGS)}
+        else:
+            query_type, parameters = "pagination", {"page_size": PAGE_SIZE, "page": rng.randint(1, 50)}
+        mongo_logger.log_query(mongo_db, query_type, parameters, rng.randint(0, 500), rng.random() / 10)
+
+
+def run_benchmarks(scale, repeat, log_docs, seed, db_path):
+    build_database(db_path, scale, seed)
+    pool = MySQLPool(min_size=1, max_size=4, connect=lambda: SQLiteConnection(db_path))
+    mongo_db = FakeDatabase()
+    populate_query_log(mongo_db, log_docs, seed)
+
+    service = SearchService(pool, page_size=PAGE_SIZE)
+    catalog = FilmCatalog(refresh_interval=0)
+    with pool.cursor() as cursor:
+        catalog.load(cursor)
+    catalog_service = SearchService(pool, catalog=catalog, page_size=PAGE_SIZE)
+    with pool.cursor() as cursor:
+        fulltext = FullTextIndex.build(cursor)
+    fulltext_service = SearchService(pool, fulltext=fulltext, page_size=PAGE_SIZE)
+
+    rng = random.Random(seed)
+    keyword = rng.choice(WORDS).lower()[:4]
+    results = {}
+
+    results["search_title"] = measure(lambda: service.search_title(keyword), repeat)
+    results["search_title_catalog"] = measure(lambda: catalog_service.search_title(keyword), repeat)
+    results["search_genre_year"] = measure(lambda: service.search_genre_year("Drama", 2000, 2010), repeat)
+    results["search_rating"] = measure(lambda: service.search_rating("PG-13"), repeat)
+    results["search_fulltext"] = measure(lambda: fulltext_service.search_fulltext("mad shark rockies"), repeat)
+    results["search_fulltext_fuzzy"] = measure(lambda: fulltext_service.search_fulltext("sharc rockeis"), repeat)
+
+    # Строки результата: словари DictCursor по строке на жанр против записей FilmRecord
+    def dict_rows():
+        with pool.cursor() as cursor:
+            cursor.execute(DICT_ROWS_QUERY, ("PG-13",))
+            return cursor.fetchall()
+
+    def record_rows():
+        with pool.cursor(pymysql.cursors.Cursor) as cursor:
+            cursor.execute(RATING_QUERY, ("PG-13",))
+            return to_records(cursor.fetchall())
+    # Фасеты и уточнение результата в памяти по снимку NumPy вместо повторных запросов
+    if FACETS_AVAILABLE:
+        facets = FacetIndex(ttl=0)
+        with pool.cursor(pymysql.cursors.Cursor) as cursor:
+            facets.load(cursor)
+        facet_service = SearchService(pool, facets=facets, page_size=PAGE_SIZE)
+        rated = facet_service.search_rating("PG-13").rows
+        results["facet_counts"] = measure(lambda: facet_service.facet_counts(rated), repeat)
+        results["facet_refine"] = measure(
+            lambda: facet_service.refine(rated, genre="Drama", year=2005), repeat)
+
+    results["rows_dict_cursor"] = measure(dict_rows, repeat)
+    results["rows_film_records"] = measure(record_rows, repeat)
+    dicts, records = dict_rows(), record_rows()
+    memory = {
+        "dict_rows": len(dicts),
+        "dict_bytes_per_film": estimate_size(dicts) / max(1, len(records)),
+        "record_rows": len(records),
+        "record_bytes_per_film": estimate_size(records) / max(1, len(records)),
+    }
+
+    # Глубина пагинации: границы предыдущих страниц уже известны, как при последовательном листании
+    with pool.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) AS n FROM film;")
+        total_rows = cursor.fetchone()["n"]
+    for depth in PAGE_DEPTHS:
+        if depth * PAGE_SIZE > total_rows:
+            break
+        if depth > 1:
+            service.page(depth - 1)
+        results[f"pagination_page_{depth}"] = measure(lambda d=depth: service.page(d), repeat)
+
+    film_ids = [rng.randint(1, scale) for _ in range(repeat + 1)]
+
+    def film_details():
+        with pool.cursor() as cursor, quiet():
+            show_film_details(cursor, film_ids[rng.randrange(len(film_ids))])
+    results["film_details"] = measure(film_details, repeat)
+
+    # Детали из кэша после пакетной подгрузки страницы, как при выборе фильма из списка
+    details = FilmDetailsCache(max_entries=len(film_ids))
+    with pool.cursor() as cursor:
+        results["film_details_prefetch"] = measure(
+            lambda: (details.clear(), details.prefetch(cursor, film_ids)), repeat)
+
+    def film_details_cached():
+        with quiet():
+            open_film_details(pool, film_ids[rng.randrange(len(film_ids))], details)
+    results["film_details_cached"] = measure(film_details_cached, repeat)
+
+    logs = mongo_db[MONGO_CONFIG['collection_name']]
+
+    def report(func):
+        def run():
+            with quiet():
+                func(mongo_db)
+        return run
+    results["report_popular"] = measure(report(mongo_logger.show_most_popular_queries), repeat)
+    results["report_last_unique"] = measure(report(mongo_logger.show_last_unique_queries), repeat)
+    results["report_popular_raw"] = measure(lambda: list(logs.aggregate(mongo_logger.POPULAR_PIPELINE + [{"$limit": 10}])), repeat)
+    results["report_last_unique_raw"] = measure(
+        lambda: list(logs.aggregate(mongo_logger.LAST_UNIQUE_PIPELINE + [{"$limit": 10}])), repeat)
+
+    with pool.cursor(pymysql.cursors.Cursor) as cursor:
+        all_rows = fetch_page(cursor, max(RENDER_SIZES))
+    for size in RENDER_SIZES:
+        if size > len(all_rows):
+            break
+        rows = all_rows[:size]
+
+        def render(rows=rows):
+            with quiet():
+                print_films(rows, group_by='year')
+        results[f"print_films_{size}"] = measure(render, repeat)
+
+    pool.close()
+    return results, memory
+
+
+def compare(current, baseline, threshold):
+    """Печатает сравнение медиан с базовым прогоном и возвращает список регрессий."""
+    regressions = []
+    print(f"\n{'Замер':<28} {'База, мс':>10} {'Сейчас, мс':>11} {'Изменение':>10}")
+    for name, stats in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:<28} {'—':>10} {stats['median_ms']:>11.3f} {'новый':>10}")
+            continue
+        ratio = stats["median_ms"] / base["median_ms"] if base["median_ms"] else float('inf')
+        marker = ""
+        if ratio > 1 + threshold:
+            marker = "  ← регрессия"
+            regressions.append(name)
+        print(f"{name:<28} {base['median_ms']:>10.3f} {stats['median_ms']:>11.3f} {(ratio - 1) * 100:>+9.1f}%{marker}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности на синтетическом каталоге Sakila")
+    parser.add_argument("--scale", type=int, default=1000, help="число фильмов (например 1000, 100000, 1000000)")
+    parser.add_argument("--repeat", type=int, default=5, help="число замеров на каждый сценарий")
+    parser.add_argument("--log-docs", type=int, default=10000, help="число записей в логе запросов")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db-path", help="файл SQLite (по умолчанию во временном каталоге, переиспользуется)")
+    parser.add_argument("--output", help="куда записать результаты в JSON")
+    parser.add_argument("--baseline", help="JSON предыдущего прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="допустимое замедление медианы относительно базы (по умолчанию 0.10 = 10%%)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="завершиться с кодом 1 при регрессии")
+    args = parser.parse_args(argv)
+
+    db_path = args.db_path or os.path.join(tempfile.gettempdir(), f"sakila_bench_{args.scale}_{args.seed}.sqlite3")
+    started = time.perf_counter()
+    results, memory = run_benchmarks(args.scale, args.repeat, args.log_docs, args.seed, db_path)
+
+    report = {
+        "meta": {
+            "scale": args.scale,
+            "repeat": args.repeat,
+            "log_docs": args.log_docs,
+            "seed": args.seed,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "total_sec": time.perf_counter() - started,
+        },
+        "results": results,
+        "memory": memory,
+    }
+
+    for name, stats in results.items():
+        print(f"{name:<28} median {stats['median_ms']:>10.3f} мс   p95 {stats['p95_ms']:>10.3f} мс")
+    print(f"\nПамять на фильм: словари DictCursor {memory['dict_bytes_per_film']:.0f} байт "
+          f"({memory['dict_rows']} строк), FilmRecord {memory['record_bytes_per_film']:.0f} байт "
+          f"({memory['record_rows']} строк)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nРезультаты записаны в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("scale") != args.scale:
+            print("Внимание: масштаб базового прогона отличается от текущего.")
+        regressions = compare(report, baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
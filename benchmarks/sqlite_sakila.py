@@ -0,0 +1,235 @@
+"""
+Синтетическая база в форме Sakila (film, category, film_category) на SQLite
+и адаптер соединения с интерфейсом pymysql DictCursor, чтобы запросы проекта
+выполнялись без сервера MySQL.
+"""
+import itertools
+import os
+import random
+import re
+import sqlite3
+import threading
+
+import pymysql.cursors
+
+CATEGORIES = [
+    'Action', 'Animation', 'Children', 'Classics', 'Comedy', 'Documentary', 'Drama', 'Family',
+    'Foreign', 'Games', 'Horror', 'Music', 'New', 'Sci-Fi', 'Sports', 'Travel',
+]
+RATINGS = ['G', 'PG', 'PG-13', 'R', 'NC-17']
+WORDS = [
+    'ACADEMY', 'ACE', 'ADAPTATION', 'AFFAIR', 'AFRICAN', 'AGENT', 'AIRPLANE', 'AIRPORT', 'ALABAMA',
+    'ALADDIN', 'ALAMO', 'ALI', 'ALIEN', 'ALLEY', 'ALONE', 'AMADEUS', 'AMELIE', 'AMERICAN', 'ANACONDA',
+    'ANALYZE', 'ANGELS', 'ANNIE', 'ANONYMOUS', 'ANTHEM', 'ANTITRUST', 'APACHE', 'APOCALYPSE', 'ARABIA',
+    'ARGONAUTS', 'ARMAGEDDON', 'ATTACKS', 'BABY', 'BACKLASH', 'BADMAN', 'BALLOON', 'BANG', 'BASIC',
+    'BEACH', 'BEAR', 'BEAUTY', 'BED', 'BEDAZZLED', 'BENEATH', 'BETRAYED', 'BILL', 'BIRDS', 'BLADE',
+    'BLANKET', 'BLINDNESS', 'BLOOD', 'BLUES', 'BOILED', 'BONNIE', 'BOOGIE', 'BORN', 'BOUND', 'BRANNIGAN',
+    'BRAVEHEART', 'BREAKFAST', 'BRIDE', 'BRIGHT', 'BRINGING', 'BROTHERHOOD', 'BUBBLE', 'BULL', 'BUNCH',
+    'CALENDAR', 'CAMELOT', 'CANDIDATE', 'CARIBBEAN', 'CASABLANCA', 'CASPER', 'CATCH', 'CHAMBER',
+    'CHICAGO', 'CHINATOWN', 'CIRCUS', 'CITIZEN', 'CLOCKWORK', 'CLUB', 'CONFIDENTIAL', 'DINOSAUR',
+    'DEVIL', 'DRAGON', 'EGG', 'FIRE', 'GOLDFINGER', 'HOLES', 'PREJUDICE', 'SIERRA', 'TRUMAN', 'ZORRO',
+]
+DESCRIPTION_WORDS = [
+    'A', 'Epic', 'Drama', 'of', 'a', 'Feminist', 'And', 'a', 'Mad', 'Scientist', 'who', 'must',
+    'Battle', 'Teacher', 'in', 'The', 'Canadian', 'Rockies', 'Astounding', 'Reflection', 'Database',
+    'Administrator', 'Squirrel', 'Shark', 'Ancient', 'China', 'Boat', 'Manhattan', 'Penthouse',
+]
+LAST_UPDATE = '2006-02-15 05:07:09'
+# Меняется вместе с SCHEMA, чтобы сохранённые файлы базы пересоздавались
+SCHEMA_VERSION = '2'
+
+SCHEMA = """
+    CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE category (
+        category_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        last_update TEXT NOT NULL
+    );
+    CREATE TABLE film (
+        film_id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL COLLATE NOCASE,
+        description TEXT,
+        release_year INTEGER,
+        rating TEXT,
+        last_update TEXT NOT NULL
+    );
+    CREATE TABLE film_category (
+        film_id INTEGER NOT NULL,
+        category_id INTEGER NOT NULL,
+        last_update TEXT NOT NULL,
+        PRIMARY KEY (film_id, category_id)
+    );
+    CREATE INDEX idx_title ON film (title);
+    CREATE INDEX idx_fk_category_id ON film_category (category_id);
+"""
+
+
+def _films(scale, rng):
+    for film_id in range(1, scale + 1):
+        # Номер в названии делает его уникальным при любом масштабе, как в Sakila
+        title = f"{rng.choice(WORDS)} {rng.choice(WORDS)}"
+        if film_id > len(WORDS) ** 2 // 4:
+            title = f"{title} {film_id}"
+        description = ' '.join(rng.choice(DESCRIPTION_WORDS) for _ in range(12))
+        yield (film_id, title, description, rng.randint(1990, 2024), rng.choice(RATINGS), LAST_UPDATE)
+
+
+def _film_categories(scale, rng):
+    for film_id in range(1, scale + 1):
+        # В Sakila у фильма один жанр; часть фильмов с двумя проверяет склейку строк join'а
+        count = 2 if rng.random() < 0.1 else 1
+        for category_id in rng.sample(range(1, len(CATEGORIES) + 1), count):
+            yield (film_id, category_id, LAST_UPDATE)
+
+
+def build_database(path, scale, seed=42):
+    """Создаёт (или переиспользует, если масштаб и seed совпадают) файл SQLite с синтетическим каталогом."""
+    if os.path.exists(path):
+        try:
+            with sqlite3.connect(path) as conn:
+                meta = dict(conn.execute("SELECT key, value FROM meta"))
+            if (meta.get('scale') == str(scale) and meta.get('seed') == str(seed)
+                    and meta.get('schema') == SCHEMA_VERSION):
+                return path
+        except sqlite3.Error:
+            pass
+        os.remove(path)
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany("INSERT INTO category VALUES (?, ?, ?)",
+                         [(i, name, LAST_UPDATE) for i, name in enumerate(CATEGORIES, 1)])
+        films = _films(scale, rng)
+        while True:
+            chunk = list(itertools.islice(films, 50000))
+            if not chunk:
+                break
+            conn.executemany("INSERT INTO film VALUES (?, ?, ?, ?, ?, ?)", chunk)
+        links = _film_categories(scale, rng)
+        while True:
+            chunk = list(itertools.islice(links, 50000))
+            if not chunk:
+                break
+            conn.executemany("INSERT INTO film_category VALUES (?, ?, ?)", chunk)
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [('scale', str(scale)), ('seed', str(seed)), ('schema', SCHEMA_VERSION)])
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return path
+
+
+_PLACEHOLDER = re.compile(r"%s")
+# GROUP_CONCAT(x ORDER BY y SEPARATOR 'sep') из MySQL -> агрегат SORTED_CONCAT(x, 'sep')
+_GROUP_CONCAT = re.compile(r"GROUP_CONCAT\((.+?) ORDER BY [^)]+? SEPARATOR ('[^']*')\)")
+
+
+class _SortedConcat:
+    """Агрегат SQLite, повторяющий GROUP_CONCAT с ORDER BY по тому же выражению."""
+
+    def __init__(self):
+        self.values = []
+        self.separator = ','
+
+    def step(self, value, separator):
+        self.separator = separator
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        return self.separator.join(sorted(self.values)) if self.values else None
+
+
+class SQLiteDictCursor:
+    """Курсор с интерфейсом pymysql DictCursor (или обычного Cursor при as_dict=False) поверх sqlite3."""
+
+    def __init__(self, connection, as_dict=True):
+        self._cursor = connection.cursor()
+        self._as_dicts = as_dict
+        self.description = None
+        self.rowcount = -1
+
+    def execute(self, query, args=None):
+        query = _GROUP_CONCAT.sub(r"SORTED_CONCAT(\1, \2)", _PLACEHOLDER.sub('?', query))
+        self._cursor.execute(query, tuple(args or ()))
+        self.description = self._cursor.description
+        self.rowcount = self._cursor.rowcount
+        return self.rowcount
+
+    def _as_dict(self, row):
+        if row is None or not self._as_dicts:
+            return row
+        return {column[0]: value for column, value in zip(self.description, row)}
+
+    def fetchone(self):
+        return self._as_dict(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        if not self._as_dicts:
+            return self._cursor.fetchmany(size)
+        return [self._as_dict(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        if not self._as_dicts:
+            return self._cursor.fetchall()
+        columns = [column[0] for column in self.description]
+        return [dict(zip(columns, row)) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SQLiteConnection:
+    """Соединение с интерфейсом pymysql.Connection в объёме, нужном MySQLPool и запросам проекта."""
+
+    _ids = itertools.count(1)
+    _ids_lock = threading.Lock()
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._attach_information_schema()
+        self.open = True
+        with self._ids_lock:
+            self.server_thread_id = (next(self._ids),)
+
+    def _attach_information_schema(self):
+        # Минимальный information_schema.COLUMNS и DATABASE() для чтения enum рейтингов
+        self._conn.create_function('DATABASE', 0, lambda: 'sakila')
+        self._conn.create_aggregate('SORTED_CONCAT', 2, _SortedConcat)
+        self._conn.execute("ATTACH DATABASE ':memory:' AS information_schema")
+        self._conn.execute("""
+            CREATE TABLE information_schema.COLUMNS (
+                TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT, COLUMN_TYPE TEXT
+            )
+        """)
+        enum = "enum(" + ",".join(f"'{rating}'" for rating in RATINGS) + ")"
+        self._conn.execute("INSERT INTO information_schema.COLUMNS VALUES ('sakila', 'film', 'rating', ?)", (enum,))
+        self._conn.commit()
+
+    def cursor(self, cursorclass=None):
+        as_dict = cursorclass is None or issubclass(cursorclass, pymysql.cursors.DictCursorMixin)
+        return SQLiteDictCursor(self._conn, as_dict)
+
+    def ping(self, reconnect=True):
+        self._conn.execute("SELECT 1")
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self.open = False
+        self._conn.close()
@@ -0,0 +1,107 @@
+"""
+Предохранитель для обращений к внешнему сервису. После failure_threshold
+сбоев подряд он размыкается: вызовы сразу отклоняются, не дожидаясь
+тайм-аутов драйвера. Через delay секунд пропускается одна пробная попытка.
+Если она удалась, предохранитель замыкается. Если нет — пауза удваивается,
+но не больше max_delay.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class CircuitOpenError(Exception):
+    """Вызов отклонён: сервис недавно не отвечал, следующая попытка позже."""
+
+
+class CircuitBreaker:
+    """
+    Потокобезопасный предохранитель. is_failure(exception) решает, какие
+    исключения считать недоступностью сервиса; остальные означают, что
+    сервис ответил (например, ошибкой запроса), и предохранитель не размыкают.
+    """
+
+    def __init__(self, name, failure_threshold=1, base_delay=1.0, max_delay=60.0, is_failure=None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_delay = base_delay
+        self.max_delay = max(max_delay, base_delay)
+        self.is_failure = is_failure or (lambda exception: True)
+        self.stats = {"calls": 0, "rejected": 0, "failures": 0, "trips": 0}
+        self._failures = 0           # сбоев подряд
+        self._delay = base_delay     # пауза до следующей пробной попытки
+        self._retry_at = 0.0
+        self._probing = False        # пробная попытка уже выполняется
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._failures >= self.failure_threshold
+
+    def retry_in(self):
+        """Сколько секунд осталось до следующей пробной попытки; 0, если вызовы разрешены."""
+        with self._lock:
+            if not self.is_open:
+                return 0.0
+            return max(0.0, self._retry_at - time.monotonic())
+
+    def allow(self):
+        """
+        Можно ли обращаться к сервису сейчас. Пока предохранитель разомкнут,
+        после паузы разрешается только одна пробная попытка.
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            if not self.is_open:
+                return True
+            if not self._probing and time.monotonic() >= self._retry_at:
+                self._probing = True
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._delay = self.base_delay
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.stats["failures"] += 1
+            self._failures += 1
+            self._probing = False
+            if self._failures >= self.failure_threshold:
+                if self._failures == self.failure_threshold:
+                    self.stats["trips"] += 1
+                self._retry_at = time.monotonic() + self._delay
+                self._delay = min(self._delay * 2, self.max_delay)
+
+    @contextmanager
+    def guard(self):
+        """Оборачивает обращение к сервису; если предохранитель разомкнут — CircuitOpenError."""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} недоступна, повторная попытка через {self.retry_in():.0f} с")
+        failed = True
+        try:
+            yield
+            failed = False
+        except Exception as e:
+            failed = self.is_failure(e)
+            raise
+        finally:
+            # Прерванный вызов (KeyboardInterrupt, отмена потока) тоже считается сбоем,
+            # иначе пробная попытка осталась бы занятой навсегда
+            if failed:
+                self.record_failure()
+            else:
+                self.record_success()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                **self.stats,
+                "open": self.is_open,
+                "consecutive_failures": self._failures,
+                "retry_in_sec": max(0.0, self._retry_at - time.monotonic()) if self.is_open else 0.0,
+            }
@@ -1,7 +1,24 @@
 import os
-from dotenv import load_dotenv
 
-load_dotenv()  # Загружаем переменные окружения из .env
+
+def _find_dotenv():
+    """Файл .env в каталоге проекта или выше — там же, где его ищет python-dotenv."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, '.env')
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+# Загружаем переменные окружения из .env; без файла python-dotenv не импортируется вовсе
+_DOTENV_PATH = _find_dotenv()
+if _DOTENV_PATH:
+    from dotenv import load_dotenv
+    load_dotenv(_DOTENV_PATH)
 
 MYSQL_CONFIG = {
     'host': os.getenv('MYSQL_HOST'),
@@ -14,4 +31,166 @@ MONGO_CONFIG = {
     'uri': os.getenv('MONGO_URI'),
     'db_name': os.getenv('MONGO_DB'),
     'collection_name': os.getenv('MONGO_COLLECTION'),
+    # Сводка по уникальным запросам: счётчики обновляются при каждом логировании
+    'rollup_collection_name': os.getenv('MONGO_ROLLUP_COLLECTION', f"{os.getenv('MONGO_COLLECTION')}_rollup"),
+    # Почасовые агрегаты по типам запросов, в которые сжимается старый лог
+    'hourly_collection_name': os.getenv('MONGO_HOURLY_COLLECTION', f"{os.getenv('MONGO_COLLECTION')}_hourly"),
+    # Медленные запросы с планами выполнения EXPLAIN
+    'slow_collection_name': os.getenv('MONGO_SLOW_COLLECTION', f"{os.getenv('MONGO_COLLECTION')}_slow"),
+}
+
+# Предохранитель MongoDB: после скольких сбоев связи подряд перестать обращаться
+# к ней и через сколько секунд пробовать снова (пауза удваивается до max_delay)
+MONGO_BREAKER_CONFIG = {
+    'failure_threshold': int(os.getenv('MONGO_BREAKER_FAILURES', '1')),
+    'base_delay': float(os.getenv('MONGO_BREAKER_DELAY_SEC', '1')),
+    'max_delay': float(os.getenv('MONGO_BREAKER_MAX_DELAY_SEC', '60')),
+}
+
+# Индексированный каталог фильмов в памяти (поиск по названию без LIKE-сканов в MySQL)
+CATALOG_CONFIG = {
+    'enabled': os.getenv('FILM_CATALOG_ENABLED', '0') == '1',
+    'refresh_interval': float(os.getenv('FILM_CATALOG_REFRESH_SEC', '60')),
+}
+
+# Постраничный просмотр: размер страницы, число страниц в кэше, фоновая подгрузка следующей
+PAGINATION_CONFIG = {
+    'page_size': int(os.getenv('PAGE_SIZE', '10')),
+    'cache_pages': int(os.getenv('PAGE_CACHE_PAGES', '20')),
+    'prefetch': os.getenv('PAGE_PREFETCH', '1') == '1',
+}
+
+# Буферизованное фоновое логирование запросов в MongoDB
+LOG_BUFFER_CONFIG = {
+    'enabled': os.getenv('MONGO_LOG_BUFFERED', '1') == '1',
+    'max_size': int(os.getenv('MONGO_LOG_QUEUE_SIZE', '10000')),
+    'batch_size': int(os.getenv('MONGO_LOG_BATCH_SIZE', '100')),
+    'flush_interval': float(os.getenv('MONGO_LOG_FLUSH_SEC', '1.0')),
+    # drop_oldest — вытеснять самые старые записи, block — ждать освобождения места
+    'overflow': os.getenv('MONGO_LOG_OVERFLOW', 'drop_oldest'),
+}
+
+
+def _parse_ttl(value):
+    """Разбирает строку вида 'title=300,rating=600' в словарь {тип: секунды}."""
+    ttl = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, seconds = item.partition('=')
+        ttl[name.strip()] = float(seconds)
+    return ttl
+
+
+# Общий кэш результатов поиска (LRU по числу записей и объёму + TTL по типу запроса)
+RESULT_CACHE_CONFIG = {
+    'enabled': os.getenv('RESULT_CACHE_ENABLED', '1') == '1',
+    'max_entries': int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '512')),
+    'max_bytes': int(os.getenv('RESULT_CACHE_MAX_MB', '64')) * 1024 * 1024,
+    'default_ttl': float(os.getenv('RESULT_CACHE_DEFAULT_TTL', '300')),
+    'ttl': _parse_ttl(os.getenv('RESULT_CACHE_TTL', 'title=300,genre_year=600,rating=600,pagination=120')),
+}
+
+# Пул соединений MySQL
+MYSQL_POOL_CONFIG = {
+    'min_size': int(os.getenv('MYSQL_POOL_MIN', '1')),
+    'max_size': int(os.getenv('MYSQL_POOL_MAX', '5')),
+    'idle_timeout': float(os.getenv('MYSQL_POOL_IDLE_TIMEOUT', '300')),
+    'checkout_timeout': float(os.getenv('MYSQL_POOL_CHECKOUT_TIMEOUT', '10')),
+    # 0 — проверять соединение ping() при каждой выдаче из пула
+    'ping_interval': float(os.getenv('MYSQL_POOL_PING_INTERVAL', '0')),
+}
+
+# Потоковый вывод результатов поиска через небуферизованный курсор
+STREAMING_CONFIG = {
+    'enabled': os.getenv('RESULT_STREAMING', '0') == '1',
+    'fetch_size': int(os.getenv('STREAM_FETCH_SIZE', '500')),
+    # по скольким первым строкам выбирается ширина колонок
+    'lookahead': int(os.getenv('STREAM_LOOKAHEAD', '200')),
+    'chunk_size': int(os.getenv('STREAM_CHUNK_SIZE', '100')),
+}
+
+# Кэш деталей фильмов на время сеанса с пакетной подгрузкой для показанного списка
+DETAILS_CACHE_CONFIG = {
+    'enabled': os.getenv('DETAILS_CACHE_ENABLED', '1') == '1',
+    'max_entries': int(os.getenv('DETAILS_CACHE_MAX_ENTRIES', '1000')),
+    'batch_size': int(os.getenv('DETAILS_BATCH_SIZE', '500')),
+}
+
+# Справочники меню поиска (жанры, рейтинги, диапазон годов): через сколько секунд проверять изменения
+REFERENCE_DATA_CONFIG = {
+    'ttl': float(os.getenv('REFERENCE_DATA_TTL', '300')),
+}
+
+# Замеры времени по этапам обработки запроса
+INSTRUMENTATION_CONFIG = {
+    'enabled': os.getenv('INSTRUMENTATION_ENABLED', '1') == '1',
+    # добавлять длительности этапов в документ лога запросов (поле stages_ms)
+    'log_stages': os.getenv('LOG_STAGE_TIMINGS', '0') == '1',
+}
+
+# Сервер поиска (PR44.py --serve)
+SERVER_CONFIG = {
+    'host': os.getenv('SEARCH_SERVER_HOST', '127.0.0.1'),
+    'port': int(os.getenv('SEARCH_SERVER_PORT', '8044')),
+    # потоков для блокирующих вызовов MySQL/MongoDB; 0 — по размеру пула соединений
+    'workers': int(os.getenv('SEARCH_SERVER_WORKERS', '0')),
+    'max_body_bytes': int(os.getenv('SEARCH_SERVER_MAX_BODY', '65536')),
+    # пределы заголовков запроса; max_header_bytes ограничивает и длину одной строки
+    'max_header_lines': int(os.getenv('SEARCH_SERVER_MAX_HEADER_LINES', '100')),
+    'max_header_bytes': int(os.getenv('SEARCH_SERVER_MAX_HEADER_BYTES', '16384')),
+    # пределы /films: страницы дальше max_page требуют долгого прохода по ключам,
+    # page_size больше max_page_size урезается
+    'max_page': int(os.getenv('SEARCH_SERVER_MAX_PAGE', '1000')),
+    'max_page_size': int(os.getenv('SEARCH_SERVER_MAX_PAGE_SIZE', '100')),
+}
+
+# Полнотекстовый поиск по названию и описанию (BM25 + исправление опечаток)
+FULLTEXT_CONFIG = {
+    'enabled': os.getenv('FULLTEXT_ENABLED', '1') == '1',
+    'index_path': os.getenv('FULLTEXT_INDEX_PATH', 'fulltext.idx'),
+    'limit': int(os.getenv('FULLTEXT_LIMIT', '20')),
+    'fuzzy': os.getenv('FULLTEXT_FUZZY', '1') == '1',
+    'min_similarity': float(os.getenv('FULLTEXT_MIN_SIMILARITY', '0.3')),
+}
+
+# Выгрузка результатов поиска в CSV/JSONL (PR44.py --export)
+EXPORT_CONFIG = {
+    'fetch_size': int(os.getenv('EXPORT_FETCH_SIZE', '5000')),
+    'buffer_bytes': int(os.getenv('EXPORT_BUFFER_KB', '1024')) * 1024,
+    'compress_level': int(os.getenv('EXPORT_GZIP_LEVEL', '6')),
+}
+
+# Фасеты результата поиска (жанр × год × рейтинг) по снимку в массивах NumPy
+FACETS_CONFIG = {
+    'enabled': os.getenv('FACETS_ENABLED', '1') == '1',
+    # через сколько секунд проверять, не изменились ли таблицы фильмов и жанров
+    'ttl': float(os.getenv('FACETS_TTL', '300')),
+}
+
+# Хранение лога запросов: срок жизни сырых записей и сжатие их в почасовые агрегаты
+RETENTION_CONFIG = {
+    # через сколько дней сырые записи лога удаляются TTL-индексом; 0 — хранить всегда
+    'raw_days': float(os.getenv('LOG_RETENTION_DAYS', '30')),
+    # записи старше этого срока сжимаются в почасовые агрегаты
+    'downsample_after_hours': float(os.getenv('LOG_DOWNSAMPLE_AFTER_HOURS', '24')),
+    # через сколько дней удаляются почасовые агрегаты; 0 — хранить всегда
+    'hourly_days': float(os.getenv('LOG_HOURLY_RETENTION_DAYS', '400')),
+    # через сколько дней без повторов запрос удаляется из сводки популярных и последних; 0 — хранить всегда
+    'rollup_days': float(os.getenv('LOG_ROLLUP_RETENTION_DAYS', '400')),
+    'downsample_enabled': os.getenv('LOG_DOWNSAMPLE_ENABLED', '1') == '1',
+    'interval_sec': float(os.getenv('LOG_DOWNSAMPLE_INTERVAL_SEC', '3600')),
+    # сколько часов сырого лога обрабатывается одной агрегацией
+    'batch_hours': int(os.getenv('LOG_DOWNSAMPLE_BATCH_HOURS', '24')),
+}
+
+# Медленные запросы: порог по типу запроса и фоновый EXPLAIN FORMAT=JSON на отдельном соединении
+SLOW_QUERY_CONFIG = {
+    'enabled': os.getenv('SLOW_QUERY_ENABLED', '1') == '1',
+    # порог в миллисекундах для типов, не перечисленных в thresholds_ms
+    'default_threshold_ms': float(os.getenv('SLOW_QUERY_DEFAULT_MS', '500')),
+    'thresholds_ms': _parse_ttl(os.getenv('SLOW_QUERY_THRESHOLDS_MS',
+                                          'title=200,genre_year=300,rating=300,pagination=100,fulltext=200')),
+    # сколько медленных запросов может ждать EXPLAIN; лишние сохраняются без плана
+    'queue_size': int(os.getenv('SLOW_QUERY_QUEUE_SIZE', '100')),
+    # сколько секунд план одного и того же запроса берётся из памяти, а не из нового EXPLAIN
+    'explain_ttl': float(os.getenv('SLOW_QUERY_EXPLAIN_TTL', '600')),
 }
@@ -0,0 +1,174 @@
+"""
+Выгрузка результатов поиска в файлы CSV или JSONL для последующей обработки.
+Строки читаются небуферизованным курсором SSCursor пачками fetchmany и сразу
+пишутся в буферизованный (при необходимости сжатый gzip) файл, поэтому
+выгрузка миллиона строк идёт в постоянной памяти. Выгрузка пишется в лог
+запросов MongoDB как отдельный тип "export".
+
+    python PR44.py --export rating --rating PG-13 --output pg13.csv.gz
+    python PR44.py --export listing --output films.jsonl
+"""
+import contextlib
+import csv
+import gzip
+import io
+import json
+import os
+from collections import namedtuple
+
+import pymysql
+import pymysql.cursors
+from config import EXPORT_CONFIG
+from film_record import FilmRecord
+from mongo_logger import connect_mongo, start_log_buffer, stop_log_buffer
+from mysql_connector import create_pool
+from search_api import SearchService
+
+# Что можно выгрузить: поисковые запросы и полный список фильмов
+EXPORT_TYPES = ("title", "genre_year", "rating", "listing")
+FORMATS = ("csv", "jsonl")
+
+# Итог выгрузки: путь, число строк, время в секундах и размер файла в байтах
+ExportResult = namedtuple('ExportResult', 'path rows duration size')
+
+
+def detect_format(path):
+    """Формат и признак сжатия по расширению: films.csv, films.jsonl.gz и т. п."""
+    name = path.lower()
+    compress = name.endswith('.gz')
+    if compress:
+        name = name[:-3]
+    fmt = os.path.splitext(name)[1].lstrip('.')
+    return (fmt if fmt in FORMATS else None), compress
+
+
+@contextlib.contextmanager
+def open_output(path, compress=False, buffer_bytes=None, compress_level=None):
+    """
+    Текстовый файл для записи с буфером buffer_bytes, при compress — сжатый gzip.
+    Пишется во временный файл рядом и переименовывается только после успешного
+    завершения, поэтому прерванная выгрузка не оставляет неполного файла.
+    """
+    buffer_bytes = buffer_bytes or EXPORT_CONFIG['buffer_bytes']
+    tmp_path = f"{path}.tmp"
+    try:
+        with contextlib.ExitStack() as stack:
+            binary = stack.enter_context(open(tmp_path, 'wb', buffering=buffer_bytes))
+            if compress:
+                level = EXPORT_CONFIG['compress_level'] if compress_level is None else compress_level
+                gz = stack.enter_context(gzip.GzipFile(
+                    filename=os.path.basename(path[:-3] if path.endswith('.gz') else path),
+                    mode='wb', fileobj=binary, compresslevel=level))
+                binary = stack.enter_context(io.BufferedWriter(gz, buffer_size=buffer_bytes))
+            yield stack.enter_context(io.TextIOWrapper(binary, encoding='utf-8', newline=''))
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def _csv_writer(out):
+    writer = csv.writer(out)
+    writer.writerow(FilmRecord.FIELDS)
+    return writer.writerows
+
+
+def _jsonl_writer(out):
+    fields = FilmRecord.FIELDS
+
+    def write(rows):
+        out.write(''.join(json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=str) + '\n'
+                          for row in rows))
+    return write
+
+
+_WRITERS = {"csv": _csv_writer, "jsonl": _jsonl_writer}
+
+
+def export(service, query_type, parameters, path, fmt=None, compress=None, fetch_size=None, progress=None):
+    """
+    Выгружает результат запроса query_type (см. EXPORT_TYPES) в файл path.
+    Формат и сжатие по умолчанию определяются по расширению файла. Кортежи
+    курсора пишутся как есть, без построения записей, в порядке полей
+    FilmRecord. progress(rows, elapsed) вызывается после каждой пачки.
+    """
+    if query_type not in EXPORT_TYPES:
+        raise ValueError(f"Неизвестный тип выгрузки: {query_type}")
+    detected_fmt, detected_compress = detect_format(path)
+    fmt = fmt or detected_fmt
+    if fmt not in FORMATS:
+        raise ValueError(f"Формат выгрузки должен быть одним из: {', '.join(FORMATS)}")
+    compress = detected_compress if compress is None else compress
+    fetch_size = fetch_size or EXPORT_CONFIG['fetch_size']
+
+    parameters, query, args = service.prepare(query_type, parameters)
+    trace = service.metrics.trace("export")
+    count = 0
+    with open_output(path, compress) as out:
+        write = _WRITERS[fmt](out)
+        with service.pool.cursor(pymysql.cursors.SSCursor) as cursor:
+            with trace.span("execute"):
+                cursor.execute(query, args)
+            while True:
+                with trace.span("fetch"):
+                    rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                with trace.span("format"):
+                    write(rows)
+                count += len(rows)
+                if progress is not None:
+                    progress(count, trace.elapsed())
+
+    duration = trace.elapsed()
+    # Путь в лог не пишется: одинаковые выгрузки в разные файлы считаются одним запросом
+    service.log("export", {"source": query_type, **parameters, "format": fmt + (".gz" if compress else "")},
+                count, duration, stages=trace.stages_ms())
+    trace.finish(total=duration)
+    return ExportResult(path, count, duration, os.path.getsize(path))
+
+
+def _parameters(args):
+    if args.export == "title":
+        return {"keyword": args.keyword or ''}
+    if args.export == "genre_year":
+        return {"genre": args.genre or '', "year_from": args.year_from, "year_to": args.year_to}
+    if args.export == "rating":
+        return {"rating": args.rating or ''}
+    return {}
+
+
+def run_cli(args):
+    """Точка входа для PR44.py --export."""
+    if not args.output:
+        print("Укажите файл выгрузки: --output FILE.csv|FILE.jsonl[.gz]")
+        return
+    if args.export == "genre_year" and (args.year_from is None or args.year_to is None):
+        print("Для выгрузки по жанру нужны --year-from и --year-to.")
+        return
+
+    pool = create_pool()
+    if pool is None:
+        print("Не удалось подключиться к MySQL. Завершение работы.")
+        return
+    mongo_db = connect_mongo()
+    if mongo_db is not None:
+        start_log_buffer(mongo_db)
+
+    def progress(rows, elapsed):
+        print(f"\rВыгружено {rows} строк ({rows / elapsed if elapsed else 0:.0f} строк/с)", end='', flush=True)
+
+    try:
+        result = export(SearchService(pool, mongo_db), args.export, _parameters(args), args.output,
+                        fmt=args.format, compress=True if args.gzip else None, progress=progress)
+        rate = result.rows / result.duration if result.duration else 0.0
+        print(f"\rВыгружено {result.rows} строк в {result.path} за {result.duration:.2f} с "
+              f"({rate:.0f} строк/с), размер файла {result.size / 1024:.1f} КБ")
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+    except pymysql.MySQLError as e:
+        print(f"Ошибка MySQL: {e}")
+    finally:
+        stop_log_buffer()
+        pool.close()
@@ -0,0 +1,209 @@
+"""
+Фасеты результата поиска: сколько найденных фильмов приходится на каждый
+жанр, год выпуска и рейтинг, и уточнение результата по одному из значений
+без повторного запроса к MySQL. Считаются по снимку таблиц film и
+film_category в столбцовых массивах NumPy векторными масками и bincount.
+NumPy — необязательная зависимость: без него фасеты просто отключены.
+"""
+import importlib.util
+import threading
+import time
+from collections import namedtuple
+
+# NumPy импортируется при создании первого FacetIndex, а не при запуске программы
+np = None
+
+AVAILABLE = importlib.util.find_spec("numpy") is not None  # без NumPy фасеты недоступны, поиск работает
+
+FILMS_QUERY = "SELECT film_id, release_year, rating FROM film ORDER BY film_id;"
+CATEGORIES_QUERY = "SELECT category_id, name FROM category ORDER BY name;"
+LINKS_QUERY = "SELECT film_id, category_id FROM film_category;"
+
+# Отметки изменений таблиц снимка: по ним решается, нужно ли перечитывать его после истечения TTL
+WATERMARK_QUERY = """
+    SELECT (SELECT MAX(last_update) FROM film) AS film_updated,
+           (SELECT COUNT(*) FROM film) AS films,
+           (SELECT MAX(last_update) FROM category) AS category_updated,
+           (SELECT MAX(last_update) FROM film_category) AS links_updated,
+           (SELECT COUNT(*) FROM film_category) AS links;
+"""
+
+# Столбцы снимка. Фильмы отсортированы по film_id; positions[film_id] — позиция
+# фильма в столбцах или -1 (прямая адресация вместо двоичного поиска по film_id).
+# Год и рейтинг хранятся кодами — номерами в year_labels и rating_labels (код
+# года 0 — год не указан). Жанры фильма — битовая маска: бит code % 64 в слове
+# genre_bits[позиция, code // 64]; на 16 жанров Sakila это одно слово на фильм.
+_Snapshot = namedtuple('_Snapshot', 'film_ids positions year_codes year_labels rating_codes rating_labels '
+                                    'genre_bits genre_labels genre_codes')
+
+Facets = namedtuple('Facets', 'genre year rating')
+
+
+def film_id_array(rows):
+    """film_id строк результата (записей FilmRecord) в виде массива NumPy."""
+    return np.fromiter((row.film_id for row in rows), dtype=np.int64, count=len(rows))
+
+
+def _codes(values, labels):
+    """Коды значений по порядку labels: номер значения в списке."""
+    index = {label: code for code, label in enumerate(labels)}
+    return np.fromiter((index[value] for value in values), dtype=np.int16, count=len(values))
+
+
+class FacetIndex:
+    """
+    Снимок для подсчёта фасетов. Загружается один раз; по истечении ttl секунд
+    проверяются отметки last_update и число строк, и снимок перечитывается
+    только при изменениях. Снимок заменяется целиком, поэтому чтение из
+    нескольких потоков не требует блокировок.
+    """
+
+    def __init__(self, ttl=300.0):
+        global np
+        if np is None:
+            import numpy as np
+        self.ttl = ttl
+        self.loaded = False
+        self._snapshot = None
+        self._watermarks = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # ---------- загрузка и обновление ----------
+
+    def load(self, cursor):
+        """Читает снимок; cursor должен возвращать кортежи (pymysql.cursors.Cursor)."""
+        cursor.execute(FILMS_QUERY)
+        films = cursor.fetchall()
+        cursor.execute(CATEGORIES_QUERY)
+        categories = cursor.fetchall()
+        cursor.execute(LINKS_QUERY)
+        links = cursor.fetchall()
+        cursor.execute(WATERMARK_QUERY)
+        watermarks = cursor.fetchone()
+
+        film_ids = np.fromiter((row[0] for row in films), dtype=np.int64, count=len(films))
+        positions = np.full(int(film_ids.max()) + 1 if len(film_ids) else 0, -1, dtype=np.int32)
+        positions[film_ids] = np.arange(len(film_ids), dtype=np.int32)
+        years = [row[1] for row in films]
+        known_years = [year for year in years if year is not None]
+        first_year = min(known_years, default=0)
+        year_labels = (None,) + tuple(range(first_year, max(known_years, default=-1) + 1))
+        year_codes = np.fromiter((0 if year is None else year - first_year + 1 for year in years),
+                                 dtype=np.int16, count=len(years))
+        ratings = [row[2] for row in films]
+        rating_labels = tuple(sorted(set(ratings), key=lambda rating: (rating is None, rating or '')))
+
+        genre_labels = tuple(name for _, name in categories)
+        category_codes = {category_id: code for code, (category_id, _) in enumerate(categories)}
+        link_ids = np.fromiter((row[0] for row in links), dtype=np.int64, count=len(links))
+        link_genres = np.fromiter((category_codes.get(row[1], -1) for row in links), dtype=np.int64,
+                                  count=len(links))
+        link_films, found = self._lookup(positions, link_ids)
+        keep = found & (link_genres >= 0)
+        link_films, link_genres = link_films[keep], link_genres[keep]
+        genre_bits = np.zeros((len(film_ids), max(1, -(-len(genre_labels) // 64))), dtype=np.uint64)
+        for word in range(genre_bits.shape[1]):
+            in_word = link_genres // 64 == word
+            np.bitwise_or.at(genre_bits[:, word], link_films[in_word],
+                             np.left_shift(np.uint64(1), (link_genres[in_word] % 64).astype(np.uint64)))
+
+        snapshot = _Snapshot(
+            film_ids=film_ids,
+            positions=positions,
+            year_codes=year_codes,
+            year_labels=year_labels,
+            rating_codes=_codes(ratings, rating_labels),
+            rating_labels=rating_labels,
+            genre_bits=genre_bits,
+            genre_labels=genre_labels,
+            genre_codes={name: code for code, name in enumerate(genre_labels)},
+        )
+        with self._lock:
+            self._snapshot = snapshot
+            self._watermarks = watermarks
+            self._checked_at = time.monotonic()
+            self.loaded = True
+
+    def maybe_refresh(self, cursor):
+        """Перечитывает снимок, если истёк TTL и в таблицах фильмов и жанров что-то изменилось."""
+        if self.loaded and (not self.ttl or time.monotonic() - self._checked_at < self.ttl):
+            return
+        if self.loaded:
+            cursor.execute(WATERMARK_QUERY)
+            if cursor.fetchone() == self._watermarks:
+                self._checked_at = time.monotonic()
+                return
+        self.load(cursor)
+
+    def is_stale(self):
+        """True, если снимок ещё не загружен или пора проверить его актуальность."""
+        return not self.loaded or bool(self.ttl) and time.monotonic() - self._checked_at >= self.ttl
+
+    # ---------- фасеты и уточнение ----------
+
+    @staticmethod
+    def _lookup(positions, ids):
+        """Позиции фильмов ids в столбцах снимка и маска найденных (для ненайденных позиция 0)."""
+        in_range = (ids >= 0) & (ids < len(positions))
+        found = np.full(len(ids), -1, dtype=np.int32)
+        found[in_range] = positions[ids[in_range]]
+        known = found >= 0
+        return np.where(known, found, 0), known
+
+    def counts(self, film_ids):
+        """
+        Facets со словарями {значение: число фильмов} по жанрам, годам и рейтингам
+        для фильмов film_ids; нулевые значения не включаются. Фильмы, которых
+        ещё нет в снимке, не учитываются.
+        """
+        snapshot = self._snapshot
+        positions, found = self._lookup(snapshot.positions, film_ids)
+        positions = positions[found]
+
+        bits = snapshot.genre_bits[positions]
+        genres = np.array([np.count_nonzero(bits[:, code // 64] & self._bit(code))
+                           for code in range(len(snapshot.genre_labels))], dtype=np.int64)
+        years = np.bincount(snapshot.year_codes[positions], minlength=len(snapshot.year_labels))
+        ratings = np.bincount(snapshot.rating_codes[positions], minlength=len(snapshot.rating_labels))
+        return Facets(
+            genre=self._nonzero(genres, snapshot.genre_labels, by_count=True),
+            year=self._nonzero(years, snapshot.year_labels),
+            rating=self._nonzero(ratings, snapshot.rating_labels, by_count=True),
+        )
+
+    @staticmethod
+    def _bit(code):
+        return np.uint64(1) << np.uint64(code % 64)
+
+    @staticmethod
+    def _nonzero(counts, labels, by_count=False):
+        codes = np.flatnonzero(counts)
+        if by_count:
+            codes = codes[np.argsort(-counts[codes], kind='stable')]
+        return {labels[code]: int(counts[code]) for code in codes}
+
+    def matching(self, film_ids, genre=None, year=None, rating=None):
+        """
+        Номера элементов film_ids (по порядку), подходящих под все заданные
+        значения фасетов. Неизвестное снимку значение ничему не соответствует.
+        """
+        snapshot = self._snapshot
+        positions, keep = self._lookup(snapshot.positions, film_ids)
+        if genre is not None:
+            code = snapshot.genre_codes.get(genre)
+            if code is None:
+                keep[:] = False
+            else:
+                keep &= (snapshot.genre_bits[positions, code // 64] & self._bit(code)) != 0
+        if year is not None:
+            keep &= self._codes_equal(snapshot.year_codes[positions], snapshot.year_labels, year)
+        if rating is not None:
+            keep &= self._codes_equal(snapshot.rating_codes[positions], snapshot.rating_labels, rating)
+        return np.flatnonzero(keep)
+
+    @staticmethod
+    def _codes_equal(codes, labels, value):
+        if value not in labels:
+            return np.zeros(len(codes), dtype=bool)
+        return codes == labels.index(value)
@@ -0,0 +1,223 @@
+import re
+import threading
+import time
+
+from film_record import GENRE_SEPARATOR, FilmRecord
+
+
+# Размер n-грамм индекса: для коротких запросов (1-2 символа) используются
+# n-граммы той же длины, для более длинных — пересечение триграмм.
+MAX_GRAM = 3
+
+
+def _grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _like_to_regex(keyword):
+    """
+    Переводит шаблон '%keyword%' в регулярное выражение с семантикой MySQL LIKE
+    (символы '%' и '_' в ключевом слове — подстановочные, '\\' экранирует).
+    """
+    parts = []
+    chars = iter(keyword)
+    for ch in chars:
+        if ch == '\\':
+            parts.append(re.escape(next(chars, '\\')))
+        elif ch == '%':
+            parts.append('.*')
+        elif ch == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(ch))
+    return re.compile('.*' + ''.join(parts) + '.*', re.DOTALL)
+
+
+def _literal_parts(keyword):
+    """Возвращает буквальные фрагменты шаблона LIKE между подстановочными символами."""
+    return [p for p in re.split(r'[%_\\]', keyword) if p]
+
+
+class FilmCatalog:
+    """
+    Снимок таблиц film, category и film_category в памяти с n-граммным индексом
+    по названиям. Результаты поиска совпадают с выдачей SQL-запроса
+    search_by_title, включая порядок ORDER BY release_year, title.
+    """
+
+    def __init__(self, refresh_interval=60.0):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._films = {}            # film_id -> (title, release_year, rating)
+        self._folded = {}           # film_id -> название в нижнем регистре
+        self._categories = {}       # category_id -> name
+        self._film_categories = {}  # film_id -> [category_id, ...]
+        self._grams = {}            # n-грамма -> set(film_id)
+        self._rank = {}             # film_id -> позиция в порядке (release_year, title)
+        self._watermarks = {'film': None, 'category': None, 'film_category': None}
+        self._last_refresh = 0.0
+        self.loaded = False
+
+    # ---------- загрузка и обновление ----------
+
+    def load(self, cursor):
+        """Полная загрузка снимка каталога из MySQL."""
+        cursor.execute("SELECT film_id, title, release_year, rating, last_update FROM film;")
+        film_rows = cursor.fetchall()
+        cursor.execute("SELECT category_id, name, last_update FROM category;")
+        category_rows = cursor.fetchall()
+        cursor.execute("SELECT film_id, category_id, last_update FROM film_category;")
+        link_rows = cursor.fetchall()
+
+        with self._lock:
+            self._films.clear()
+            self._folded.clear()
+            self._categories.clear()
+            self._film_categories.clear()
+            self._grams.clear()
+            self._watermarks = {'film': None, 'category': None, 'film_category': None}
+            self._apply(film_rows, category_rows, link_rows)
+            self._last_refresh = time.monotonic()
+            self.loaded = True
+
+    def refresh(self, cursor):
+        """
+        Инкрементальное обновление по столбцу last_update. Если после применения
+        изменений количество строк расходится с базой (были удаления или перенос
+        фильма в другой жанр), выполняется полная перезагрузка.
+        """
+        if not self.loaded:
+            self.load(cursor)
+            return
+
+        changes = {}
+        for table, columns in (('film', 'film_id, title, release_year, rating, last_update'),
+                               ('category', 'category_id, name, last_update'),
+                               ('film_category', 'film_id, category_id, last_update')):
+            watermark = self._watermarks[table]
+            if watermark is None:
+                cursor.execute(f"SELECT {columns} FROM {table};")
+            else:
+                cursor.execute(f"SELECT {columns} FROM {table} WHERE last_update >= %s;", (watermark,))
+            changes[table] = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT (SELECT COUNT(*) FROM film) AS films,
+                   (SELECT COUNT(*) FROM category) AS categories,
+                   (SELECT COUNT(*) FROM film_category) AS links;
+        """)
+        counts = cursor.fetchone()
+
+        with self._lock:
+            self._apply(changes['film'], changes['category'], changes['film_category'])
+            self._last_refresh = time.monotonic()
+            consistent = (
+                counts['films'] == len(self._films)
+                and counts['categories'] == len(self._categories)
+                and counts['links'] == sum(len(ids) for ids in self._film_categories.values())
+            )
+
+        if not consistent:
+            self.load(cursor)
+
+    def maybe_refresh(self, cursor):
+        """Обновляет снимок, если с момента последнего обновления прошло refresh_interval секунд."""
+        if self.refresh_interval and time.monotonic() - self._last_refresh >= self.refresh_interval:
+            self.refresh(cursor)
+
+    def _apply(self, film_rows, category_rows, link_rows):
+        for row in category_rows:
+            self._categories[row['category_id']] = row['name']
+            self._bump_watermark('category', row['last_update'])
+
+        for row in film_rows:
+            film_id = row['film_id']
+            old_folded = self._folded.get(film_id)
+            if old_folded is not None:
+                self._unindex(film_id, old_folded)
+            folded = (row['title'] or '').lower()
+            self._films[film_id] = (row['title'], row['release_year'], row['rating'])
+            self._folded[film_id] = folded
+            self._index(film_id, folded)
+            self._bump_watermark('film', row['last_update'])
+
+        for row in link_rows:
+            ids = self._film_categories.setdefault(row['film_id'], [])
+            if row['category_id'] not in ids:
+                ids.append(row['category_id'])
+                ids.sort()
+            self._bump_watermark('film_category', row['last_update'])
+
+        if film_rows:
+            self._rebuild_rank()
+
+    def _bump_watermark(self, table, value):
+        if value is not None and (self._watermarks[table] is None or value > self._watermarks[table]):
+            self._watermarks[table] = value
+
+    def _index(self, film_id, folded):
+        for n in range(1, MAX_GRAM + 1):
+            for gram in _grams(folded, n):
+                self._grams.setdefault(gram, set()).add(film_id)
+
+    def _unindex(self, film_id, folded):
+        for n in range(1, MAX_GRAM + 1):
+            for gram in _grams(folded, n):
+                ids = self._grams.get(gram)
+                if ids is not None:
+                    ids.discard(film_id)
+                    if not ids:
+                        del self._grams[gram]
+
+    def _rebuild_rank(self):
+        # NULL в release_year MySQL ставит первым при сортировке по возрастанию
+        order = sorted(self._films, key=lambda fid: (
+            self._films[fid][1] is not None, self._films[fid][1] or 0, self._folded[fid], fid))
+        self._rank = {film_id: pos for pos, film_id in enumerate(order)}
+
+    # ---------- поиск ----------
+
+    def _candidates(self, needle):
+        """Фильмы, название которых может содержать подстроку needle (по n-граммам)."""
+        if not needle:
+            return set(self._films)
+        if len(needle) <= MAX_GRAM:
+            return set(self._grams.get(needle, ()))
+        grams = sorted((self._grams.get(g, set()) for g in _grams(needle, MAX_GRAM)), key=len)
+        if not grams[0]:
+            return set()
+        result = set(grams[0])
+        for ids in grams[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def search_title(self, keyword):
+        """
+        Аналог запроса WHERE f.title LIKE '%keyword%' ORDER BY f.release_year, f.title:
+        возвращает записи FilmRecord, по одной на фильм, со всеми жанрами в genre.
+        """
+        folded = keyword.lower()
+        with self._lock:
+            if any(ch in folded for ch in '%_\\'):
+                pattern = _like_to_regex(folded)
+                literals = _literal_parts(folded)
+                candidates = self._candidates(max(literals, key=len)) if literals else set(self._films)
+                matched = [fid for fid in candidates if pattern.fullmatch(self._folded[fid])]
+            else:
+                matched = [fid for fid in self._candidates(folded) if folded in self._folded[fid]]
+
+            matched.sort(key=self._rank.__getitem__)
+
+            results = []
+            for film_id in matched:
+                # Как GROUP_CONCAT(... ORDER BY c.name) с регистронезависимой сортировкой MySQL
+                names = sorted((self._categories[category_id]
+                                for category_id in self._film_categories.get(film_id, ())
+                                if category_id in self._categories), key=str.casefold)
+                if not names:
+                    continue
+                title, release_year, rating = self._films[film_id]
+                results.append(FilmRecord(film_id, title, release_year, rating, GENRE_SEPARATOR.join(names)))
+            return results
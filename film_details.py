@@ -0,0 +1,114 @@
+import itertools
+import threading
+from collections import OrderedDict
+
+from film_record import GENRES_SQL, FilmDetails
+
+# Один фильм — одна строка; фильм без жанров тоже попадает в выдачу (genre IS NULL)
+DETAILS_QUERY = f"""
+    SELECT f.film_id, f.title, f.release_year, f.rating, {GENRES_SQL} AS genre, f.description
+    FROM film f
+    LEFT JOIN film_category fc ON f.film_id = fc.film_id
+    LEFT JOIN category c ON fc.category_id = c.category_id
+    WHERE f.film_id IN ({{placeholders}})
+    GROUP BY f.film_id;
+"""
+
+
+def fetch_details(cursor, film_ids):
+    """
+    Загружает детали фильмов одним запросом WHERE film_id IN (...) с жанрами,
+    склеенными в SQL. Возвращает словарь {film_id: FilmDetails}.
+    """
+    film_ids = list(dict.fromkeys(film_ids))
+    if not film_ids:
+        return {}
+    cursor.execute(DETAILS_QUERY.format(placeholders=', '.join(['%s'] * len(film_ids))), film_ids)
+    return {
+        row['film_id']: FilmDetails(row['film_id'], row['title'], row['release_year'], row['rating'],
+                                    row['genre'], row['description'])
+        for row in cursor.fetchall()
+    }
+
+
+class FilmDetailsCache:
+    """
+    Ограниченный LRU-кэш деталей фильмов на время сеанса. Детали для всей
+    показанной страницы или результата поиска подгружаются заранее пачками
+    (prefetch), поэтому открытие любого фильма из списка не требует запроса.
+    """
+
+    def __init__(self, max_entries=1000, batch_size=500):
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.stats = {"hits": 0, "misses": 0, "prefetched": 0, "queries": 0}
+        self._entries = OrderedDict()  # film_id -> детали
+        self._lock = threading.Lock()
+
+    def prefetch(self, cursor, film_ids):
+        """
+        Догружает детали отсутствующих в кэше фильмов. Берётся не больше
+        max_entries первых film_id, чтобы загруженное не вытесняло само себя.
+        """
+        candidates = dict.fromkeys(itertools.islice(film_ids, self.max_entries))
+        with self._lock:
+            wanted = [film_id for film_id in candidates if film_id not in self._entries]
+        for start in range(0, len(wanted), self.batch_size):
+            batch = wanted[start:start + self.batch_size]
+            self._store(fetch_details(cursor, batch))
+            with self._lock:
+                self.stats["prefetched"] += len(batch)
+
+    def get(self, film_id):
+        """Детали фильма из кэша без обращения к базе; None при промахе."""
+        with self._lock:
+            film = self._entries.get(film_id)
+            if film is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(film_id)
+            self.stats["hits"] += 1
+            return film
+
+    def load(self, cursor, film_id):
+        """Детали фильма из кэша или отдельным запросом с сохранением в кэш; None — фильма нет."""
+        with self._lock:
+            film = self._entries.get(film_id)
+        if film is not None:
+            return film
+        details = fetch_details(cursor, [film_id])
+        self._store(details)
+        return details.get(film_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0,
+            }
+
+    def _store(self, details):
+        with self._lock:
+            self.stats["queries"] += 1
+            for film_id, film in details.items():
+                self._entries[film_id] = film
+                self._entries.move_to_end(film_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def show_details_stats(details):
+    print("\nСтатистика кэша деталей фильмов:")
+    if details is None:
+        print("Кэш деталей отключён.")
+        return
+    stats = details.snapshot()
+    print(f"   Фильмов: {stats['entries']} из {details.max_entries}")
+    print(f"   Попадания: {stats['hits']}, промахи: {stats['misses']} (доля попаданий {stats['hit_ratio']:.1%})")
+    print(f"   Загружено заранее: {stats['prefetched']}, запросов к MySQL: {stats['queries']}")
@@ -0,0 +1,92 @@
+"""
+Компактное представление строк результатов поиска. Вместо словаря DictCursor
+на строку — объект со __slots__; повторяющиеся значения рейтинга и списка
+жанров интернируются и хранятся в одном экземпляре на весь процесс, а жанры
+фильма склеиваются в SQL через GROUP_CONCAT, поэтому фильм — одна строка.
+"""
+import sys
+
+# Разделитель жанров в поле genre: тот же, что в GROUP_CONCAT запросов
+GENRE_SEPARATOR = ', '
+
+# Выражение для списка жанров фильма в SQL-запросах, отсортированного по названию
+GENRES_SQL = f"GROUP_CONCAT(c.name ORDER BY c.name SEPARATOR '{GENRE_SEPARATOR}')"
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class FilmRecord:
+    """
+    Строка результата: film_id, title, release_year, rating и genre — все жанры
+    фильма через GENRE_SEPARATOR. Порядок полей совпадает с порядком столбцов
+    поисковых запросов, поэтому запись строится прямо из кортежа курсора.
+    """
+
+    __slots__ = ('film_id', 'title', 'release_year', 'rating', 'genre')
+
+    # Все поля записи по порядку; в подклассах дополняются их собственными
+    FIELDS = __slots__
+
+    # Поля со значениями, общими для многих строк (интернированы)
+    SHARED_FIELDS = ('rating', 'genre')
+
+    def __init__(self, film_id, title, release_year, rating, genre):
+        self.film_id = film_id
+        self.title = title
+        self.release_year = release_year
+        self.rating = _intern(rating)
+        self.genre = _intern(genre)
+
+    @property
+    def genres(self):
+        return self.genre.split(GENRE_SEPARATOR) if self.genre else []
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def estimated_size(self):
+        """Объём записи в байтах без учёта интернированных значений, общих для всех строк."""
+        size = sys.getsizeof(self)
+        for name in self.FIELDS:
+            if name not in self.SHARED_FIELDS:
+                size += sys.getsizeof(getattr(self, name))
+        return size
+
+    def __eq__(self, other):
+        if not isinstance(other, FilmRecord):
+            return NotImplemented
+        return self.FIELDS == other.FIELDS and all(
+            getattr(self, name) == getattr(other, name) for name in self.FIELDS)
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS)
+        return f"{type(self).__name__}({fields})"
+
+
+class ScoredFilmRecord(FilmRecord):
+    """Запись результата полнотекстового поиска с оценкой релевантности."""
+
+    __slots__ = ('score',)
+    FIELDS = FilmRecord.FIELDS + __slots__
+
+    def __init__(self, film_id, title, release_year, rating, genre, score):
+        super().__init__(film_id, title, release_year, rating, genre)
+        self.score = score
+
+
+class FilmDetails(FilmRecord):
+    """Детали фильма для карточки: запись с описанием."""
+
+    __slots__ = ('description',)
+    FIELDS = FilmRecord.FIELDS + __slots__
+
+    def __init__(self, film_id, title, release_year, rating, genre, description):
+        super().__init__(film_id, title, release_year, rating, genre)
+        self.description = description
+
+
+def to_records(rows):
+    """Записи из кортежей курсора с порядком столбцов FilmRecord."""
+    return [FilmRecord(*row) for row in rows]
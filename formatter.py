@@ -1,89 +1,228 @@
+import itertools
+import sys
+from array import array
+
+import pymysql
+from film_details import fetch_details
+from instrumentation import metrics
+from prefix_index import PrefixIndex, completion
+
+# Колонки таблицы фильмов и их минимальная ширина
+_MIN_WIDTHS = (('title', 10), ('genre', 6), ('rating', 3))
+
+
+def _layout(sample, last_index):
+    """
+    Строит формат строки таблицы и шапку по образцу строк: ширина колонки —
+    самое длинное значение в образце, номер — по последнему номеру строки.
+    """
+    idx_width = max(2, len(str(last_index)))
+    title_w, genre_w, rating_w = (
+        max(minimum, max((len(str(getattr(r, column) or '')) for r in sample), default=0))
+        for column, minimum in _MIN_WIDTHS
+    )
+
+    fmt = f"{{idx:>{idx_width}}}. {{title:<{title_w}}}  — жанр: {{genre:<{genre_w}}}  — рейтинг: {{rating:<{rating_w}}}"
+    header = [
+        f" №  {'Название фильма':<{title_w}}  Жанр{' ' * (genre_w - 4)}  Рейтинг",
+        '-' * (idx_width + 3 + title_w + genre_w + rating_w + 12),
+    ]
+    return fmt, header
+
+
+def _film_lines(films, fmt, group_by, start_index):
+    """Строки таблицы с заголовками групп; films — любой итератор записей FilmRecord."""
+    key = {'year': 'release_year', 'genre': 'genre'}.get(group_by)
+    current = None
+    for i, film in enumerate(films, start_index):
+        if key is not None and getattr(film, key) != current:
+            current = getattr(film, key)
+            yield f"\n{key.capitalize()}: {current}"
+        yield fmt.format(idx=i, title=film.title or '', genre=film.genre or '', rating=film.rating or '')
+
 
 def print_films(results, group_by='year', start_index=1):
     """
-    Печатает список фильмов в таблице, сгруппированной по году или жанру.
+    Печатает список записей FilmRecord в таблице, сгруппированной по году или жанру.
     """
     if not results:
         print("Ничего не найдено.")
         return
 
-    last_index = start_index + len(results) - 1
-    idx_width = max(2, len(str(last_index)))
+    fmt, header = _layout(results, start_index + len(results) - 1)
+    for line in itertools.chain(header, _film_lines(results, fmt, group_by, start_index)):
+        print(line)
 
-    max_title = max((len(str(r.get('title') or '')) for r in results), default=0)
-    max_genre = max((len(str(r.get('genre') or '')) for r in results), default=0)
-    max_rating = max((len(str(r.get('rating') or '')) for r in results), default=0)
 
-    title_w = max(10, max_title)
-    genre_w = max(6, max_genre)
-    rating_w = max(3, max_rating)
+def print_films_stream(rows, group_by='year', start_index=1, lookahead=200, chunk_size=100):
+    """
+    Потоковый вариант print_films для результатов неограниченного размера.
+    Ширина колонок берётся по первым lookahead строкам (более длинные значения
+    дальше просто сдвигают строку), вывод идёт пачками по chunk_size строк по
+    мере поступления данных. В памяти остаются только окно look-ahead, текущая
+    пачка и компактный массив film_id для последующего выбора фильма.
+
+    Возвращает array('l') с film_id в порядке вывода; при пустом результате
+    ничего не печатает — сообщение выводит вызывающий код.
+    """
+    rows = iter(rows)
+    head = list(itertools.islice(rows, lookahead))
+    film_ids = array('l')
+    if not head:
+        return film_ids
+
+    # Номера за пределами окна могут оказаться длиннее — оставляем запас в один разряд
+    fmt, header = _layout(head, (start_index + len(head) - 1) * 10)
+
+    def films():
+        for film in itertools.chain(head, rows):
+            film_ids.append(film.film_id)
+            yield film
+
+    lines = _film_lines(films(), fmt, group_by, start_index)
+    write = sys.stdout.write
+    write('\n'.join(header) + '\n')
+    while True:
+        chunk = list(itertools.islice(lines, chunk_size))
+        if not chunk:
+            break
+        write('\n'.join(chunk) + '\n')
+        sys.stdout.flush()
+    return film_ids
 
-    fmt = f"{{idx:>{idx_width}}}. {{title:<{title_w}}}  — жанр: {{genre:<{genre_w}}}  — рейтинг: {{rating:<{rating_w}}}"
 
-    print(f" №  {'Название фильма':<{title_w}}  Жанр{' ' * (genre_w - 4)}  Рейтинг")
-    print('-' * (idx_width + 3 + title_w + genre_w + rating_w + 12))
+def print_facets(facets, limit=12):
+    """Печатает счётчики фасетов: жанры и рейтинги по убыванию, годы по порядку."""
+    if facets is None:
+        return
+    sections = (('Жанры', facets.genre), ('Годы', facets.year), ('Рейтинги', facets.rating))
+    for name, counts in sections:
+        if not counts:
+            continue
+        items = [f"{'не указан' if value is None else value}: {count}" for value, count in counts.items()]
+        more = len(items) - limit
+        print(f"{name}: " + ", ".join(items[:limit]) + (f" и ещё {more}" if more > 0 else ""))
+
+
+def prefetch_details(pool, details, film_ids):
+    """Подгружает детали показанных фильмов одним пакетным запросом; ошибка не мешает выбору."""
+    if details is None or not film_ids:
+        return
+    try:
+        with metrics.span("details", "prefetch"), pool.cursor() as cursor:
+            details.prefetch(cursor, film_ids)
+    except pymysql.MySQLError:
+        pass  # детали загрузятся по одному при выборе фильма
 
-    def print_grouped(key):
-        current = None
-        for offset, film in enumerate(results):
-            i = start_index + offset
-            if film.get(key) != current:
-                current = film.get(key)
-                print(f"\n{key.capitalize()}: {current}")
-            print(fmt.format(idx=i, title=film.get('title', ''), genre=film.get('genre', ''), rating=film.get('rating', '')))
 
-    if group_by in ('year', 'genre'):
-        print_grouped('release_year' if group_by == 'year' else 'genre')
-    else:
-        for offset, film in enumerate(results):
-            i = start_index + offset
-            print(fmt.format(idx=i, title=film.get('title', ''), genre=film.get('genre', ''), rating=film.get('rating', '')))
+def _film_by_title(choice, titles):
+    """film_id по точному названию или однозначному префиксу; при неоднозначности печатает варианты."""
+    film_id = titles.unique(choice)
+    if film_id is None and titles.count(choice) > 1:
+        options = titles.complete(choice, limit=10)
+        more = titles.count(choice) - len(options)
+        print("Подходит несколько фильмов: " + "; ".join(options) + (f" и ещё {more}" if more > 0 else ""))
+    return film_id
 
 
-def select_film(cursor, results, offset=0):
+def select_film(pool, results, offset=0, details=None):
     """
     Позволяет пользователю выбрать фильм по номеру или названию и показать его детали.
+    Номер — позиция в results; название ищется среди results (достаточно
+    однозначного начала, Tab дополняет). Детали всех показанных фильмов заранее
+    загружаются в кэш details, если он задан; соединение из пула берётся только
+    при промахе кэша.
     """
     if not results:
         return
 
-    id_map = {str(offset + idx + 1): film['film_id'] for idx, film in enumerate(results)}
-    title_map = {film['title'].lower(): film['film_id'] for film in results}
+    prefetch_details(pool, details, [film.film_id for film in results])
+    shown = PrefixIndex((film.title, film.film_id) for film in results)
 
     while True:
-        choice = input("\nВведите номер или название фильма для просмотра деталей (Enter — выход): ").strip()
+        with completion(shown):
+            choice = input("\nВведите номер или название фильма для просмотра деталей (Enter — выход): ").strip()
         if not choice:
             return
 
-        film_id = id_map.get(choice) or title_map.get(choice.lower())
+        film_id = None
+        if choice.isdigit() and 0 <= int(choice) - offset - 1 < len(results):
+            film_id = results[int(choice) - offset - 1].film_id
+        else:
+            film_id = _film_by_title(choice, shown)
+
         if film_id:
-            show_film_details(cursor, film_id)
+            open_film_details(pool, film_id, details)
             return  # не возвращаемся к списку
         else:
             print("Фильм не найден. Попробуйте снова.")
 
 
-def show_film_details(cursor, film_id):
+def select_film_by_ids(pool, film_ids, offset=0, details=None, titles=None):
+    """
+    Выбор фильма после потокового вывода, когда строк результата в памяти нет:
+    номер ищется в массиве film_ids, название — среди показанных фильмов по
+    префиксному индексу titles, а без него — запросом к таблице film.
     """
-    Выводит подробности по ID фильма.
+    if not film_ids:
+        return
+    prefetch_details(pool, details, film_ids)
+    shown = titles.subset(film_ids) if titles is not None else None
+
+    while True:
+        with completion(shown):
+            choice = input("\nВведите номер или название фильма для просмотра деталей (Enter — выход): ").strip()
+        if not choice:
+            return
+
+        film_id = None
+        if choice.isdigit():
+            idx = int(choice) - offset - 1
+            if 0 <= idx < len(film_ids):
+                film_id = film_ids[idx]
+        elif shown is not None:
+            film_id = _film_by_title(choice, shown)
+        else:
+            with pool.cursor() as cursor:
+                cursor.execute("SELECT film_id FROM film WHERE title = %s;", (choice,))
+                film_id = next((row['film_id'] for row in cursor.fetchall() if row['film_id'] in film_ids), None)
+
+        if film_id:
+            open_film_details(pool, film_id, details)
+            return  # не возвращаемся к списку
+        print("Фильм не найден. Попробуйте снова.")
+
+
+def open_film_details(pool, film_id, details=None):
+    """Показывает детали фильма; при попадании в кэш details обходится без соединения с базой."""
+    film = details.get(film_id) if details is not None else None
+    if film is not None:
+        with metrics.span("details", "cache"):
+            _print_details(film)
+        return
+    with metrics.span("details", "execute"), pool.cursor() as cursor:
+        show_film_details(cursor, film_id, details)
+
+
+def show_film_details(cursor, film_id, details=None):
     """
-    query = """
-        SELECT f.title, f.description, f.release_year, f.rating, c.name AS genre
-        FROM film f
-        JOIN film_category fc ON f.film_id = fc.film_id
-        JOIN category c ON fc.category_id = c.category_id
-        WHERE f.film_id = %s;
+    Выводит подробности по ID фильма со всеми его жанрами.
     """
-    cursor.execute(query, (film_id,))
-    film = cursor.fetchone()
+    if details is not None:
+        film = details.load(cursor, film_id)
+    else:
+        film = fetch_details(cursor, [film_id]).get(film_id)
+    _print_details(film)
+
 
+def _print_details(film):
     if not film:
         print("Фильм не найден.")
         return
 
-    print(f"\nНазвание: {film['title']} ({film['release_year']})")
+    print(f"\nНазвание: {film.title} ({film.release_year})")
     print('-' * 50)
-    print(f"Описание: {film['description']}")
-    print(f"Жанр: {film['genre']}")
-    print(f"Рейтинг: {film['rating']}")
-    print(f"Год: {film['release_year']}")
\ No newline at end of file
+    print(f"Описание: {film.description}")
+    print(f"Жанр: {film.genre or ''}")
+    print(f"Рейтинг: {film.rating}")
+    print(f"Год: {film.release_year}")
@@ -0,0 +1,251 @@
+"""
+Полнотекстовый поиск по названию и описанию фильмов: инвертированный индекс
+с ранжированием BM25 и терпимостью к опечаткам через сходство триграмм.
+Индекс строится из MySQL и сохраняется в компактный файл, который при
+следующем запуске переиспользуется, если таблицы film и film_category не
+менялись.
+"""
+import heapq
+import json
+import math
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from collections import Counter
+
+from film_record import GENRE_SEPARATOR, ScoredFilmRecord
+
+FORMAT_VERSION = 1
+MAGIC = b"FTX1"
+
+# Вхождение слова в название весит как TITLE_WEIGHT вхождений в описание
+TITLE_WEIGHT = 3
+# Параметры BM25
+K1 = 1.2
+B = 0.75
+# Исправление опечаток: сколько ближайших слов словаря подставлять вместо неизвестного
+FUZZY_EXPANSIONS = 3
+FUZZY_MIN_LENGTH = 3
+
+_TOKEN = re.compile(r"\w+")
+
+FILMS_QUERY = "SELECT film_id, title, description, release_year, rating FROM film ORDER BY film_id;"
+
+GENRES_QUERY = """
+    SELECT fc.film_id, c.name
+    FROM film_category fc
+    JOIN category c ON fc.category_id = c.category_id
+    ORDER BY fc.film_id, c.name;
+"""
+
+WATERMARK_QUERY = """
+    SELECT (SELECT MAX(last_update) FROM film) AS film_updated,
+           (SELECT COUNT(*) FROM film) AS films,
+           (SELECT MAX(last_update) FROM film_category) AS links_updated,
+           (SELECT COUNT(*) FROM film_category) AS links;
+"""
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре; однобуквенные слова не индексируются."""
+    return [token for token in _TOKEN.findall((text or '').lower()) if len(token) > 1]
+
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def read_watermark(cursor):
+    """Отметка состояния таблиц, по которой сохранённый индекс признаётся актуальным."""
+    cursor.execute(WATERMARK_QUERY)
+    row = cursor.fetchone()
+    return {name: str(value) for name, value in row.items()}
+
+
+class FullTextIndex:
+    """
+    Неизменяемый после построения индекс. Списки вхождений хранятся в плоских
+    массивах: для слова с номером t документы лежат в docs[offsets[t]:offsets[t + 1]],
+    частоты — в тех же позициях массива tfs.
+    """
+
+    def __init__(self, films, terms, doc_lengths, offsets, docs, tfs, watermark=None):
+        self.films = films              # [(film_id, title, release_year, rating, genre), ...]
+        self.terms = terms              # отсортированный словарь
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.doc_lengths = doc_lengths  # array('I')
+        self.offsets = offsets          # array('I'), len(terms) + 1
+        self.docs = docs                # array('I'), номера документов в films
+        self.tfs = tfs                  # array('H')
+        self.watermark = watermark
+        self.avgdl = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+        self._trigram_index = None
+        self._lock = threading.Lock()
+
+    # ---------- построение ----------
+
+    @classmethod
+    def build(cls, cursor):
+        watermark = read_watermark(cursor)
+        cursor.execute(GENRES_QUERY)
+        genres = {}
+        for row in cursor.fetchall():
+            genres.setdefault(row['film_id'], []).append(row['name'])
+
+        cursor.execute(FILMS_QUERY)
+        films = []
+        doc_lengths = array('I')
+        postings = {}  # слово -> ([документы], [частоты])
+        for doc, row in enumerate(cursor.fetchall()):
+            counts = Counter(tokenize(row['description']))
+            for token in tokenize(row['title']):
+                counts[token] += TITLE_WEIGHT
+            films.append((row['film_id'], row['title'], row['release_year'], row['rating'],
+                          GENRE_SEPARATOR.join(genres.get(row['film_id'], ()))))
+            doc_lengths.append(sum(counts.values()))
+            for token, tf in counts.items():
+                doc_list, tf_list = postings.setdefault(token, ([], []))
+                doc_list.append(doc)
+                tf_list.append(min(tf, 0xFFFF))
+
+        terms = sorted(postings)
+        offsets, docs, tfs = array('I', [0]), array('I'), array('H')
+        for term in terms:
+            doc_list, tf_list = postings[term]
+            docs.extend(doc_list)
+            tfs.extend(tf_list)
+            offsets.append(len(docs))
+        return cls(films, terms, doc_lengths, offsets, docs, tfs, watermark)
+
+    # ---------- поиск ----------
+
+    def search(self, text, limit=20, fuzzy=True, min_similarity=0.3):
+        """
+        Фильмы, ранжированные по BM25 по словам запроса. Неизвестные словарю слова
+        при fuzzy заменяются ближайшими по сходству триграмм с весом, равным
+        сходству. Возвращает записи ScoredFilmRecord с оценкой в поле score.
+        """
+        weights = {}
+        for token in dict.fromkeys(tokenize(text)):
+            term_id = self.term_ids.get(token)
+            if term_id is not None:
+                weights[term_id] = 1.0
+            elif fuzzy and len(token) >= FUZZY_MIN_LENGTH:
+                for similar_id, similarity in self._similar_terms(token, min_similarity):
+                    weights[similar_id] = max(weights.get(similar_id, 0.0), similarity)
+
+        total = len(self.films)
+        scores = {}
+        for term_id, weight in weights.items():
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            df = end - start
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for doc, tf in zip(self.docs[start:end], self.tfs[start:end]):
+                norm = K1 * (1 - B + B * self.doc_lengths[doc] / self.avgdl)
+                scores[doc] = scores.get(doc, 0.0) + weight * idf * tf * (K1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [self._row(doc, score) for doc, score in best]
+
+    def _row(self, doc, score):
+        return ScoredFilmRecord(*self.films[doc], round(score, 4))
+
+    def _similar_terms(self, token, min_similarity):
+        index, gram_counts = self._trigrams()
+        grams = trigrams(token)
+        shared = Counter()
+        for gram in grams:
+            shared.update(index.get(gram, ()))
+        candidates = []
+        for term_id, common in shared.items():
+            similarity = common / (len(grams) + gram_counts[term_id] - common)
+            if similarity >= min_similarity:
+                candidates.append((similarity, term_id))
+        return [(term_id, similarity) for similarity, term_id in heapq.nlargest(FUZZY_EXPANSIONS, candidates)]
+
+    def _trigrams(self):
+        # Индекс триграмм словаря строится при первом нечётком поиске и на диск не пишется
+        with self._lock:
+            if self._trigram_index is None:
+                index, gram_counts = {}, array('H')
+                for term_id, term in enumerate(self.terms):
+                    grams = trigrams(term)
+                    gram_counts.append(len(grams))
+                    for gram in grams:
+                        index.setdefault(gram, []).append(term_id)
+                self._trigram_index = (index, gram_counts)
+            return self._trigram_index
+
+    # ---------- хранение ----------
+
+    def save(self, path):
+        """Записывает индекс в файл: заголовок JSON и массивы, сжатые zlib; запись атомарная."""
+        arrays = (self.doc_lengths, self.offsets, self.docs, self.tfs)
+        header = json.dumps({
+            "version": FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "watermark": self.watermark,
+            "films": self.films,
+            "terms": self.terms,
+            "arrays": [[a.typecode, len(a)] for a in arrays],
+        }, ensure_ascii=False).encode("utf-8")
+        body = struct.pack("<I", len(header)) + header + b"".join(a.tobytes() for a in arrays)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(zlib.compress(body, 6))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Читает индекс из файла; None, если файла нет или он другого формата."""
+        try:
+            with open(path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    return None
+                body = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            return None
+
+        (header_length,) = struct.unpack_from("<I", body)
+        header = json.loads(body[4:4 + header_length].decode("utf-8"))
+        if header.get("version") != FORMAT_VERSION:
+            return None
+
+        position = 4 + header_length
+        arrays = []
+        for typecode, length in header["arrays"]:
+            values = array(typecode)
+            size = values.itemsize * length
+            values.frombytes(body[position:position + size])
+            if header["byteorder"] != sys.byteorder:
+                values.byteswap()
+            arrays.append(values)
+            position += size
+
+        films = [tuple(film) for film in header["films"]]
+        return cls(films, header["terms"], *arrays, watermark=header["watermark"])
+
+
+def open_index(cursor, path=None):
+    """
+    Индекс из файла path, если он соответствует текущему состоянию таблиц,
+    иначе строит его заново из MySQL и сохраняет в path.
+    """
+    if path:
+        index = FullTextIndex.load(path)
+        if index is not None and index.watermark == read_watermark(cursor):
+            return index
+    index = FullTextIndex.build(cursor)
+    if path:
+        try:
+            index.save(path)
+        except OSError as e:
+            print(f"Не удалось сохранить полнотекстовый индекс в {path}: {e}")
+    return index
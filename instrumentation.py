@@ -0,0 +1,177 @@
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from config import INSTRUMENTATION_CONFIG
+
+# Точность гистограмм: 2**SUB_BITS поддиапазонов на каждую степень двойки,
+# относительная погрешность значения не больше 1 / 2**SUB_BITS (~0.8%)
+SUB_BITS = 7
+
+# Порядок этапов в отчёте; прочие этапы выводятся после них по алфавиту
+STAGE_ORDER = ("cache", "execute", "fetch", "convert", "catalog", "fulltext", "facets", "format", "details", "log",
+               "total")
+
+
+class Histogram:
+    """
+    Гистограмма длительностей в духе HdrHistogram: значения в микросекундах
+    раскладываются по логарифмически-линейным корзинам, поэтому объём памяти
+    не зависит от числа замеров, а перцентили считаются с ограниченной
+    относительной погрешностью.
+    """
+
+    def __init__(self):
+        self.counts = {}  # (показатель, мантисса) -> число замеров
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def _bucket(micros):
+        shift = max(0, micros.bit_length() - SUB_BITS - 1)
+        return shift, micros >> shift
+
+    @staticmethod
+    def _value(bucket):
+        # Середина корзины, в секундах
+        shift, mantissa = bucket
+        return ((mantissa << shift) + ((1 << shift) - 1) / 2) / 1e6
+
+    def record(self, seconds):
+        bucket = self._bucket(max(0, int(seconds * 1e6)))
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, p):
+        """Значение перцентиля p (0-100) в секундах методом ближайшего ранга."""
+        if not self.count:
+            return 0.0
+        rank = max(1, -(-p * self.count // 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self._value(bucket), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": (self.max or 0.0) * 1000,
+        }
+
+
+class Trace:
+    """Замеры этапов одного запроса; после finish() попадают в гистограммы Metrics."""
+
+    def __init__(self, metrics, query_type):
+        self.metrics = metrics
+        self.query_type = query_type
+        self.stages = {}  # этап -> секунды
+        self.statement = None  # последний выполненный SQL (запрос, аргументы) — для EXPLAIN медленных запросов
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def stages_ms(self):
+        return {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()}
+
+    def finish(self, total=None):
+        self.metrics.record(self.query_type, "total", self.elapsed() if total is None else total)
+        for stage, seconds in self.stages.items():
+            self.metrics.record(self.query_type, stage, seconds)
+
+
+class Metrics:
+    """Потокобезопасный набор гистограмм по паре (тип запроса, этап)."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def trace(self, query_type):
+        return Trace(self, query_type)
+
+    @contextmanager
+    def span(self, query_type, stage):
+        """Замер отдельного этапа вне Trace, например вывода таблицы или показа деталей."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(query_type, stage, time.perf_counter() - started)
+
+    def record(self, query_type, stage, seconds):
+        if not self.enabled:
+            return
+        key = (query_type, stage)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.record(seconds)
+
+    def snapshot(self):
+        """{тип запроса: {этап: {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}}}"""
+        with self._lock:
+            items = [(key, histogram.summary()) for key, histogram in self._histograms.items()]
+        order = {stage: i for i, stage in enumerate(STAGE_ORDER)}
+        report = {}
+        for (query_type, stage), summary in sorted(
+                items, key=lambda item: (item[0][0], order.get(item[0][1], len(order)), item[0][1])):
+            report.setdefault(query_type, {})[stage] = summary
+        return report
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "metrics": self.snapshot()},
+                      f, indent=2, ensure_ascii=False)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+def stage(trace, name):
+    """Замер этапа name в trace или пустой контекст, если trace не передан."""
+    return trace.span(name) if trace is not None else nullcontext()
+
+
+def show_metrics(metrics):
+    print("\nВремя выполнения по этапам (мс):")
+    report = metrics.snapshot()
+    if not report:
+        print("Замеров пока нет.")
+        return
+    print(f"{'Тип':<12} {'Этап':<9} {'Кол-во':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for query_type, stages in report.items():
+        for stage, stats in stages.items():
+            print(f"{query_type:<12} {stage:<9} {stats['count']:>7} {stats['p50_ms']:>9.3f} "
+                  f"{stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f} {stats['max_ms']:>9.3f}")
+
+
+# Общий набор замеров процесса
+metrics = Metrics(enabled=INSTRUMENTATION_CONFIG['enabled'])
@@ -0,0 +1,286 @@
+"""
+Хранение лога запросов в ограниченном объёме. Сырые записи удаляются
+TTL-индексом (см. mongo_logger.ensure_indexes) через RETENTION_CONFIG['raw_days'];
+до этого фоновый сжиматель сворачивает записи старше downsample_after_hours
+в почасовые агрегаты по типу запроса: число запросов, сумма результатов,
+сумма/минимум/максимум длительности, попадания в кэш и гистограмма задержек.
+Отчёт по типам запросов берёт старые часы из агрегатов, а свежие — из
+сырого лога, так что объём хранения и стоимость отчёта не растут со временем.
+Из сводки популярных запросов TTL-индекс по last_time удаляет запросы, не
+повторявшиеся rollup_days дней.
+
+    python log_retention.py --downsample
+    python log_retention.py --stats 7
+"""
+import argparse
+import atexit
+import threading
+from datetime import datetime, timedelta
+
+from circuit_breaker import CircuitOpenError
+from config import MONGO_CONFIG, RETENTION_CONFIG
+from mongo_logger import hourly_collection, connect_mongo, ensure_indexes, flush_log_buffer, mongo_breaker
+
+# Верхние границы корзин гистограммы задержек в миллисекундах; последняя корзина — всё, что дольше
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Служебный документ коллекции агрегатов: до какого момента сырой лог уже сжат
+WATERMARK_ID = "watermark"
+
+# Начало часа отметки времени (работает и на серверах старше MongoDB 5.0 без $dateTrunc)
+_HOUR = {"$dateFromParts": {
+    "year": {"$year": "$timestamp"},
+    "month": {"$month": "$timestamp"},
+    "day": {"$dayOfMonth": "$timestamp"},
+    "hour": {"$hour": "$timestamp"},
+}}
+
+
+def _summary_group(key):
+    """
+    Стадия $group с суммарными показателями записей лога. Для гистограммы
+    считается, сколько запросов быстрее каждой границы (le_<i>), а корзины
+    получаются разностью соседних счётчиков.
+    """
+    group = {
+        "_id": key,
+        "count": {"$sum": 1},
+        "total_results": {"$sum": "$result_count"},
+        "duration_sum": {"$sum": "$duration_sec"},
+        "duration_min": {"$min": "$duration_sec"},
+        "duration_max": {"$max": "$duration_sec"},
+        "cache_hits": {"$sum": {"$cond": ["$cache_hit", 1, 0]}},
+    }
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        group[f"le_{i}"] = {"$sum": {"$cond": [{"$lt": ["$duration_sec", bound / 1000]}, 1, 0]}}
+    return {"$group": group}
+
+
+def _buckets(group):
+    below = [group.pop(f"le_{i}") for i in range(len(LATENCY_BUCKETS_MS))]
+    return [below[0]] + [below[i] - below[i - 1] for i in range(1, len(below))] + [group["count"] - below[-1]]
+
+
+def _raw_entry(group):
+    latency_buckets = _buckets(group)
+    query_type = group.pop("_id")
+    return {**group, "type": query_type, "latency_buckets": latency_buckets}
+
+
+def _floor_hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def downsampled_until(mongo_db):
+    """Момент, до которого сырой лог уже свёрнут в почасовые агрегаты; None — ещё ни разу."""
+    state = hourly_collection(mongo_db).find_one({"_id": WATERMARK_ID})
+    return state["until"] if state else None
+
+
+def downsample(mongo_db, now=None):
+    """
+    Сворачивает сырой лог старше downsample_after_hours в почасовые агрегаты,
+    начиная с места предыдущего запуска. Обрабатываются только целые часы,
+    и каждый агрегат записывается целиком (ReplaceOne), поэтому прерванный
+    запуск безопасно повторить. Возвращает число записанных агрегатов.
+    """
+    from pymongo import ReplaceOne
+    flush_log_buffer()
+    logs = mongo_db[MONGO_CONFIG['collection_name']]
+    hourly = hourly_collection(mongo_db)
+    now = now or datetime.utcnow()
+    cutoff = _floor_hour(now - timedelta(hours=RETENTION_CONFIG['downsample_after_hours']))
+
+    start = downsampled_until(mongo_db)
+    if start is None:
+        oldest = logs.find_one({}, {"timestamp": 1}, sort=[("timestamp", 1)])
+        if oldest is None:
+            return 0
+        start = _floor_hour(oldest["timestamp"])
+
+    written = 0
+    step = timedelta(hours=max(1, RETENTION_CONFIG['batch_hours']))
+    while start < cutoff:
+        end = min(start + step, cutoff)
+        groups = logs.aggregate([
+            {"$match": {"timestamp": {"$gte": start, "$lt": end}}},
+            _summary_group({"type": "$type", "hour": _HOUR}),
+        ], allowDiskUse=True)
+        operations = []
+        for group in groups:
+            latency_buckets = _buckets(group)
+            key = group.pop("_id")
+            operations.append(ReplaceOne(
+                {"_id": key},
+                {**group, "type": key["type"], "hour": key["hour"], "latency_buckets": latency_buckets},
+                upsert=True,
+            ))
+        if operations:
+            hourly.bulk_write(operations, ordered=False)
+            written += len(operations)
+        hourly.replace_one({"_id": WATERMARK_ID}, {"until": end}, upsert=True)
+        start = end
+    return written
+
+
+def query_type_stats(mongo_db, days=7, now=None):
+    """
+    Показатели по типам запросов за последние days дней: часы до отметки
+    сжатия берутся из почасовых агрегатов (с точностью до часа), остальное —
+    из сырого лога. Возвращает список словарей по убыванию числа запросов.
+    """
+    with mongo_breaker.guard():
+        return _query_type_stats(mongo_db, days, now)
+
+
+def _query_type_stats(mongo_db, days, now):
+    flush_log_buffer()
+    now = now or datetime.utcnow()
+    since = now - timedelta(days=days)
+    until = downsampled_until(mongo_db)
+
+    sources = []
+    if until is not None and since < until:
+        sources.append(hourly_collection(mongo_db).find({"hour": {"$gte": _floor_hour(since), "$lt": until}}))
+    raw_since = max(since, until) if until is not None else since
+    raw = mongo_db[MONGO_CONFIG['collection_name']].aggregate([
+        {"$match": {"timestamp": {"$gte": raw_since}}},
+        _summary_group("$type"),
+    ])
+    sources.append(_raw_entry(group) for group in raw)
+
+    totals = {}
+    for source in sources:
+        for entry in source:
+            total = totals.setdefault(entry["type"], {
+                "type": entry["type"], "count": 0, "total_results": 0, "duration_sum": 0.0,
+                "duration_min": None, "duration_max": None, "cache_hits": 0,
+                "latency_buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            })
+            for field in ("count", "total_results", "duration_sum", "cache_hits"):
+                total[field] += entry.get(field) or 0
+            for field, pick in (("duration_min", min), ("duration_max", max)):
+                if entry.get(field) is not None:
+                    total[field] = entry[field] if total[field] is None else pick(total[field], entry[field])
+            total["latency_buckets"] = [a + b for a, b in zip(total["latency_buckets"], entry["latency_buckets"])]
+
+    report = []
+    for total in totals.values():
+        count = total["count"]
+        report.append({
+            **total,
+            "avg_duration": total["duration_sum"] / count if count else 0.0,
+            "cache_hit_ratio": total["cache_hits"] / count if count else 0.0,
+            "p50_ms": bucket_percentile(total["latency_buckets"], 50),
+            "p95_ms": bucket_percentile(total["latency_buckets"], 95),
+            "p99_ms": bucket_percentile(total["latency_buckets"], 99),
+        })
+    report.sort(key=lambda entry: entry["count"], reverse=True)
+    return report
+
+
+def bucket_percentile(buckets, p):
+    """Верхняя граница корзины, в которую попадает перцентиль p; None для последней (открытой) корзины."""
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    rank = p / 100 * total
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS, buckets):
+        seen += count
+        if seen >= rank:
+            return float(bound)
+    return None
+
+
+def show_query_type_stats(mongo_db, days=7):
+    print(f"\nЗапросы по типам за {days} дн.:")
+    try:
+        report = query_type_stats(mongo_db, days)
+    except Exception as e:
+        print(f"Ошибка при получении статистики по типам запросов: {e}")
+        return
+    if not report:
+        print("Нет данных для отображения.")
+        return
+
+    def limit(value):
+        return f"≤{value:g}" if value is not None else f">{LATENCY_BUCKETS_MS[-1]}"
+
+    print(f"{'Тип':<12} {'Запросов':>9} {'Ср., мс':>9} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'Кэш':>6}")
+    for entry in report:
+        print(f"{entry['type']:<12} {entry['count']:>9} {entry['avg_duration'] * 1000:>9.1f} "
+              f"{limit(entry['p50_ms']):>9} {limit(entry['p95_ms']):>9} {limit(entry['p99_ms']):>9} "
+              f"{entry['cache_hit_ratio']:>6.0%}")
+
+
+class Downsampler:
+    """Фоновый поток, который раз в interval секунд запускает downsample."""
+
+    def __init__(self, mongo_db, interval=3600.0):
+        self.mongo_db = mongo_db
+        self.interval = interval
+        self.stats = {"runs": 0, "written": 0, "failed": 0}
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="mongo-log-downsampler", daemon=True)
+        self._worker.start()
+
+    def close(self, timeout=10.0):
+        self._stop.set()
+        self._worker.join(timeout)
+        return not self._worker.is_alive()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with mongo_breaker.guard():
+                    self.stats["written"] += downsample(self.mongo_db)
+            except CircuitOpenError:
+                pass  # MongoDB недоступна — сожмём при следующем запуске
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"Ошибка при сжатии лога запросов в MongoDB: {e}")
+            self.stats["runs"] += 1
+            self._stop.wait(self.interval)
+
+
+_downsampler = None
+
+
+def start_downsampler(mongo_db):
+    """Включает периодическое сжатие лога согласно RETENTION_CONFIG."""
+    global _downsampler
+    if mongo_db is None or not RETENTION_CONFIG['downsample_enabled'] or _downsampler is not None:
+        return _downsampler
+    raw_hours = RETENTION_CONFIG['raw_days'] * 24
+    if raw_hours and raw_hours <= RETENTION_CONFIG['downsample_after_hours']:
+        print("Внимание: сырой лог удаляется раньше, чем сжимается; "
+              "LOG_RETENTION_DAYS должен превышать LOG_DOWNSAMPLE_AFTER_HOURS.")
+    _downsampler = Downsampler(mongo_db, RETENTION_CONFIG['interval_sec'])
+    return _downsampler
+
+
+def stop_downsampler():
+    global _downsampler
+    downsampler, _downsampler = _downsampler, None
+    if downsampler is not None:
+        downsampler.close()
+
+
+atexit.register(stop_downsampler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сжатие и статистика лога запросов в MongoDB")
+    parser.add_argument("--downsample", action="store_true", help="свернуть старый сырой лог в почасовые агрегаты")
+    parser.add_argument("--stats", type=int, metavar="DAYS", help="показать статистику по типам запросов за DAYS дней")
+    args = parser.parse_args()
+
+    db = connect_mongo()
+    if db is None:
+        raise SystemExit("Не удалось подключиться к MongoDB.")
+    if args.downsample:
+        ensure_indexes(db)
+        print(f"Записано почасовых агрегатов: {downsample(db)}")
+    if args.stats:
+        show_query_type_stats(db, args.stats)
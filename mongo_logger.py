@@ -1,62 +1,565 @@
-from pymongo import MongoClient
-from pymongo.errors import PyMongoError
+from collections import deque
+from contextlib import nullcontext
 from datetime import datetime
-import pytz
-from config import MONGO_CONFIG
+import argparse
+import atexit
+import hashlib
+import json
+import threading
+import time
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from config import MONGO_CONFIG, LOG_BUFFER_CONFIG, RETENTION_CONFIG, MONGO_BREAKER_CONFIG
+
+# pymongo и pytz импортируются при первом использовании: их загрузка заметно
+# удлиняет запуск, а меню поиска они не нужны
+ASCENDING, DESCENDING = 1, -1  # значения pymongo.ASCENDING и pymongo.DESCENDING
+
+
+def _is_unavailable(exception):
+    """Сбой связи с MongoDB, в отличие от ошибки самого запроса."""
+    from pymongo.errors import ConnectionFailure
+    return isinstance(exception, ConnectionFailure)
+
+
+# Предохранитель для обращений к MongoDB: после сбоя связи запросы к ней не
+# ждут тайм-аута выбора сервера, а пропускаются до пробной попытки
+mongo_breaker = CircuitBreaker(
+    "MongoDB",
+    failure_threshold=MONGO_BREAKER_CONFIG['failure_threshold'],
+    base_delay=MONGO_BREAKER_CONFIG['base_delay'],
+    max_delay=MONGO_BREAKER_CONFIG['max_delay'],
+    is_failure=_is_unavailable,
+)
 
 
 def connect_mongo():
-    """Подключение к MongoDB по URI."""
+    """
+    Подключение к MongoDB по URI. MongoClient подключается лениво, поэтому
+    сервер сразу проверяется командой ping. Если он не ответил, база всё равно
+    возвращается, но размыкается mongo_breaker, и обращения к ней возобновятся
+    сами после восстановления связи.
+    """
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
     try:
         client = MongoClient(MONGO_CONFIG['uri'], serverSelectionTimeoutMS=5000)
         db = client[MONGO_CONFIG['db_name']]
-        return db
     except PyMongoError as e:
         print(f" Ошибка подключения к MongoDB: {e}")
         return None
+    try:
+        with mongo_breaker.guard():
+            client.admin.command("ping")
+    except PyMongoError as e:
+        print(f"MongoDB не отвечает, логирование возобновится после восстановления связи: {e}")
+    return db
+
+
+def normalize_parameters(parameters):
+    """Строковые параметры без пробелов по краям и в нижнем регистре (LIKE в MySQL регистронезависим)."""
+    return {name: value.strip().casefold() if isinstance(value, str) else value
+            for name, value in parameters.items()}
+
+
+def query_fingerprint(query_type, parameters):
+    """
+    Стабильный отпечаток запроса: хэш типа и нормализованных параметров с
+    отсортированными ключами. Запросы, отличающиеся только регистром ключевого
+    слова или порядком полей, получают один и тот же отпечаток.
+    """
+    canonical = json.dumps({"type": query_type, "parameters": normalize_parameters(parameters)},
+                           sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def _rollup_collection(mongo_db):
+    return mongo_db[MONGO_CONFIG['rollup_collection_name']]
+
+
+def _rollup_updates(documents):
+    """
+    Собирает upsert-операции для коллекции-сводки по пачке документов лога.
+    Документы с одинаковым ключом сворачиваются в одну операцию.
+    """
+    from pymongo import UpdateOne
+    totals = {}
+    for doc in documents:
+        key = doc.get("fingerprint") or query_fingerprint(doc["type"], doc["parameters"])
+        entry = totals.get(key)
+        if entry is None:
+            entry = totals[key] = {
+                "count": 0, "total_results": 0, "duration_sum": 0.0, "last_time": doc["timestamp"],
+                "type": doc["type"], "parameters": doc["parameters"], "last_result_count": doc["result_count"],
+            }
+        entry["count"] += 1
+        entry["total_results"] += doc["result_count"]
+        entry["duration_sum"] += doc["duration_sec"]
+        if doc["timestamp"] >= entry["last_time"]:
+            entry["last_time"] = doc["timestamp"]
+            entry["last_result_count"] = doc["result_count"]
+
+    return [
+        UpdateOne(
+            {"_id": key},
+            {
+                "$inc": {"count": e["count"], "total_results": e["total_results"], "duration_sum": e["duration_sum"]},
+                "$max": {"last_time": e["last_time"]},
+                "$set": {"type": e["type"], "parameters": e["parameters"], "last_result_count": e["last_result_count"]},
+            },
+            upsert=True,
+        )
+        for key, e in totals.items()
+    ]
+
+
+def hourly_collection(mongo_db):
+    return mongo_db[MONGO_CONFIG['hourly_collection_name']]
+
+
+def slow_collection(mongo_db):
+    return mongo_db[MONGO_CONFIG['slow_collection_name']]
+
+
+def ensure_ttl_index(mongo_db, collection, field, expire_after):
+    """
+    Индекс по убыванию field с TTL expire_after секунд (0 или None — без TTL).
+    Существующий индекс по тому же полю перенастраивается: срок меняется через
+    collMod, а если сервер так не умеет (или TTL нужно снять) — индекс
+    пересоздаётся. Без этого create_index упал бы на конфликте параметров.
+    """
+    from pymongo.errors import OperationFailure
+    key = [(field, DESCENDING)]
+    expire_after = int(expire_after) if expire_after else None
+    for name, info in collection.index_information().items():
+        if [(k, int(d)) for k, d in info["key"]] != key:
+            continue
+        if info.get("expireAfterSeconds") == expire_after:
+            return
+        if expire_after is not None:
+            try:
+                mongo_db.command("collMod", collection.name,
+                                 index={"keyPattern": {field: DESCENDING}, "expireAfterSeconds": expire_after})
+                return
+            except OperationFailure:
+                pass
+        collection.drop_index(name)
+        break
+    if expire_after is None:
+        collection.create_index(key)
+    else:
+        collection.create_index(key, expireAfterSeconds=expire_after)
+
+
+def ensure_indexes(mongo_db):
+    """
+    Создаёт индексы при запуске: по timestamp (с TTL сырого лога), type и
+    fingerprint в логе запросов, по count и last_time (с TTL) в коллекции-сводке, по
+    часу (с TTL) в почасовых агрегатах и по времени, типу и плану в коллекции
+    медленных запросов (она хранится столько же, сколько агрегаты). Повторный
+    вызов ничего не меняет.
+    """
+    with mongo_breaker.guard():
+        logs = mongo_db[MONGO_CONFIG['collection_name']]
+        ensure_ttl_index(mongo_db, logs, "timestamp", RETENTION_CONFIG['raw_days'] * 86400)
+        logs.create_index([("type", ASCENDING), ("timestamp", DESCENDING)])
+        logs.create_index([("fingerprint", ASCENDING), ("timestamp", DESCENDING)])
+        rollup = _rollup_collection(mongo_db)
+        rollup.create_index([("count", DESCENDING)])
+        ensure_ttl_index(mongo_db, rollup, "last_time", RETENTION_CONFIG['rollup_days'] * 86400)
+        ensure_ttl_index(mongo_db, hourly_collection(mongo_db), "hour", RETENTION_CONFIG['hourly_days'] * 86400)
+        slow = slow_collection(mongo_db)
+        ensure_ttl_index(mongo_db, slow, "timestamp", RETENTION_CONFIG['hourly_days'] * 86400)
+        slow.create_index([("type", ASCENDING), ("timestamp", DESCENDING)])
+        slow.create_index([("plan_hash", ASCENDING)])
+
+
+class QueryLogBuffer:
+    """
+    Ограниченная очередь документов лога с фоновым потоком, который пишет их
+    в MongoDB пачками через insert_many — по достижении batch_size или раз в
+    flush_interval секунд — и обновляет коллекцию-сводку rollup, если она задана. При переполнении либо вытесняются самые старые
+    записи (overflow='drop_oldest'), либо вызывающий ждёт места ('block').
+    Пока предохранитель breaker разомкнут, записи копятся в очереди до пробной
+    попытки, а при остановке буфера не ждут её и отбрасываются.
+    """
+
+    def __init__(self, collection, max_size=10000, batch_size=100, flush_interval=1.0,
+                 overflow='drop_oldest', block_timeout=5.0, rollup=None, breaker=None):
+        if overflow not in ('drop_oldest', 'block'):
+            raise ValueError(f"Неизвестная политика переполнения: {overflow}")
+        self.collection = collection
+        self.rollup = rollup
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.breaker = breaker
+        self.stats = {"enqueued": 0, "flushed": 0, "dropped": 0, "failed": 0}
+        self._queue = deque()
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="mongo-log-writer", daemon=True)
+        self._worker.start()
+
+    def enqueue(self, document):
+        with self._cond:
+            if self._closed:
+                self.stats["dropped"] += 1
+                return False
+            if len(self._queue) >= self.max_size:
+                if self.overflow == 'block':
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._queue) >= self.max_size and not self._closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.stats["dropped"] += 1
+                            return False
+                        self._cond.wait(remaining)
+                else:
+                    self._queue.popleft()
+                    self.stats["dropped"] += 1
+            self._queue.append(document)
+            self.stats["enqueued"] += 1
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def flush(self, timeout=None):
+        """Ждёт, пока все накопленные документы будут записаны. Возвращает True, если очередь опустела."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._queue or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        """Дописывает очередь и останавливает фоновый поток."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join(timeout)
+        return not self._worker.is_alive()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._queue) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if not self._queue:
+                    if self._closed:
+                        return
+                    continue
+                delay = self.breaker.retry_in() if self.breaker is not None else 0.0
+                if delay:
+                    if self._closed:
+                        self.stats["failed"] += len(self._queue)
+                        self._queue.clear()
+                        self._cond.notify_all()
+                        return
+                    self._cond.wait(min(delay, self.flush_interval))
+                    continue
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._in_flight = len(batch)
+                self._cond.notify_all()
+
+            try:
+                with self._guard():
+                    self.collection.insert_many(batch, ordered=False)
+                flushed, failed = len(batch), 0
+            except CircuitOpenError:
+                flushed, failed = 0, len(batch)
+            except Exception as e:
+                print(f"Ошибка при записи пачки логов в MongoDB: {e}")
+                flushed, failed = 0, len(batch)
+
+            if flushed and self.rollup is not None:
+                try:
+                    with self._guard():
+                        self.rollup.bulk_write(_rollup_updates(batch), ordered=False)
+                except CircuitOpenError:
+                    pass
+                except Exception as e:
+                    print(f"Ошибка при обновлении сводки запросов в MongoDB: {e}")
+
+            with self._cond:
+                self.stats["flushed"] += flushed
+                self.stats["failed"] += failed
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _guard(self):
+        return self.breaker.guard() if self.breaker is not None else nullcontext()
+
+
+_log_buffer = None
+_log_buffer_db = None
+
+
+def start_log_buffer(mongo_db):
+    """Включает буферизованное логирование для mongo_db согласно LOG_BUFFER_CONFIG."""
+    global _log_buffer, _log_buffer_db
+    if mongo_db is None or not LOG_BUFFER_CONFIG['enabled'] or _log_buffer is not None:
+        return _log_buffer
+    _log_buffer = QueryLogBuffer(
+        mongo_db[MONGO_CONFIG['collection_name']],
+        max_size=LOG_BUFFER_CONFIG['max_size'],
+        batch_size=LOG_BUFFER_CONFIG['batch_size'],
+        flush_interval=LOG_BUFFER_CONFIG['flush_interval'],
+        overflow=LOG_BUFFER_CONFIG['overflow'],
+        rollup=_rollup_collection(mongo_db),
+        breaker=mongo_breaker,
+    )
+    _log_buffer_db = mongo_db
+    return _log_buffer
+
+
+def stop_log_buffer():
+    """Дописывает накопленные логи и выключает буфер. Возвращает счётчики буфера."""
+    global _log_buffer, _log_buffer_db
+    buffer = _log_buffer
+    if buffer is None:
+        return None
+    _log_buffer, _log_buffer_db = None, None
+    if not buffer.close():
+        print("Не все логи успели записаться в MongoDB до завершения работы.")
+    return dict(buffer.stats)
+
+
+def flush_log_buffer(timeout=2.0):
+    """
+    Дописывает буфер перед чтением аналитики, чтобы отчёты видели последние
+    запросы. Пока MongoDB недоступна, не ждёт.
+    """
+    if _log_buffer is not None and not mongo_breaker.is_open:
+        _log_buffer.flush(timeout)
+
+
+def get_log_buffer_stats():
+    return dict(_log_buffer.stats) if _log_buffer is not None else None
+
+
+def show_log_buffer_stats():
+    print("\nБуфер лога запросов MongoDB:")
+    stats = get_log_buffer_stats()
+    if stats is None:
+        print("Буферизация лога выключена или MongoDB недоступна.")
+        return
+    print(f"   Поставлено в очередь: {stats['enqueued']}, записано: {stats['flushed']}")
+    print(f"   Отброшено при переполнении: {stats['dropped']}, ошибок записи: {stats['failed']}")
+
 
+atexit.register(stop_log_buffer)
 
-def log_query(mongo_db, query_type, parameters, result_count, duration):
+
+def log_query(mongo_db, query_type, parameters, result_count, duration, cache_hit=False, stages=None):
     if mongo_db is not None:
         try:
-            logs_collection = mongo_db[MONGO_CONFIG['collection_name']]
-            logs_collection.insert_one({
+            document = {
                 "type": query_type,
                 "parameters": parameters,
+                "fingerprint": query_fingerprint(query_type, parameters),
                 "result_count": result_count,
                 "duration_sec": round(duration, 4),
+                "cache_hit": cache_hit,
                 "timestamp": datetime.utcnow()
-            })
+            }
+            if stages:
+                # Длительности этапов (execute, fetch, cache, ...) в миллисекундах
+                document["stages_ms"] = stages
+            if _log_buffer is not None and _log_buffer_db is mongo_db:
+                _log_buffer.enqueue(document)
+                return
+            with mongo_breaker.guard():
+                logs_collection = mongo_db[MONGO_CONFIG['collection_name']]
+                logs_collection.insert_one(document)
+                _rollup_collection(mongo_db).bulk_write(_rollup_updates([document]))
+        except CircuitOpenError:
+            pass  # MongoDB недоступна: запись пропускается, поиск не ждёт тайм-аута
         except Exception as e:
             print(f"Ошибка при логировании в MongoDB: {e}")
 
 
-import pytz
+# Агрегации по сырому логу: используются для построения сводки и как запасной
+# вариант отчётов, пока сводка не построена. Группировка идёт по отпечатку
+# запроса; у старых записей без отпечатка — по паре (type, parameters).
+_GROUP_KEY = {"$ifNull": ["$fingerprint", {"type": "$type", "parameters": "$parameters"}]}
+
+POPULAR_PIPELINE = [
+    {"$group": {
+        "_id": _GROUP_KEY,
+        "type": {"$first": "$type"},
+        "parameters": {"$first": "$parameters"},
+        "count": {"$sum": 1},
+        "avg_duration": {"$avg": "$duration_sec"},
+        "total_results": {"$sum": "$result_count"},
+        "last_time": {"$max": "$timestamp"}
+    }},
+    {"$sort": {"count": -1}},
+]
+
+LAST_UNIQUE_PIPELINE = [
+    {"$sort": {"timestamp": -1}},
+    {"$group": {
+        "_id": _GROUP_KEY,
+        "type": {"$first": "$type"},
+        "parameters": {"$first": "$parameters"},
+        "timestamp": {"$first": "$timestamp"},
+        "result_count": {"$first": "$result_count"}
+    }},
+    {"$sort": {"timestamp": -1}},
+]
+
+BACKFILL_PIPELINE = [
+    {"$sort": {"timestamp": 1}},
+    {"$group": {
+        "_id": "$fingerprint",
+        "type": {"$last": "$type"},
+        "parameters": {"$last": "$parameters"},
+        "count": {"$sum": 1},
+        "total_results": {"$sum": "$result_count"},
+        "duration_sum": {"$sum": "$duration_sec"},
+        "last_time": {"$max": "$timestamp"},
+        "last_result_count": {"$last": "$result_count"}
+    }}
+]
+
+
+# Служебный документ сводки: сводка построена по всему логу (backfill_rollup),
+# и отчёты могут читать её вместо сырого лога. Поля last_time у него нет,
+# поэтому TTL-индекс сводки его не удаляет.
+ROLLUP_MARKER_ID = "backfilled"
+_ROLLUP_ENTRIES = {"_id": {"$ne": ROLLUP_MARKER_ID}}
+
+
+def _rollup_is_ready(db):
+    return _rollup_collection(db).find_one({"_id": ROLLUP_MARKER_ID}, {"_id": 1}) is not None
+
+
+def ensure_rollup(db):
+    """
+    Строит сводку по накопленному логу, если она ещё не построена. Вызывается
+    при запуске до включения записи лога, поэтому история до появления
+    сводки не теряется. Возвращает число записанных запросов (0 — уже готова).
+    """
+    with mongo_breaker.guard():
+        ready = _rollup_is_ready(db)
+    return 0 if ready else backfill_rollup(db)
+
+
+def popular_queries(db, limit=10):
+    """Топ запросов из сводки по индексу count; пока сводка не построена — агрегация по сырому логу."""
+    with mongo_breaker.guard():
+        if not _rollup_is_ready(db):
+            entries = db[MONGO_CONFIG['collection_name']].aggregate(POPULAR_PIPELINE + [{"$limit": limit}])
+            return [{**e, "_id": {"type": e["type"], "parameters": e["parameters"]}} for e in entries]
+        entries = _rollup_collection(db).find(_ROLLUP_ENTRIES).sort("count", DESCENDING).limit(limit)
+        return [{
+            "_id": {"type": e["type"], "parameters": e["parameters"]},
+            "count": e["count"],
+            "avg_duration": e["duration_sum"] / e["count"] if e["count"] else 0.0,
+            "total_results": e["total_results"],
+            "last_time": e["last_time"],
+        } for e in entries]
+
+
+def last_unique_queries(db, limit=10):
+    """Последние уникальные запросы из сводки по индексу last_time."""
+    with mongo_breaker.guard():
+        if not _rollup_is_ready(db):
+            entries = db[MONGO_CONFIG['collection_name']].aggregate(LAST_UNIQUE_PIPELINE + [{"$limit": limit}])
+            return [{**e, "_id": {"type": e["type"], "parameters": e["parameters"]}} for e in entries]
+        entries = _rollup_collection(db).find(_ROLLUP_ENTRIES).sort("last_time", DESCENDING).limit(limit)
+        return [{
+            "_id": {"type": e["type"], "parameters": e["parameters"]},
+            "timestamp": e["last_time"],
+            "result_count": e.get("last_result_count", 0),
+        } for e in entries]
+
+
+def backfill_fingerprints(db, batch_size=1000):
+    """Проставляет fingerprint записям лога, сделанным до его появления."""
+    from pymongo import UpdateOne
+    logs = db[MONGO_CONFIG['collection_name']]
+    updated = 0
+    operations = []
+    for doc in logs.find({"fingerprint": {"$exists": False}}, {"type": 1, "parameters": 1}):
+        operations.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {"fingerprint": query_fingerprint(doc["type"], doc.get("parameters") or {})}},
+        ))
+        if len(operations) >= batch_size:
+            logs.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    if operations:
+        logs.bulk_write(operations, ordered=False)
+        updated += len(operations)
+    return updated
+
+
+def backfill_rollup(db, batch_size=1000):
+    """
+    Однократно перестраивает коллекцию-сводку по уже накопленному логу:
+    проставляет недостающие отпечатки, очищает сводку и заполняет её заново.
+    """
+    from pymongo import ReplaceOne
+    flush_log_buffer()
+    ensure_indexes(db)
+    backfill_fingerprints(db, batch_size)
+    rollup = _rollup_collection(db)
+    rollup.delete_many({})
+    groups = db[MONGO_CONFIG['collection_name']].aggregate(BACKFILL_PIPELINE, allowDiskUse=True)
+
+    written = 0
+    operations = []
+    for group in groups:
+        operations.append(ReplaceOne(
+            {"_id": group["_id"]},
+            {
+                "type": group["type"],
+                "parameters": group["parameters"],
+                "count": group["count"],
+                "total_results": group["total_results"],
+                "duration_sum": group["duration_sum"],
+                "last_time": group["last_time"],
+                "last_result_count": group["last_result_count"],
+            },
+            upsert=True,
+        ))
+        if len(operations) >= batch_size:
+            rollup.bulk_write(operations, ordered=False)
+            written += len(operations)
+            operations = []
+    if operations:
+        rollup.bulk_write(operations, ordered=False)
+        written += len(operations)
+    rollup.replace_one({"_id": ROLLUP_MARKER_ID}, {"at": datetime.utcnow()}, upsert=True)
+    return written
+
+
+def _local_time(utc_time):
+    """Время из лога (UTC без часового пояса) по Москве для вывода."""
+    import pytz
+    return utc_time.replace(tzinfo=pytz.utc).astimezone(pytz.timezone("Europe/Moscow"))
+
 
 def show_most_popular_queries(db):
     print("\nТоп 10 популярных запросов:")
 
-    pipeline = [
-        {"$group": {
-            "_id": {"type": "$type", "parameters": "$parameters"},
-            "count": {"$sum": 1},
-            "avg_duration": {"$avg": "$duration_sec"},
-            "total_results": {"$sum": "$result_count"},
-            "last_time": {"$max": "$timestamp"}
-        }},
-        {"$sort": {"count": -1}},
-        {"$limit": 10}
-    ]
-
     try:
-        results = list(db[MONGO_CONFIG['collection_name']].aggregate(pipeline))
+        flush_log_buffer()
+        results = popular_queries(db)
 
         if not results:
             print("Нет данных для отображения.")
             return
 
-        local_tz = pytz.timezone("Europe/Moscow")
-
         for i, entry in enumerate(results, start=1):
             query_type = entry['_id']['type']
             params = entry['_id']['parameters']
@@ -64,8 +567,7 @@ def show_most_popular_queries(db):
             avg_duration = round(entry['avg_duration'], 3)
             total_results = entry['total_results']
             utc_time = entry['last_time']
-            local_time = utc_time.replace(tzinfo=pytz.utc).astimezone(local_tz)
-            formatted_time = local_time.strftime('%d-%m-%Y %H:%M:%S')
+            formatted_time = _local_time(utc_time).strftime('%d-%m-%Y %H:%M:%S')
 
             print(f"\n{i}. Тип: {query_type}")
             print(f"   Параметры: {params}")
@@ -84,6 +586,10 @@ def show_most_popular_queries(db):
                 summary.append(f"Годы: {params['year_from']}-{params['year_to']}")
             if 'rating' in params:
                 summary.append(f"Рейтинг: {params['rating']}")
+            if 'query' in params:
+                summary.append(f"Полнотекстовый запрос: {params['query']}")
+            if 'format' in params:
+                summary.append(f"Выгрузка {params.get('source')} в {params['format']}")
 
             if summary:
                 print("   Доп. информация:", "; ".join(summary))
@@ -99,38 +605,37 @@ def show_last_unique_queries(mongo_db):
         return
 
     try:
-        logs_collection = mongo_db[MONGO_CONFIG['collection_name']]
-
-        pipeline = [
-            {"$sort": {"timestamp": -1}},
-            {"$group": {
-                "_id": {"type": "$type", "parameters": "$parameters"},
-                "timestamp": {"$first": "$timestamp"},
-                "result_count": {"$first": "$result_count"}
-            }},
-            {"$sort": {"timestamp": -1}},
-            {"$limit": 10}
-        ]
-
-        results = list(logs_collection.aggregate(pipeline))
+        flush_log_buffer()
+        results = last_unique_queries(mongo_db)
 
         if not results:
             print("Нет данных.")
             return
 
-        local_tz = pytz.timezone("Europe/Moscow")
-
         for i, log in enumerate(results, 1):
             query_type = log["_id"]["type"]
             parameters = log["_id"]["parameters"]
             timestamp_utc = log["timestamp"]
             result_count = log.get("result_count", 0)
 
-            timestamp_local = timestamp_utc.replace(tzinfo=pytz.utc).astimezone(local_tz)
-            formatted_time = timestamp_local.strftime("%d-%m-%Y %H:%M:%S")
+            formatted_time = _local_time(timestamp_utc).strftime("%d-%m-%Y %H:%M:%S")
 
             print(f"{i}. [{formatted_time}] {query_type.upper()} — {parameters} → {result_count} результатов")
 
     except Exception as e:
         print(f"Ошибка при выводе последних уникальных запросов: {e}")
 
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обслуживание лога запросов в MongoDB")
+    parser.add_argument("--backfill-rollup", action="store_true",
+                        help="построить сводку запросов по уже накопленному логу")
+    args = parser.parse_args()
+
+    if args.backfill_rollup:
+        db = connect_mongo()
+        if db is None:
+            raise SystemExit("Не удалось подключиться к MongoDB.")
+        print(f"Сводка построена: {backfill_rollup(db)} уникальных запросов.")
+    else:
+        parser.print_help()
@@ -1,17 +1,223 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import pymysql
-from config import MYSQL_CONFIG
+from config import MYSQL_CONFIG, MYSQL_POOL_CONFIG
+
+
+class PoolTimeoutError(pymysql.MySQLError):
+    """Не удалось получить соединение из пула за отведённое время."""
+
+
+def _open_connection():
+    return pymysql.connect(
+        host=MYSQL_CONFIG['host'],
+        user=MYSQL_CONFIG['user'],
+        password=MYSQL_CONFIG['password'],
+        database=MYSQL_CONFIG['database'],
+        cursorclass=pymysql.cursors.DictCursor
+    )
+
+
+class MySQLPool:
+    """
+    Пул соединений MySQL. Перед выдачей соединение проверяется ping() с
+    переподключением, соединения, простаивающие дольше idle_timeout, закрываются
+    (но не меньше min_size). Пул потокобезопасен: одно и то же соединение
+    никогда не выдаётся двум потокам одновременно.
+    """
+
+    def __init__(self, min_size=1, max_size=5, idle_timeout=300.0, checkout_timeout=10.0,
+                 ping_interval=0.0, connect=_open_connection):
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        self._connect = connect
+        self._idle = deque()  # (соединение, момент возврата в пул)
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.stats = {
+            "checkouts": 0, "waits": 0, "wait_total_sec": 0.0, "wait_max_sec": 0.0,
+            "timeouts": 0, "created": 0, "reconnects": 0, "discarded": 0, "idle_closed": 0,
+        }
+
+    def warm(self):
+        """Открывает min_size соединений заранее. Ошибки подключения пробрасываются."""
+        connections = [self._checkout() for _ in range(self.min_size)]
+        for connection in connections:
+            self._checkin(connection)
+
+    def spawn(self, max_size=1):
+        """
+        Отдельный пул с теми же настройками подключения для фоновых задач, чтобы
+        они не занимали соединения основного пула. Соединения открываются по требованию.
+        """
+        return MySQLPool(min_size=0, max_size=max_size, idle_timeout=self.idle_timeout,
+                         checkout_timeout=self.checkout_timeout, ping_interval=self.ping_interval,
+                         connect=self._connect)
+
+    @contextmanager
+    def connection(self):
+        connection = self._checkout()
+        ok = False
+        try:
+            yield connection
+            ok = True
+        finally:
+            self._checkin(connection, broken=not ok and not connection.open)
+
+    @contextmanager
+    def cursor(self, cursorclass=None):
+        with self.connection() as connection:
+            with connection.cursor(cursorclass) as cursor:
+                yield cursor
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for connection, _ in idle:
+            self._close_quietly(connection)
 
-def connect_mysql():
+    def snapshot(self):
+        with self._cond:
+            checkouts = self.stats["checkouts"]
+            return {
+                **self.stats,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "wait_avg_sec": self.stats["wait_total_sec"] / checkouts if checkouts else 0.0,
+            }
+
+    def _checkout(self):
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        waited = False
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeoutError("пул соединений закрыт")
+                self._close_expired()
+                if self._idle:
+                    connection, returned_at = self._idle.pop()
+                    create = False
+                elif self._size < self.max_size:
+                    self._size += 1
+                    connection, returned_at, create = None, None, True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"нет свободных соединений в пуле (max_size={self.max_size})")
+                    waited = True
+                    self._cond.wait(remaining)
+                    continue
+
+            try:
+                if create:
+                    connection = self._connect()
+                    with self._cond:
+                        self.stats["created"] += 1
+                elif time.monotonic() - returned_at >= self.ping_interval:
+                    self._ping(connection)
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                if connection is not None:
+                    self._close_quietly(connection)
+                raise
+
+            wait = time.monotonic() - started
+            with self._cond:
+                self.stats["checkouts"] += 1
+                if waited:
+                    self.stats["waits"] += 1
+                self.stats["wait_total_sec"] += wait
+                self.stats["wait_max_sec"] = max(self.stats["wait_max_sec"], wait)
+            return connection
+
+    def _ping(self, connection):
+        # ping(reconnect=True) восстанавливает соединение, закрытое сервером по wait_timeout
+        thread_id = getattr(connection, 'server_thread_id', None)
+        connection.ping(reconnect=True)
+        if getattr(connection, 'server_thread_id', None) != thread_id:
+            with self._cond:
+                self.stats["reconnects"] += 1
+
+    def _checkin(self, connection, broken=False):
+        if not broken:
+            try:
+                # Завершаем транзакцию, чтобы следующий запрос видел свежий снимок данных
+                connection.rollback()
+            except Exception:
+                broken = True
+
+        with self._cond:
+            if broken or self._closed:
+                self._size -= 1
+                self.stats["discarded"] += 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+        if broken or self._closed:
+            self._close_quietly(connection)
+
+    def _close_expired(self):
+        """Закрывает простаивающие дольше idle_timeout соединения сверх min_size. Вызывается под блокировкой."""
+        if not self.idle_timeout:
+            return
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            connection, _ = self._idle.popleft()
+            self._size -= 1
+            self.stats["idle_closed"] += 1
+            self._close_quietly(connection)
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def create_pool():
+    """Создаёт пул по настройкам MYSQL_POOL_CONFIG и открывает минимальное число соединений."""
     try:
-        connection = pymysql.connect(
-            host=MYSQL_CONFIG['host'],
-            user=MYSQL_CONFIG['user'],
-            password=MYSQL_CONFIG['password'],
-            database=MYSQL_CONFIG['database'],
-            cursorclass=pymysql.cursors.DictCursor
+        pool = MySQLPool(
+            min_size=MYSQL_POOL_CONFIG['min_size'],
+            max_size=MYSQL_POOL_CONFIG['max_size'],
+            idle_timeout=MYSQL_POOL_CONFIG['idle_timeout'],
+            checkout_timeout=MYSQL_POOL_CONFIG['checkout_timeout'],
+            ping_interval=MYSQL_POOL_CONFIG['ping_interval'],
         )
-        print("Успешное подключение к MySQL")
-        return connection
+        pool.warm()
+        return pool
     except pymysql.MySQLError as e:
         print(f"Ошибка подключения к MySQL: {e}")
         return None
+
+
+def show_pool_stats(pool):
+    print("\nСтатистика пула соединений MySQL:")
+    if pool is None:
+        print("Пул соединений не создан.")
+        return
+    stats = pool.snapshot()
+    print(f"   Соединений: {stats['size']} (занято {stats['in_use']}, свободно {stats['idle']}), "
+          f"максимум {pool.max_size}")
+    print(f"   Выдач: {stats['checkouts']}, с ожиданием: {stats['waits']}, тайм-аутов: {stats['timeouts']}")
+    print(f"   Ожидание: среднее {stats['wait_avg_sec'] * 1000:.2f} мс, максимум {stats['wait_max_sec'] * 1000:.2f} мс")
+    print(f"   Создано: {stats['created']}, переподключений: {stats['reconnects']}, "
+          f"закрыто по простою: {stats['idle_closed']}, отброшено: {stats['discarded']}")
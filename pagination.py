@@ -0,0 +1,171 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pymysql.cursors
+from film_record import GENRES_SQL, to_records
+from instrumentation import stage
+
+
+# Keyset-пагинация: следующая страница начинается строго после ключа последней
+# строки предыдущей. Страница фильмов отбирается подзапросом по таблице film,
+# а жанры склеиваются уже для отобранных фильмов, поэтому строка — один фильм.
+# Как и раньше, в список попадают только фильмы, у которых есть жанр.
+# Переход по ключу опирается на индекс (release_year, title, film_id), которого
+# нет в стандартной Sakila: при развёртывании выполните sql/film_listing_index.sql.
+PAGE_QUERY = f"""
+    SELECT f.film_id, f.title, f.release_year, f.rating, {GENRES_SQL} AS genre
+    FROM (
+        SELECT film_id, title, release_year, rating
+        FROM film
+        WHERE EXISTS (SELECT 1 FROM film_category fc WHERE fc.film_id = film.film_id)
+        {{seek}}
+        ORDER BY release_year, title, film_id
+        LIMIT %s
+    ) f
+    JOIN film_category fc ON f.film_id = fc.film_id
+    JOIN category c ON fc.category_id = c.category_id
+    GROUP BY f.film_id, f.title, f.release_year, f.rating
+    ORDER BY f.release_year, f.title, f.film_id;
+"""
+
+# MySQL ставит NULL в начало сортировки, а сравнение строк с NULL никогда не
+# истинно, поэтому для фильмов без года условие перехода расписано отдельно
+SEEK_CONDITION = "AND (release_year > %s OR (release_year = %s AND (title, film_id) > (%s, %s)))"
+SEEK_NULL_YEAR_CONDITION = "AND (release_year IS NOT NULL OR (release_year IS NULL AND (title, film_id) > (%s, %s)))"
+
+
+def row_key(row):
+    return row.release_year, row.title, row.film_id
+
+
+def page_statement(page_size, after=None):
+    """SQL и аргументы страницы из page_size фильмов после ключа after."""
+    if after is None:
+        return PAGE_QUERY.format(seek=''), (page_size,)
+    release_year, title, film_id = after
+    if release_year is None:
+        return PAGE_QUERY.format(seek=SEEK_NULL_YEAR_CONDITION), (title, film_id, page_size)
+    return PAGE_QUERY.format(seek=SEEK_CONDITION), (release_year, release_year, title, film_id, page_size)
+
+
+def fetch_page(cursor, page_size, after=None, trace=None):
+    """
+    Загружает страницу из page_size фильмов, следующих за ключом after (None —
+    первая страница). cursor должен возвращать кортежи (pymysql.cursors.Cursor).
+    """
+    query, args = page_statement(page_size, after)
+    if trace is not None:
+        trace.statement = (query, args)
+    with stage(trace, "execute"):
+        cursor.execute(query, args)
+    with stage(trace, "fetch"):
+        rows = cursor.fetchall()
+    with stage(trace, "convert"):
+        return to_records(rows)
+
+
+class FilmPager:
+    """
+    Постраничный просмотр списка фильмов с кэшем уже открытых страниц и фоновой
+    подгрузкой следующей страницы. Фоновая загрузка берёт из пула отдельное
+    соединение, так как соединение pymysql нельзя использовать из нескольких
+    потоков одновременно. Если передан общий кэш результатов
+    (ResultCache), страницы также берутся из него и сохраняются в него.
+    Ошибка фоновой загрузки не выводится, а учитывается в stats и last_error:
+    страница загружается заново при обращении, и уже эта ошибка, если
+    повторится, достаётся вызывающему.
+    """
+
+    def __init__(self, pool, page_size=10, cache_pages=20, prefetch=True, cache=None):
+        self.page_size = page_size
+        self.cache_pages = cache_pages
+        self._pool = pool
+        self._cache = cache
+        self._pages = OrderedDict()  # номер страницы -> строки
+        self._keys = {}              # номер страницы -> ключ её последней строки
+        self._pending = {}           # номер страницы -> Future фоновой загрузки
+        self._executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        self.stats = {"prefetched": 0, "prefetch_failed": 0}
+        self.last_error = None
+
+    def get_page(self, page):
+        """Возвращает строки страницы page (нумерация с 0) и признак того, что она уже была в памяти."""
+        rows = self._pages.get(page)
+        if rows is not None:
+            self._pages.move_to_end(page)
+            return rows, True
+
+        future = self._pending.pop(page, None)
+        if future is not None:
+            try:
+                rows = future.result()
+                self.stats["prefetched"] += 1
+            except Exception as e:
+                self.stats["prefetch_failed"] += 1
+                self.last_error = e
+                rows = None
+            if rows is not None and self._cache is not None:
+                self._cache.put("pagination", self._cache_parameters(page), rows)
+
+        if rows is None and self._cache is not None:
+            rows = self._cache.get("pagination", self._cache_parameters(page))
+
+        if rows is None:
+            after = self._start_key(page)
+            if page > 0 and after is None:
+                rows = []  # предыдущая страница была последней
+            else:
+                rows = self._fetch(after)
+                if self._cache is not None:
+                    self._cache.put("pagination", self._cache_parameters(page), rows)
+            cached = False
+        else:
+            cached = True
+
+        self._store(page, rows)
+        return rows, cached
+
+    def statement(self, page):
+        """SQL и аргументы, которыми загружается страница page; None, если ключ предыдущей страницы неизвестен."""
+        if page > 0 and self._keys.get(page - 1) is None:
+            return None
+        return page_statement(self.page_size, self._keys.get(page - 1))
+
+    def prefetch(self, page):
+        """Запускает фоновую загрузку страницы page, если её ещё нет в кэше."""
+        if self._executor is None or page in self._pages or page in self._pending:
+            return
+        if page > 0 and page - 1 not in self._keys:
+            return
+        after = self._keys.get(page - 1)
+        if page > 0 and after is None:
+            return  # предыдущая страница была последней
+        self._pending[page] = self._executor.submit(self._fetch, after)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _cache_parameters(self, page):
+        # Те же параметры, что пишутся в лог запросов "pagination"
+        return {"page_size": self.page_size, "page": page + 1}
+
+    def _start_key(self, page):
+        if page == 0:
+            return None
+        if page - 1 not in self._keys:
+            # Ключ предыдущей страницы неизвестен — загружаем её, чтобы получить ключ
+            self.get_page(page - 1)
+        return self._keys.get(page - 1)
+
+    def _store(self, page, rows):
+        self._keys[page] = row_key(rows[-1]) if rows else None
+        self._pages[page] = rows
+        self._pages.move_to_end(page)
+        while len(self._pages) > self.cache_pages:
+            self._pages.popitem(last=False)
+
+    def _fetch(self, after):
+        with self._pool.cursor(pymysql.cursors.Cursor) as cursor:
+            return fetch_page(cursor, self.page_size, after)
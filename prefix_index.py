@@ -0,0 +1,114 @@
+"""
+Префиксный индекс по названиям фильмов и жанров: отсортированный массив
+ключей и двоичный поиск. Диапазон строк с заданным префиксом находится за
+O(|префикс| · log n), без перебора и без словарей на каждый результат поиска.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    import readline
+except ImportError:  # Windows без pyreadline — автодополнение просто отключено
+    readline = None
+
+# В GNU readline Tab и так вызывает дополнение (или то, что задано в ~/.inputrc),
+# а в libedit (macOS) его нужно включать на время ввода и затем вернуть вставку символа
+_LIBEDIT = readline is not None and (getattr(readline, 'backend', None) == 'editline'
+                                     or 'libedit' in (readline.__doc__ or ''))
+
+# Символ больше любого другого: верхняя граница диапазона ключей с префиксом
+_MAX_CHAR = '\U0010ffff'
+
+
+class PrefixIndex:
+    """Неизменяемый индекс пар (текст, значение) с поиском по префиксу без учёта регистра."""
+
+    def __init__(self, items=()):
+        entries = sorted(((text.casefold(), text, value) for text, value in items), key=lambda e: e[:2])
+        self._keys = [key for key, _, _ in entries]
+        self._texts = [text for _, text, _ in entries]
+        self._values = [value for _, _, value in entries]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _bounds(self, prefix):
+        key = prefix.casefold()
+        lo = bisect_left(self._keys, key)
+        return lo, bisect_left(self._keys, key + _MAX_CHAR, lo)
+
+    def count(self, prefix):
+        lo, hi = self._bounds(prefix)
+        return hi - lo
+
+    def starting_with(self, prefix, limit=None):
+        """Пары (текст, значение), текст которых начинается с prefix, в алфавитном порядке."""
+        lo, hi = self._bounds(prefix)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return list(zip(self._texts[lo:hi], self._values[lo:hi]))
+
+    def exact(self, text):
+        """Значения с точно совпадающим (без учёта регистра) текстом."""
+        key = text.casefold()
+        lo = bisect_left(self._keys, key)
+        hi = lo
+        while hi < len(self._keys) and self._keys[hi] == key:
+            hi += 1
+        return self._values[lo:hi]
+
+    def unique(self, prefix):
+        """
+        Значение, однозначно определяемое вводом: единственное точное совпадение
+        или единственная строка с таким префиксом; иначе None.
+        """
+        exact = self.exact(prefix)
+        if len(exact) == 1:
+            return exact[0]
+        lo, hi = self._bounds(prefix)
+        return self._values[lo] if hi - lo == 1 else None
+
+    def complete(self, prefix, limit=50):
+        return [text for text, _ in self.starting_with(prefix, limit)]
+
+    def subset(self, values):
+        """Индекс только из строк со значениями из values; сортировка сохраняется."""
+        values = set(values)
+        keep = [i for i, value in enumerate(self._values) if value in values]
+        subset = PrefixIndex()
+        subset._keys = [self._keys[i] for i in keep]
+        subset._texts = [self._texts[i] for i in keep]
+        subset._values = [self._values[i] for i in keep]
+        return subset
+
+
+@contextmanager
+def completion(index):
+    """
+    Автодополнение строки ввода по индексу (Tab в консоли) на время input().
+    Дополняется вся строка целиком, поэтому названия с пробелами работают.
+    """
+    if readline is None or index is None or not len(index):
+        yield
+        return
+
+    matches = []
+
+    def complete(text, state):
+        if state == 0:
+            matches[:] = index.complete(readline.get_line_buffer())
+        return matches[state] if state < len(matches) else None
+
+    previous_completer = readline.get_completer()
+    previous_delims = readline.get_completer_delims()
+    readline.set_completer(complete)
+    readline.set_completer_delims('')
+    if _LIBEDIT:
+        readline.parse_and_bind('bind ^I rl_complete')
+    try:
+        yield
+    finally:
+        if _LIBEDIT:
+            readline.parse_and_bind('bind ^I ed-insert')
+        readline.set_completer(previous_completer)
+        readline.set_completer_delims(previous_delims)
@@ -0,0 +1,129 @@
+import re
+import threading
+import time
+from collections import namedtuple
+
+from prefix_index import PrefixIndex
+
+# Рейтинги Sakila на случай, если тип столбца film.rating прочитать не удалось
+DEFAULT_RATINGS = ('G', 'PG', 'PG-13', 'R', 'NC-17')
+
+RATING_COLUMN_QUERY = """
+    SELECT COLUMN_TYPE AS column_type
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'film' AND COLUMN_NAME = 'rating';
+"""
+
+# Отметки изменений: по ним решается, нужно ли перечитывать справочники после истечения TTL
+WATERMARK_QUERY = """
+    SELECT (SELECT MAX(last_update) FROM category) AS category_updated,
+           (SELECT COUNT(*) FROM category) AS categories,
+           (SELECT MAX(last_update) FROM film) AS film_updated,
+           (SELECT COUNT(*) FROM film) AS films;
+"""
+
+Genre = namedtuple('Genre', 'category_id name')
+
+_ENUM_VALUE = re.compile(r"'((?:[^']|'')*)'")
+
+
+def parse_enum(column_type):
+    """Значения из типа столбца вида enum('G','PG','PG-13')."""
+    if not column_type or not column_type.lower().startswith('enum('):
+        return ()
+    return tuple(value.replace("''", "'") for value in _ENUM_VALUE.findall(column_type))
+
+
+class ReferenceData:
+    """
+    Справочники для меню поиска: жанры (category_id и название), допустимые
+    рейтинги из типа столбца film.rating, диапазон годов выпуска и префиксные
+    индексы названий фильмов и жанров для выбора и автодополнения. Загружаются
+    один раз при старте; по истечении ttl секунд проверяются отметки last_update
+    и количество строк, и справочники перечитываются только при изменениях.
+    """
+
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self.genres = ()               # кортеж Genre, по названию
+        self.ratings = DEFAULT_RATINGS
+        self.min_year = None
+        self.max_year = None
+        self.genre_index = PrefixIndex()  # название жанра -> Genre
+        self.titles = PrefixIndex()       # название фильма -> film_id
+        self.loaded = False
+        self._watermarks = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # ---------- загрузка и обновление ----------
+
+    def load(self, cursor):
+        cursor.execute("SELECT category_id, name FROM category ORDER BY name;")
+        genres = tuple(Genre(row['category_id'], row['name']) for row in cursor.fetchall())
+        cursor.execute("SELECT MIN(release_year) AS min_year, MAX(release_year) AS max_year FROM film;")
+        years = cursor.fetchone()
+        cursor.execute("SELECT film_id, title FROM film;")
+        titles = PrefixIndex((row['title'], row['film_id']) for row in cursor.fetchall())
+        cursor.execute(RATING_COLUMN_QUERY)
+        row = cursor.fetchone()
+        ratings = parse_enum(row['column_type'] if row else None) or DEFAULT_RATINGS
+        cursor.execute(WATERMARK_QUERY)
+        watermarks = cursor.fetchone()
+
+        with self._lock:
+            self.genres = genres
+            self.genre_index = PrefixIndex((genre.name, genre) for genre in genres)
+            self.titles = titles
+            self.ratings = ratings
+            self.min_year, self.max_year = years['min_year'], years['max_year']
+            self._watermarks = watermarks
+            self._checked_at = time.monotonic()
+            self.loaded = True
+
+    def maybe_refresh(self, cursor):
+        """Перечитывает справочники, если истёк TTL и в таблицах category/film что-то изменилось."""
+        if self.loaded and (not self.ttl or time.monotonic() - self._checked_at < self.ttl):
+            return
+        if self.loaded:
+            cursor.execute(WATERMARK_QUERY)
+            if cursor.fetchone() == self._watermarks:
+                self._checked_at = time.monotonic()
+                return
+        self.load(cursor)
+
+    def is_stale(self):
+        """True, если справочники ещё не загружены или пора проверить их актуальность."""
+        return not self.loaded or bool(self.ttl) and time.monotonic() - self._checked_at >= self.ttl
+
+    # ---------- поиск по справочникам ----------
+
+    def genre_names(self):
+        return [genre.name for genre in self.genres]
+
+    def match_genres(self, text):
+        """
+        Жанры, подходящие под ввод пользователя: точное совпадение названия без
+        учёта регистра, иначе жанры, начинающиеся с введённой строки, иначе
+        жанры, в названии которых она встречается.
+        """
+        text = text.strip()
+        if not text:
+            return []
+        exact = self.genre_index.exact(text)
+        if exact:
+            return exact
+        by_prefix = [genre for _, genre in self.genre_index.starting_with(text)]
+        if by_prefix:
+            return by_prefix
+        folded = text.casefold()
+        return [genre for genre in self.genres if folded in genre.name.casefold()]
+
+    def resolve_genre(self, text):
+        """Однозначно определяет жанр по вводу; ValueError, если жанр не найден или подходит несколько."""
+        matches = self.match_genres(text)
+        if not matches:
+            raise ValueError(f"Неизвестный жанр: {text.strip()}")
+        if len(matches) > 1:
+            raise ValueError(f"Уточните жанр: {', '.join(genre.name for genre in matches)}")
+        return matches[0]
@@ -0,0 +1,153 @@
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import MONGO_CONFIG, MYSQL_POOL_CONFIG
+from mongo_logger import connect_mongo, start_log_buffer, stop_log_buffer
+from mysql_connector import MySQLPool
+from search_api import create_service
+
+# Типы запросов, которые можно воспроизвести через SearchService.execute
+REPLAYABLE_TYPES = ("title", "genre_year", "rating", "pagination", "fulltext")
+
+
+def load_workload(path):
+    """Читает JSONL-файл нагрузки: по одному объекту {"type": ..., "parameters": {...}} в строке."""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if item.get("type") not in REPLAYABLE_TYPES or not isinstance(item.get("parameters"), dict):
+                raise ValueError(f"{path}:{line_number}: некорректная запись нагрузки")
+            items.append(item)
+    return items
+
+
+def export_workload(mongo_db, path, limit=None):
+    """Выгружает запросы из лога MongoDB в JSONL-файл в порядке их поступления."""
+    cursor = (mongo_db[MONGO_CONFIG['collection_name']]
+              .find({"type": {"$in": list(REPLAYABLE_TYPES)}}, {"_id": 0, "type": 1, "parameters": 1})
+              .sort("timestamp", 1))
+    if limit:
+        cursor = cursor.limit(limit)
+
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for doc in cursor:
+            f.write(json.dumps({"type": doc["type"], "parameters": doc["parameters"]}, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def percentile(sorted_values, p):
+    """Перцентиль p (0-100) отсортированного списка методом ближайшего ранга."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_workload(service, items, concurrency=4):
+    """
+    Выполняет запросы нагрузки в пуле потоков и возвращает отчёт: общую
+    пропускную способность и перцентили задержки по каждому типу запроса.
+    """
+    def run_one(item):
+        started = time.perf_counter()
+        try:
+            result = service.execute(item["type"], item["parameters"])
+            error, cache_hit = None, result.cache_hit
+        except Exception as e:
+            error, cache_hit = e, False
+        return item["type"], time.perf_counter() - started, cache_hit, error
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(run_one, items))
+    elapsed = time.perf_counter() - started
+
+    per_type = {}
+    for query_type, latency, cache_hit, error in outcomes:
+        stats = per_type.setdefault(query_type, {"latencies": [], "errors": 0, "cache_hits": 0})
+        if error is not None:
+            stats["errors"] += 1
+            continue
+        stats["latencies"].append(latency)
+        stats["cache_hits"] += cache_hit
+
+    report = {
+        "queries": len(outcomes),
+        "concurrency": concurrency,
+        "elapsed_sec": elapsed,
+        "throughput_qps": len(outcomes) / elapsed if elapsed else 0.0,
+        "types": {},
+    }
+    for query_type, stats in sorted(per_type.items()):
+        latencies = sorted(stats["latencies"])
+        report["types"][query_type] = {
+            "count": len(latencies) + stats["errors"],
+            "errors": stats["errors"],
+            "cache_hits": stats["cache_hits"],
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        }
+    return report
+
+
+def print_report(report):
+    print(f"\nВыполнено запросов: {report['queries']} за {report['elapsed_sec']:.2f} сек "
+          f"({report['throughput_qps']:.1f} запросов/сек, потоков: {report['concurrency']})")
+    print(f"{'Тип':<12} {'Кол-во':>7} {'Ошибки':>7} {'Кэш':>6} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'max, мс':>9}")
+    for query_type, stats in report["types"].items():
+        print(f"{query_type:<12} {stats['count']:>7} {stats['errors']:>7} {stats['cache_hits']:>6} "
+              f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f}")
+
+
+def run_cli(args):
+    """Точка входа для PR44.py --replay / --export-workload."""
+    if args.export_workload:
+        mongo_db = connect_mongo()
+        if mongo_db is None:
+            print("Не удалось подключиться к MongoDB.")
+            return
+        count = export_workload(mongo_db, args.export_workload, args.limit)
+        print(f"Выгружено запросов: {count} → {args.export_workload}")
+
+    if not args.replay:
+        return
+
+    items = load_workload(args.replay) * max(1, args.repeat)
+    concurrency = max(1, args.concurrency)
+    pool = MySQLPool(
+        min_size=MYSQL_POOL_CONFIG['min_size'],
+        max_size=max(concurrency, MYSQL_POOL_CONFIG['max_size']),
+        idle_timeout=MYSQL_POOL_CONFIG['idle_timeout'],
+        checkout_timeout=MYSQL_POOL_CONFIG['checkout_timeout'],
+        ping_interval=MYSQL_POOL_CONFIG['ping_interval'],
+    )
+
+    mongo_db = None
+    if args.log_replay:
+        mongo_db = connect_mongo()
+        start_log_buffer(mongo_db)
+
+    try:
+        pool.warm()
+        service = create_service(pool, mongo_db)
+        report = run_workload(service, items, concurrency)
+        print_report(report)
+        if service.cache is not None:
+            print(f"Кэш результатов: {service.cache.snapshot()}")
+        if args.metrics_out:
+            service.metrics.dump(args.metrics_out)
+            print(f"Замеры по этапам записаны в {args.metrics_out}")
+    finally:
+        stop_log_buffer()
+        pool.close()
@@ -0,0 +1,111 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_key(query_type, parameters):
+    """
+    Ключ кэша — нормализованная пара (тип, параметры), та же, по которой
+    группируется аналитика в MongoDB. Строки приводятся к нижнему регистру,
+    так как LIKE в MySQL сравнивает без учёта регистра.
+    """
+    normalized = tuple(sorted(
+        (name, value.strip().lower() if isinstance(value, str) else value)
+        for name, value in parameters.items()
+    ))
+    return query_type, normalized
+
+
+def estimate_size(rows):
+    """Приблизительный объём списка строк (записей FilmRecord или словарей) в байтах."""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        if isinstance(row, dict):
+            size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+        else:
+            size += row.estimated_size()
+    return size
+
+
+class ResultCache:
+    """
+    LRU-кэш результатов поиска с ограничением по числу записей и примерному
+    объёму в байтах и временем жизни записей, заданным для каждого типа запроса.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=64 * 1024 * 1024, ttl=None, default_ttl=300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = dict(ttl or {})
+        self.default_ttl = default_ttl
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        self._entries = OrderedDict()  # ключ -> (результат, размер, момент истечения)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, query_type, parameters):
+        key = make_key(query_type, parameters)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def put(self, query_type, parameters, value):
+        ttl = self.ttl.get(query_type, self.default_ttl)
+        if ttl <= 0:
+            return
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        key = make_key(query_type, parameters)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+def show_cache_stats(cache):
+    print("\nСтатистика кэша результатов:")
+    if cache is None:
+        print("Кэш результатов отключён.")
+        return
+    stats = cache.snapshot()
+    print(f"   Записей: {stats['entries']} из {cache.max_entries}")
+    print(f"   Объём: {stats['bytes'] / 1024:.1f} КБ из {cache.max_bytes / 1024:.0f} КБ")
+    print(f"   Попадания: {stats['hits']}, промахи: {stats['misses']} (доля попаданий {stats['hit_ratio']:.1%})")
+    print(f"   Вытеснено: {stats['evictions']}, истекло по TTL: {stats['expired']}")
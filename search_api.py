@@ -0,0 +1,427 @@
+import threading
+from collections import namedtuple
+
+import pymysql
+import pymysql.cursors
+from config import (CATALOG_CONFIG, DETAILS_CACHE_CONFIG, FACETS_CONFIG, FULLTEXT_CONFIG, INSTRUMENTATION_CONFIG,
+                    PAGINATION_CONFIG, REFERENCE_DATA_CONFIG, RESULT_CACHE_CONFIG, STREAMING_CONFIG)
+from facets import AVAILABLE as FACETS_AVAILABLE, FacetIndex, film_id_array
+from film_catalog import FilmCatalog
+from film_details import FilmDetailsCache
+from film_record import GENRES_SQL, to_records
+from fulltext import open_index
+from instrumentation import metrics as default_metrics, stage
+from mongo_logger import log_query
+from pagination import fetch_page, row_key
+from reference_data import ReferenceData
+from result_cache import ResultCache
+from slow_queries import start_slow_query_monitor
+
+
+# Жанры фильма склеиваются в одну строку: один фильм — одна строка результата.
+# Порядок столбцов совпадает с полями FilmRecord.
+TITLE_QUERY = f"""
+    SELECT f.film_id, f.title, f.release_year, f.rating, {GENRES_SQL} AS genre
+    FROM film f
+    JOIN film_category fc ON f.film_id = fc.film_id
+    JOIN category c ON fc.category_id = c.category_id
+    WHERE f.title LIKE %s
+    GROUP BY f.film_id
+    ORDER BY f.release_year, f.title, f.film_id;
+"""
+
+# Фильтр по жанру идёт через отдельную связь, чтобы в genre попали все жанры фильма
+GENRE_YEAR_QUERY = f"""
+    SELECT f.film_id, f.title, f.release_year, f.rating, {GENRES_SQL} AS genre
+    FROM film f
+    JOIN film_category fc_genre ON f.film_id = fc_genre.film_id AND fc_genre.category_id = %s
+    JOIN film_category fc ON f.film_id = fc.film_id
+    JOIN category c ON fc.category_id = c.category_id
+    WHERE f.release_year BETWEEN %s AND %s
+    GROUP BY f.film_id
+    ORDER BY f.release_year, f.title, f.film_id;
+"""
+
+RATING_QUERY = f"""
+    SELECT f.film_id, f.title, f.release_year, f.rating, {GENRES_SQL} AS genre
+    FROM film f
+    JOIN film_category fc ON f.film_id = fc.film_id
+    JOIN category c ON fc.category_id = c.category_id
+    WHERE f.rating = %s
+    GROUP BY f.film_id
+    ORDER BY f.release_year, f.title, f.film_id;
+"""
+
+# Полный список фильмов в порядке постраничного просмотра (только фильмы, у которых есть жанр)
+LISTING_QUERY = f"""
+    SELECT f.film_id, f.title, f.release_year, f.rating, {GENRES_SQL} AS genre
+    FROM film f
+    JOIN film_category fc ON f.film_id = fc.film_id
+    JOIN category c ON fc.category_id = c.category_id
+    GROUP BY f.film_id
+    ORDER BY f.release_year, f.title, f.film_id;
+"""
+
+# Результат поиска: строки, время выполнения в секундах и признак попадания в кэш
+SearchResult = namedtuple('SearchResult', 'rows duration cache_hit')
+
+# Ключ границы страницы, после которой строк больше нет
+_END = object()
+
+
+class SearchService:
+    """
+    Неинтерактивный API поиска: SQL-запросы, кэш результатов, каталог в памяти и
+    логирование в MongoDB без input()/print(). Потокобезопасен — соединения
+    берутся из пула на время каждого запроса, поэтому один объект может
+    обслуживать несколько потоков.
+    """
+
+    def __init__(self, pool, mongo_db=None, catalog=None, cache=None, page_size=None, details=None,
+                 reference=None, metrics=None, fulltext=None, facets=None, slow=None):
+        self.pool = pool
+        self.mongo_db = mongo_db
+        self.catalog = catalog
+        self.cache = cache
+        self.details = details  # кэш деталей фильмов для интерактивного сеанса
+        # Справочники загружаются при первом обращении, если не переданы уже загруженными
+        self.reference = reference if reference is not None else ReferenceData(REFERENCE_DATA_CONFIG['ttl'])
+        self.metrics = metrics if metrics is not None else default_metrics
+        self.fulltext = fulltext  # полнотекстовый индекс FullTextIndex или None
+        self.facets = facets      # снимок для фасетов FacetIndex или None
+        self.slow = slow          # отбор медленных запросов SlowQueryMonitor или None
+        self.page_size = page_size or PAGINATION_CONFIG['page_size']
+        self._page_keys = {}  # размер страницы -> {номер страницы: ключ её последней строки}
+        self._lock = threading.Lock()
+
+    # ---------- поисковые запросы ----------
+
+    def search_title(self, keyword):
+        parameters = self.prepare("title", {"keyword": keyword})[0]
+        return self._run("title", parameters, lambda trace: self._load_title(parameters["keyword"], trace))
+
+    def search_genre_year(self, genre, year_from, year_to):
+        parameters, query, args = self.prepare(
+            "genre_year", {"genre": genre, "year_from": year_from, "year_to": year_to})
+        return self._run("genre_year", parameters, lambda trace: self._fetch(query, args, trace))
+
+    def search_rating(self, rating):
+        parameters, query, args = self.prepare("rating", {"rating": rating})
+        return self._run("rating", parameters, lambda trace: self._fetch(query, args, trace))
+
+    def search_fulltext(self, text):
+        """Поиск по словам в названии и описании с ранжированием по релевантности."""
+        text = text.strip()
+        if not text:
+            raise ValueError("Пустой поисковый запрос.")
+        if self.fulltext is None:
+            raise ValueError("Полнотекстовый поиск отключён.")
+        return self._run("fulltext", {"query": text}, lambda trace: self._load_fulltext(text, trace))
+
+    def page(self, page, page_size=None):
+        """Страница общего списка фильмов; page нумеруется с 1, как в логе запросов."""
+        page, page_size = int(page), int(page_size or self.page_size)
+        if page < 1 or page_size < 1:
+            raise ValueError("Номер и размер страницы должны быть положительными.")
+        parameters = {"page_size": page_size, "page": page}
+        return self._run("pagination", parameters, lambda trace: self._load_page(page_size, page, trace))
+
+    def execute(self, query_type, parameters):
+        """Выполняет запрос по типу и параметрам в том виде, в каком они пишутся в лог."""
+        if query_type == "title":
+            return self.search_title(parameters["keyword"])
+        if query_type == "genre_year":
+            return self.search_genre_year(parameters["genre"], parameters["year_from"], parameters["year_to"])
+        if query_type == "rating":
+            return self.search_rating(parameters["rating"])
+        if query_type == "pagination":
+            return self.page(parameters["page"], parameters.get("page_size"))
+        if query_type == "fulltext":
+            return self.search_fulltext(parameters["query"])
+        raise ValueError(f"Неизвестный тип запроса: {query_type}")
+
+    def stream(self, query_type, parameters, fetch_size=None):
+        """
+        Генератор записей FilmRecord поискового запроса (title, genre_year, rating)
+        или полного списка фильмов (listing) через небуферизованный курсор SSCursor: строки читаются с сервера пачками
+        по fetch_size по мере потребления, весь результат в памяти не держится.
+        Кэш результатов не используется. Запрос пишется в лог после того, как
+        генератор исчерпан или закрыт; duration — время execute и чтения строк
+        без учёта времени их обработки потребителем.
+        """
+        parameters, query, args = self.prepare(query_type, parameters)
+        fetch_size = fetch_size or STREAMING_CONFIG['fetch_size']
+        trace = self.metrics.trace(query_type)
+        count = 0
+        try:
+            catalog = self.catalog
+            if query_type == "title" and catalog is not None and catalog.loaded:
+                # Индекс в памяти уже держит все строки — отдаём готовый результат
+                rows = self._load_title(parameters["keyword"], trace)
+                count = len(rows)
+                yield from rows
+                return
+
+            trace.statement = (query, args)
+            with self.pool.cursor(pymysql.cursors.SSCursor) as cursor:
+                with trace.span("execute"):
+                    cursor.execute(query, args)
+                while True:
+                    with trace.span("fetch"):
+                        rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    with trace.span("convert"):
+                        records = to_records(rows)
+                    count += len(records)
+                    yield from records
+        finally:
+            duration = sum(trace.stages.values())
+            self._log_traced(trace, parameters, count, duration, cache_hit=False)
+
+    # ---------- фасеты ----------
+
+    def facet_counts(self, rows):
+        """
+        Фасеты результата поиска: Facets со счётчиками фильмов по жанрам, годам
+        и рейтингам, без запросов к MySQL. None, если фасеты отключены.
+        """
+        index = self._facet_index()
+        if index is None:
+            return None
+        return index.counts(film_id_array(rows))
+
+    def refine(self, rows, genre=None, year=None, rating=None):
+        """
+        Уточняет результат поиска в памяти: строки rows, подходящие под все
+        заданные значения фасетов, в исходном порядке. Жанр сопоставляется со
+        справочником так же, как в поиске по жанру.
+        """
+        index = self._facet_index()
+        if index is None:
+            raise ValueError("Фасеты отключены.")
+        if genre is not None:
+            genre = self.reference_data().resolve_genre(genre).name
+        if rating is not None:
+            rating = rating.strip().upper()
+        if year is not None:
+            year = int(year)
+        positions = index.matching(film_id_array(rows), genre=genre, year=year, rating=rating)
+        return [rows[position] for position in positions.tolist()]
+
+    def _facet_index(self):
+        """Снимок фасетов, при необходимости обновлённый; при ошибке MySQL — прежний снимок."""
+        index = self.facets
+        if index is not None and index.is_stale():
+            try:
+                with self.pool.cursor(pymysql.cursors.Cursor) as cursor:
+                    index.maybe_refresh(cursor)
+            except pymysql.MySQLError:
+                if not index.loaded:
+                    raise
+        return index
+
+    # ---------- справочные данные ----------
+
+    def genres_and_years(self):
+        """Список жанров и диапазон годов выпуска для меню поиска по жанру."""
+        reference = self.reference_data()
+        return reference.genre_names(), reference.min_year, reference.max_year
+
+    def ratings(self):
+        """Допустимые рейтинги из типа столбца film.rating."""
+        return self.reference_data().ratings
+
+    def reference_data(self):
+        """Справочники, при необходимости обновлённые; при ошибке MySQL отдаётся прежний снимок."""
+        reference = self.reference
+        if reference.is_stale():
+            try:
+                with self.pool.cursor() as cursor:
+                    reference.maybe_refresh(cursor)
+            except pymysql.MySQLError:
+                if not reference.loaded:
+                    raise
+        return reference
+
+    # ---------- логирование ----------
+
+    def attach_mongo(self, mongo_db):
+        """Подключает лог запросов и отбор медленных запросов к уже работающему сервису."""
+        self.slow = start_slow_query_monitor(self.pool, mongo_db)
+        self.mongo_db = mongo_db
+
+    def log(self, query_type, parameters, result_count, duration, cache_hit=False, stages=None, statement=None):
+        """
+        Пишет запрос в лог MongoDB. statement — выполненный SQL и его аргументы:
+        если запрос оказался медленным, по ним в фоне снимается план EXPLAIN.
+        """
+        if self.mongo_db is not None:
+            log_query(self.mongo_db, query_type, parameters, result_count, duration, cache_hit=cache_hit,
+                      stages=stages if INSTRUMENTATION_CONFIG['log_stages'] else None)
+        if self.slow is not None and not cache_hit:
+            self.slow.observe(query_type, parameters, duration, statement, result_count)
+
+    # ---------- подготовка запросов ----------
+
+    def prepare(self, query_type, parameters):
+        """Проверяет и нормализует параметры поиска; возвращает (parameters, SQL, аргументы)."""
+        if query_type == "title":
+            keyword = parameters["keyword"].strip()
+            if not keyword:
+                raise ValueError("Пустое ключевое слово.")
+            return {"keyword": keyword}, TITLE_QUERY, (f"%{keyword}%",)
+        if query_type == "genre_year":
+            year_from, year_to = int(parameters["year_from"]), int(parameters["year_to"])
+            if not parameters["genre"].strip():
+                raise ValueError("Жанр обязателен.")
+            if year_from > year_to:
+                raise ValueError("Начальный год не может быть больше конечного.")
+            # Жанр сопоставляется со справочником, и фильтр идёт по индексированному category_id
+            genre = self.reference_data().resolve_genre(parameters["genre"])
+            return ({"genre": genre.name, "year_from": year_from, "year_to": year_to},
+                    GENRE_YEAR_QUERY, (genre.category_id, year_from, year_to))
+        if query_type == "rating":
+            rating = parameters["rating"].strip().upper()
+            if rating not in self.ratings():
+                raise ValueError(f"Недопустимый рейтинг: {rating}")
+            return {"rating": rating}, RATING_QUERY, (rating,)
+        if query_type == "listing":
+            return {}, LISTING_QUERY, ()
+        raise ValueError(f"Неизвестный тип поискового запроса: {query_type}")
+
+    # ---------- внутреннее ----------
+
+    def _run(self, query_type, parameters, load):
+        trace = self.metrics.trace(query_type)
+
+        rows = None
+        if self.cache is not None:
+            with trace.span("cache"):
+                rows = self.cache.get(query_type, parameters)
+        cache_hit = rows is not None
+        if not cache_hit:
+            rows = load(trace)
+            if self.cache is not None:
+                with trace.span("cache"):
+                    self.cache.put(query_type, parameters, rows)
+
+        duration = trace.elapsed()
+        self._log_traced(trace, parameters, len(rows), duration, cache_hit)
+        return SearchResult(rows, duration, cache_hit)
+
+    def _log_traced(self, trace, parameters, result_count, duration, cache_hit):
+        # Запись в лог замеряется отдельно и в duration запроса не входит
+        stages = trace.stages_ms()
+        with trace.span("log"):
+            self.log(trace.query_type, parameters, result_count, duration, cache_hit=cache_hit, stages=stages,
+                     statement=trace.statement)
+        trace.finish(total=duration)
+
+    def _fetch(self, query, args, trace=None):
+        # Кортежи вместо словарей DictCursor: записи FilmRecord строятся из них напрямую
+        if trace is not None:
+            trace.statement = (query, args)
+        with self.pool.cursor(pymysql.cursors.Cursor) as cursor:
+            with stage(trace, "execute"):
+                cursor.execute(query, args)
+            with stage(trace, "fetch"):
+                rows = cursor.fetchall()
+        with stage(trace, "convert"):
+            return to_records(rows)
+
+    def _load_title(self, keyword, trace=None):
+        catalog = self.catalog
+        if catalog is not None and catalog.loaded:
+            # Поиск по индексу в памяти вместо полного скана LIKE '%keyword%'
+            with stage(trace, "catalog"):
+                try:
+                    with self.pool.cursor() as cursor:
+                        catalog.maybe_refresh(cursor)
+                except pymysql.MySQLError:
+                    pass  # ищем по прежнему снимку, обновление повторится при следующем запросе
+                return catalog.search_title(keyword)
+        return self._fetch(TITLE_QUERY, (f"%{keyword}%",), trace)
+
+    def _load_fulltext(self, text, trace=None):
+        with stage(trace, "fulltext"):
+            return self.fulltext.search(text, limit=FULLTEXT_CONFIG['limit'], fuzzy=FULLTEXT_CONFIG['fuzzy'],
+                                        min_similarity=FULLTEXT_CONFIG['min_similarity'])
+
+    def _load_page(self, page_size, page, trace=None):
+        # Keyset-пагинация: идём от ближайшей известной границы страницы
+        with self._lock:
+            keys = dict(self._page_keys.setdefault(page_size, {0: None}))
+        known = max(number for number in keys if number < page)
+        after = keys[known]
+
+        rows = []
+        with self.pool.cursor(pymysql.cursors.Cursor) as cursor:
+            for current in range(known + 1, page + 1):
+                if after is _END:
+                    return []
+                rows = fetch_page(cursor, page_size, after, trace)
+                after = row_key(rows[-1]) if len(rows) == page_size else _END
+                with self._lock:
+                    self._page_keys[page_size][current] = after
+        return rows
+
+
+def create_service(pool, mongo_db):
+    """
+    Собирает SearchService со справочниками, кэшами результатов и деталей, каталогом
+    в памяти, полнотекстовым индексом, снимком фасетов и отбором медленных
+    запросов согласно настройкам.
+    """
+    cache = None
+    if RESULT_CACHE_CONFIG['enabled']:
+        cache = ResultCache(
+            max_entries=RESULT_CACHE_CONFIG['max_entries'],
+            max_bytes=RESULT_CACHE_CONFIG['max_bytes'],
+            ttl=RESULT_CACHE_CONFIG['ttl'],
+            default_ttl=RESULT_CACHE_CONFIG['default_ttl'],
+        )
+
+    catalog = None
+    if CATALOG_CONFIG['enabled']:
+        catalog = FilmCatalog(refresh_interval=CATALOG_CONFIG['refresh_interval'])
+        try:
+            with pool.cursor() as cursor:
+                catalog.load(cursor)
+        except pymysql.MySQLError as e:
+            print(f"Не удалось загрузить каталог фильмов, поиск пойдёт через MySQL: {e}")
+            catalog = None
+
+    reference = ReferenceData(REFERENCE_DATA_CONFIG['ttl'])
+    try:
+        with pool.cursor() as cursor:
+            reference.load(cursor)
+    except pymysql.MySQLError as e:
+        print(f"Не удалось загрузить справочники, повторим при первом обращении: {e}")
+
+    fulltext = None
+    if FULLTEXT_CONFIG['enabled']:
+        try:
+            with pool.cursor() as cursor:
+                fulltext = open_index(cursor, FULLTEXT_CONFIG['index_path'])
+        except pymysql.MySQLError as e:
+            print(f"Не удалось построить полнотекстовый индекс, поиск по описанию недоступен: {e}")
+
+    facets = None
+    if FACETS_CONFIG['enabled'] and FACETS_AVAILABLE:
+        facets = FacetIndex(FACETS_CONFIG['ttl'])
+        try:
+            with pool.cursor(pymysql.cursors.Cursor) as cursor:
+                facets.load(cursor)
+        except pymysql.MySQLError as e:
+            print(f"Не удалось загрузить снимок для фасетов, повторим при первом обращении: {e}")
+
+    details = None
+    if DETAILS_CACHE_CONFIG['enabled']:
+        details = FilmDetailsCache(
+            max_entries=DETAILS_CACHE_CONFIG['max_entries'],
+            batch_size=DETAILS_CACHE_CONFIG['batch_size'],
+        )
+
+    return SearchService(pool, mongo_db, catalog=catalog, cache=cache, details=details, reference=reference,
+                         fulltext=fulltext, facets=facets, slow=start_slow_query_monitor(pool, mongo_db))
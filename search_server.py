@@ -0,0 +1,370 @@
+"""
+Сервер поиска для нескольких клиентов: JSON поверх HTTP/1.1 на asyncio.
+Все запросы обслуживает один прогретый процесс с общим пулом соединений
+MySQL, кэшами и буферизованным логом MongoDB; блокирующие драйверы работают
+в пуле потоков. Одинаковые запросы, пришедшие, пока такой же ещё
+выполняется, ждут его результат вместо отдельного обращения к базе.
+
+    python PR44.py --serve --port 8044
+    curl 'http://127.0.0.1:8044/search/title?keyword=ace'
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pymysql
+from config import SERVER_CONFIG
+from film_details import fetch_details
+from log_retention import query_type_stats
+from circuit_breaker import CircuitOpenError
+from mongo_logger import (flush_log_buffer, get_log_buffer_stats, last_unique_queries, mongo_breaker,
+                          popular_queries)
+from result_cache import make_key
+from slow_queries import slow_query_report
+from startup import Backends
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Coalescer:
+    """
+    Объединяет одинаковые запросы, выполняющиеся одновременно: первый запускает
+    загрузку, остальные ждут тот же asyncio.Future. Работает в потоке цикла
+    событий, поэтому блокировки не нужны.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.stats = {"leaders": 0, "followers": 0}
+
+    async def run(self, key, start):
+        """Возвращает (результат, coalesced); start() создаёт корутину загрузки."""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["followers"] += 1
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.stats["leaders"] += 1
+        try:
+            result = await start()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение лидера уже получено; отмечаем его прочитанным, если ведомых нет
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._inflight[key]
+
+
+def _int_param(query, name, default=None):
+    value = query.get(name, default)
+    if value is None:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Не указан параметр {name}")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Параметр {name} должен быть числом")
+
+
+def _str_param(query, name):
+    value = query.get(name)
+    if value is None:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Не указан параметр {name}")
+    return value
+
+
+class SearchServer:
+    """Маршрутизация HTTP-запросов к SearchService и отчётам mongo_logger."""
+
+    def __init__(self, service, workers=None):
+        self.service = service
+        self.coalescer = Coalescer()
+        self.executor = ThreadPoolExecutor(max_workers=workers or service.pool.max_size,
+                                           thread_name_prefix="search-worker")
+        self.stats = {"requests": 0, "errors": 0, "connections": 0}
+
+    async def _blocking(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    # ---------- обработчики ----------
+
+    async def _search(self, query_type, parameters):
+        """Поиск через SearchService с объединением одинаковых запросов в полёте."""
+        started = time.perf_counter()
+        result, coalesced = await self.coalescer.run(
+            make_key(query_type, parameters),
+            lambda: self._blocking(self.service.execute, query_type, parameters),
+        )
+        if coalesced:
+            # Ведомый запрос тоже попадает в аналитику, но базу он не нагружал
+            await self._blocking(self.service.log, query_type, parameters, len(result.rows),
+                                 time.perf_counter() - started, True)
+        facets = await self._blocking(self.service.facet_counts, result.rows)
+        return {
+            "type": query_type,
+            "parameters": parameters,
+            "count": len(result.rows),
+            "duration_ms": round(result.duration * 1000, 3),
+            "cache_hit": result.cache_hit,
+            "coalesced": coalesced,
+            "facets": facets._asdict() if facets is not None else None,
+            "rows": [row.as_dict() for row in result.rows],
+        }
+
+    async def _title(self, query):
+        return await self._search("title", {"keyword": _str_param(query, "keyword")})
+
+    async def _genre_year(self, query):
+        return await self._search("genre_year", {
+            "genre": _str_param(query, "genre"),
+            "year_from": _int_param(query, "year_from"),
+            "year_to": _int_param(query, "year_to"),
+        })
+
+    async def _rating(self, query):
+        return await self._search("rating", {"rating": _str_param(query, "rating")})
+
+    async def _fulltext(self, query):
+        return await self._search("fulltext", {"query": _str_param(query, "q")})
+
+    async def _films(self, query):
+        page_size = _int_param(query, "page_size", self.service.page_size)
+        page = _int_param(query, "page", 1)
+        if page_size < 1:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Параметр page_size должен быть положительным")
+        if not 1 <= page <= SERVER_CONFIG['max_page']:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Параметр page должен быть от 1 до {SERVER_CONFIG['max_page']}")
+        return await self._search("pagination", {
+            "page_size": min(page_size, SERVER_CONFIG['max_page_size']),
+            "page": page,
+        })
+
+    async def _film(self, film_id):
+        def load():
+            details = self.service.details
+            film = details.get(film_id) if details is not None else None
+            if film is None:
+                with self.service.pool.cursor() as cursor:
+                    film = (details.load(cursor, film_id) if details is not None
+                            else fetch_details(cursor, [film_id]).get(film_id))
+            return film
+
+        film, _ = await self.coalescer.run(("details", film_id), lambda: self._blocking(load))
+        if film is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Фильм не найден")
+        return {**film.as_dict(), "genres": film.genres}
+
+    async def _reference(self, query):
+        def load():
+            reference = self.service.reference_data()
+            return {
+                "genres": reference.genre_names(),
+                "ratings": list(reference.ratings),
+                "min_year": reference.min_year,
+                "max_year": reference.max_year,
+            }
+        return await self._blocking(load)
+
+    async def _analytics(self, report, limit):
+        mongo_db = self.service.mongo_db
+        if mongo_db is None:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Нет подключения к MongoDB")
+
+        def load():
+            flush_log_buffer()
+            return report(mongo_db, limit)
+        return await self._blocking(load)
+
+    async def _popular(self, query):
+        return await self._analytics(popular_queries, _int_param(query, "limit", 10))
+
+    async def _last_unique(self, query):
+        return await self._analytics(last_unique_queries, _int_param(query, "limit", 10))
+
+    async def _types(self, query):
+        return await self._analytics(query_type_stats, _int_param(query, "days", 7))
+
+    async def _slow(self, query):
+        return await self._analytics(slow_query_report, _int_param(query, "days", 30))
+
+    async def _stats(self, query):
+        service = self.service
+        return {
+            "server": dict(self.stats),
+            "coalescing": dict(self.coalescer.stats),
+            "pool": service.pool.snapshot(),
+            "cache": service.cache.snapshot() if service.cache is not None else None,
+            "details": service.details.snapshot() if service.details is not None else None,
+            "metrics": service.metrics.snapshot(),
+            "slow_queries": service.slow.snapshot() if service.slow is not None else None,
+            "log_buffer": get_log_buffer_stats(),
+            "mongo_breaker": mongo_breaker.snapshot(),
+        }
+
+    ROUTES = {
+        "/search/title": _title,
+        "/search/genre_year": _genre_year,
+        "/search/rating": _rating,
+        "/search/fulltext": _fulltext,
+        "/films": _films,
+        "/reference": _reference,
+        "/analytics/popular": _popular,
+        "/analytics/last_unique": _last_unique,
+        "/analytics/types": _types,
+        "/analytics/slow": _slow,
+        "/stats": _stats,
+    }
+
+    async def dispatch(self, method, target):
+        if method != "GET":
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Поддерживается только GET")
+        url = urlsplit(target)
+        path = unquote(url.path).rstrip("/") or "/"
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        handler = self.ROUTES.get(path)
+        if handler is not None:
+            return await handler(self, query)
+        prefix, _, film_id = path.rpartition("/")
+        if prefix == "/films" and film_id.isdigit():
+            return await self._film(int(film_id))
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"Неизвестный путь: {path}")
+
+    # ---------- HTTP ----------
+
+    async def handle_connection(self, reader, writer):
+        self.stats["connections"] += 1
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                except ValueError:
+                    # Строка длиннее предела буфера StreamReader
+                    raise HTTPError(HTTPStatus.REQUEST_URI_TOO_LONG, "Слишком длинная строка запроса")
+                if not request_line.strip():
+                    return
+                headers = await self._read_headers(reader)
+                length = headers.get("content-length") or "0"
+                if not length.isdigit():
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, "Некорректный заголовок Content-Length")
+                if int(length) > SERVER_CONFIG['max_body_bytes']:
+                    raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Слишком большое тело запроса")
+                if int(length):
+                    await reader.readexactly(int(length))
+
+                status, body = await self._respond(request_line.decode("latin-1"))
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._write(writer, status, body, keep_alive)
+                if not keep_alive:
+                    return
+        except HTTPError as e:
+            # Без корректных заголовков не найти начало следующего запроса — отвечаем и закрываем соединение
+            try:
+                await self._reject(writer, e.status, str(e))
+            except ConnectionError:
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_headers(reader):
+        """Заголовки запроса с именами в нижнем регистре; HTTPError 431 при превышении пределов."""
+        headers = {}
+        size = 0
+        for _ in range(SERVER_CONFIG['max_header_lines'] + 1):
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Слишком длинный заголовок")
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            size += len(line)
+            if size > SERVER_CONFIG['max_header_bytes']:
+                raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Слишком большие заголовки")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Слишком много заголовков")
+
+    async def _reject(self, writer, status, message):
+        self.stats["requests"] += 1
+        self.stats["errors"] += 1
+        body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+        await self._write(writer, status, body, keep_alive=False)
+
+    @staticmethod
+    async def _write(writer, status, body, keep_alive):
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    async def _respond(self, request_line):
+        self.stats["requests"] += 1
+        try:
+            method, target, _ = request_line.split(" ", 2)
+            payload = await self.dispatch(method, target)
+            status = HTTPStatus.OK
+        except HTTPError as e:
+            status, payload = e.status, {"error": str(e)}
+        except (ValueError, KeyError) as e:
+            status, payload = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except pymysql.MySQLError as e:
+            status, payload = HTTPStatus.SERVICE_UNAVAILABLE, {"error": f"Ошибка MySQL: {e}"}
+        except CircuitOpenError as e:
+            status, payload = HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)}
+        except Exception as e:
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+        if status != HTTPStatus.OK:
+            self.stats["errors"] += 1
+        return status, json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port,
+                                            limit=SERVER_CONFIG['max_header_bytes'])
+        addresses = ", ".join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+        print(f"Сервер поиска слушает {addresses}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def run_cli(args):
+    """Точка входа для PR44.py --serve."""
+    # MySQL и MongoDB подключаются параллельно; сервер стартует, когда готов поиск
+    backends = Backends()
+    server = None
+    try:
+        service = backends.service()
+        if service is None:
+            print("Не удалось подключиться к MySQL. Завершение работы.")
+            return
+        server = SearchServer(service, workers=SERVER_CONFIG['workers'])
+        asyncio.run(server.serve(args.host or SERVER_CONFIG['host'], args.port or SERVER_CONFIG['port']))
+    except KeyboardInterrupt:
+        print("\nСервер остановлен.")
+    finally:
+        if server is not None:
+            server.close()
+        backends.close()
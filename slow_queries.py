@@ -0,0 +1,376 @@
+"""
+Медленные запросы: если поиск выполнялся дольше порога своего типа
+(SLOW_QUERY_CONFIG), фоновый поток выполняет EXPLAIN FORMAT=JSON того же
+SQL с теми же аргументами на отдельном соединении MySQL и сохраняет план,
+оценку числа просмотренных строк и параметры запроса в коллекцию медленных
+запросов рядом с логом. Пользователь EXPLAIN не ждёт. Отчёт группирует
+медленные запросы по форме плана и показывает типы запросов, которые
+стали медленнее за последние дни.
+
+    python slow_queries.py --report 30
+"""
+import argparse
+import atexit
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+import pymysql
+import pymysql.cursors
+from circuit_breaker import CircuitOpenError
+from config import SLOW_QUERY_CONFIG
+from mongo_logger import connect_mongo, mongo_breaker, slow_collection
+
+# Сколько последних дней сравнивается с предыдущими в отчёте о регрессиях
+RECENT_DAYS = 7
+
+# Тип запроса считается ухудшившимся, если медленных запросов в день стало
+# больше в REGRESSION_COUNT_RATIO раз или их средняя длительность выросла
+# в REGRESSION_DURATION_RATIO раз, либо появился новый план
+REGRESSION_COUNT_RATIO = 2.0
+REGRESSION_DURATION_RATIO = 1.5
+
+# Форма плана для запросов, выполненных без SQL (каталог в памяти, полнотекстовый индекс)
+NO_SQL_SHAPE = "без SQL"
+
+# Сколько разных запросов держать в памяти вместе с их планами
+_PLAN_CACHE_SIZE = 256
+
+
+def _plan_tables(node, tables, flags):
+    """Обходит план EXPLAIN FORMAT=JSON: таблицы в порядке соединения и признаки filesort/temporary."""
+    if isinstance(node, dict):
+        if "table_name" in node and "access_type" in node:
+            tables.append(node)
+        if node.get("using_filesort"):
+            flags.add("filesort")
+        if node.get("using_temporary_table"):
+            flags.add("temporary")
+        for value in node.values():
+            _plan_tables(value, tables, flags)
+    elif isinstance(node, list):
+        for value in node:
+            _plan_tables(value, tables, flags)
+
+
+def summarize_plan(plan):
+    """
+    Сводка плана: форма (таблицы с типом доступа и индексом, признаки filesort
+    и temporary), её хэш, оценка числа просмотренных строк (сумма
+    rows_examined_per_scan по таблицам) и стоимость запроса по оценке MySQL.
+    """
+    tables, flags = [], set()
+    _plan_tables(plan, tables, flags)
+    steps = [f"{table['table_name']}:{table['access_type']}" + (f"({table['key']})" if table.get("key") else "")
+             for table in tables]
+    shape = " → ".join(steps) + "".join(f" +{flag}" for flag in sorted(flags))
+    cost = plan.get("query_block", {}).get("cost_info", {}).get("query_cost")
+    return {
+        "plan_shape": shape,
+        "plan_hash": hashlib.sha1(shape.encode("utf-8")).hexdigest()[:12],
+        "rows_examined": sum(int(table.get("rows_examined_per_scan") or 0) for table in tables),
+        "query_cost": float(cost) if cost is not None else None,
+    }
+
+
+class SlowQueryMonitor:
+    """
+    Отбирает медленные запросы и сохраняет их с планами выполнения. observe()
+    только сравнивает длительность с порогом и ставит запрос в ограниченную
+    очередь; EXPLAIN и запись в MongoDB делает фоновый поток через отдельный
+    пул pool на одно соединение. План одного и того же запроса (SQL и
+    аргументы) переиспользуется explain_ttl секунд. Если в очереди уже
+    queue_size запросов, новый сохраняется без EXPLAIN — с планом из памяти,
+    если он есть.
+    """
+
+    def __init__(self, pool, mongo_db, thresholds=None, default_threshold=0.5, queue_size=100,
+                 explain_ttl=600.0):
+        self.pool = pool
+        self.collection = slow_collection(mongo_db)
+        self.thresholds = dict(thresholds or {})  # тип запроса -> порог в секундах
+        self.default_threshold = default_threshold
+        self.queue_size = queue_size
+        self.explain_ttl = explain_ttl
+        self.stats = {"observed": 0, "slow": 0, "explained": 0, "reused": 0, "unexplained": 0, "failed": 0}
+        self._queue = deque()
+        self._plans = OrderedDict()  # (SQL, аргументы) -> (момент EXPLAIN, план, сводка)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="slow-query-explainer", daemon=True)
+        self._worker.start()
+
+    def threshold(self, query_type):
+        return self.thresholds.get(query_type, self.default_threshold)
+
+    def observe(self, query_type, parameters, duration, statement=None, result_count=None):
+        """
+        Проверяет запрос по порогу его типа; медленный ставит в очередь на
+        EXPLAIN. statement — (SQL, аргументы) выполненного запроса или None,
+        если он обслужен без MySQL. Возвращает True для медленного запроса.
+        """
+        threshold = self.threshold(query_type)
+        with self._cond:
+            self.stats["observed"] += 1
+            if duration < threshold:
+                return False
+            self.stats["slow"] += 1
+            event = {
+                "type": query_type,
+                "parameters": parameters,
+                "duration_sec": round(duration, 4),
+                "threshold_sec": threshold,
+                "result_count": result_count,
+                "timestamp": datetime.utcnow(),
+            }
+            explain = len(self._queue) < self.queue_size
+            if not explain:
+                self.stats["unexplained"] += 1
+            self._queue.append((event, statement, explain))
+            self._cond.notify()
+        return True
+
+    def close(self, timeout=10.0):
+        """Дописывает очередь, останавливает фоновый поток и закрывает отдельный пул."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join(timeout)
+        self.pool.close()
+        return not self._worker.is_alive()
+
+    def snapshot(self):
+        with self._cond:
+            return {**self.stats, "queued": len(self._queue)}
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                event, statement, explain = self._queue.popleft()
+            try:
+                document = {**event, **self._explain(statement, explain)}
+                with mongo_breaker.guard():
+                    self.collection.insert_one(document)
+            except CircuitOpenError:
+                with self._cond:
+                    self.stats["failed"] += 1
+            except Exception as e:
+                with self._cond:
+                    self.stats["failed"] += 1
+                print(f"Ошибка при сохранении медленного запроса в MongoDB: {e}")
+
+    def _explain(self, statement, explain=True):
+        if statement is None:
+            return {"sql": None, "arguments": None, "plan": None, "plan_shape": NO_SQL_SHAPE,
+                    "plan_hash": None, "rows_examined": None, "query_cost": None}
+        query, args = statement
+        key = (query, tuple(args))
+        cached = self._plans.get(key)
+        if not explain and cached is None:
+            plan, summary = None, {"plan_shape": None, "plan_hash": None, "rows_examined": None,
+                                   "query_cost": None, "plan_error": "очередь EXPLAIN переполнена"}
+        elif cached is not None and (not explain or time.monotonic() - cached[0] < self.explain_ttl):
+            plan, summary = cached[1], cached[2]
+            with self._cond:
+                self.stats["reused"] += 1
+        else:
+            try:
+                with self.pool.cursor(pymysql.cursors.Cursor) as cursor:
+                    cursor.execute("EXPLAIN FORMAT=JSON " + query.strip(), args)
+                    plan = json.loads(cursor.fetchone()[0])
+                summary = summarize_plan(plan)
+            except (pymysql.MySQLError, ValueError, TypeError) as e:
+                plan, summary = None, {"plan_shape": None, "plan_hash": None, "rows_examined": None,
+                                       "query_cost": None, "plan_error": str(e)}
+            else:
+                self._plans[key] = (time.monotonic(), plan, summary)
+                self._plans.move_to_end(key)
+                while len(self._plans) > _PLAN_CACHE_SIZE:
+                    self._plans.popitem(last=False)
+            with self._cond:
+                self.stats["explained" if plan is not None else "failed"] += 1
+        return {"sql": " ".join(query.split()), "arguments": list(args), "plan": plan, **summary}
+
+
+_monitor = None
+
+
+def start_slow_query_monitor(pool, mongo_db):
+    """
+    Включает отбор медленных запросов согласно SLOW_QUERY_CONFIG. EXPLAIN
+    выполняется через отдельный пул на одно соединение с настройками pool.
+    Возвращает монитор или None, если он отключён или нет MongoDB.
+    """
+    global _monitor
+    if mongo_db is None or not SLOW_QUERY_CONFIG['enabled']:
+        return None
+    if _monitor is None:
+        _monitor = SlowQueryMonitor(
+            pool.spawn(max_size=1), mongo_db,
+            thresholds={name: ms / 1000 for name, ms in SLOW_QUERY_CONFIG['thresholds_ms'].items()},
+            default_threshold=SLOW_QUERY_CONFIG['default_threshold_ms'] / 1000,
+            queue_size=SLOW_QUERY_CONFIG['queue_size'],
+            explain_ttl=SLOW_QUERY_CONFIG['explain_ttl'],
+        )
+    return _monitor
+
+
+def stop_slow_query_monitor():
+    global _monitor
+    monitor, _monitor = _monitor, None
+    if monitor is not None:
+        monitor.close()
+
+
+atexit.register(stop_slow_query_monitor)
+
+
+# ---------- отчёт ----------
+
+def plan_report(mongo_db, days=30, now=None):
+    """Медленные запросы за days дней по паре (тип, форма плана), по убыванию числа."""
+    since = (now or datetime.utcnow()) - timedelta(days=days)
+    report = list(slow_collection(mongo_db).aggregate([
+        {"$match": {"timestamp": {"$gte": since}}},
+        {"$group": {
+            "_id": {"type": "$type", "plan_hash": "$plan_hash"},
+            "type": {"$first": "$type"},
+            "plan_shape": {"$first": "$plan_shape"},
+            "count": {"$sum": 1},
+            "avg_duration": {"$avg": "$duration_sec"},
+            "max_duration": {"$max": "$duration_sec"},
+            "avg_rows_examined": {"$avg": "$rows_examined"},
+            "first_seen": {"$min": "$timestamp"},
+            "last_seen": {"$max": "$timestamp"},
+            "example": {"$last": "$parameters"},
+        }},
+        {"$sort": {"count": -1}},
+    ]))
+    for entry in report:
+        entry.pop("_id")
+    return report
+
+
+def regressions(mongo_db, days=30, recent_days=RECENT_DAYS, now=None):
+    """
+    Сравнение по типам запросов последних recent_days дней с предыдущими
+    днями периода days: медленных запросов в день, их средняя длительность и
+    планы, которых раньше не было. Тип без медленных запросов в предыдущие дни
+    (новая установка или days == recent_days) не с чем сравнить: он отмечается
+    no_baseline, а не regressed. Возвращает список словарей; ухудшившиеся
+    (regressed) идут первыми, за ними — без базы для сравнения.
+    """
+    now = now or datetime.utcnow()
+    recent_days = min(recent_days, days)
+    split = now - timedelta(days=recent_days)
+    baseline_days = days - recent_days
+    groups = slow_collection(mongo_db).aggregate([
+        {"$match": {"timestamp": {"$gte": now - timedelta(days=days)}}},
+        {"$group": {
+            "_id": {"type": "$type", "plan_hash": "$plan_hash",
+                    "recent": {"$cond": [{"$gte": ["$timestamp", split]}, True, False]}},
+            "plan_shape": {"$first": "$plan_shape"},
+            "count": {"$sum": 1},
+            "duration_sum": {"$sum": "$duration_sec"},
+        }},
+    ])
+
+    types = {}
+    for group in groups:
+        key = group["_id"]
+        entry = types.setdefault(key["type"], {
+            "type": key["type"], "baseline": {"count": 0, "duration_sum": 0.0, "plans": {}},
+            "recent": {"count": 0, "duration_sum": 0.0, "plans": {}},
+        })
+        window = entry["recent" if key["recent"] else "baseline"]
+        window["count"] += group["count"]
+        window["duration_sum"] += group["duration_sum"]
+        window["plans"][key["plan_hash"]] = group["plan_shape"]
+
+    report = []
+    for entry in types.values():
+        baseline, recent = entry.pop("baseline"), entry.pop("recent")
+        baseline_avg = baseline["duration_sum"] / baseline["count"] if baseline["count"] else None
+        recent_avg = recent["duration_sum"] / recent["count"] if recent["count"] else None
+        baseline_rate = baseline["count"] / baseline_days if baseline_days else None
+        recent_rate = recent["count"] / recent_days if recent_days else 0.0
+        new_plans = [shape for plan_hash, shape in recent["plans"].items()
+                     if plan_hash not in baseline["plans"] and baseline["count"]]
+        no_baseline = not baseline["count"]
+        regressed = bool(recent["count"]) and not no_baseline and (
+            recent_rate > baseline_rate * REGRESSION_COUNT_RATIO
+            or recent_avg > baseline_avg * REGRESSION_DURATION_RATIO
+            or bool(new_plans))
+        report.append({
+            **entry,
+            "baseline_per_day": baseline_rate,
+            "recent_per_day": recent_rate,
+            "baseline_avg_duration": baseline_avg,
+            "recent_avg_duration": recent_avg,
+            "new_plans": new_plans,
+            "regressed": regressed,
+            "no_baseline": no_baseline,
+        })
+    report.sort(key=lambda entry: (not entry["regressed"], not entry["no_baseline"], -entry["recent_per_day"]))
+    return report
+
+
+def slow_query_report(mongo_db, days=30):
+    """Планы медленных запросов и регрессии по типам — для сервера и меню."""
+    now = datetime.utcnow()
+    with mongo_breaker.guard():
+        return {"plans": plan_report(mongo_db, days, now=now), "regressions": regressions(mongo_db, days, now=now)}
+
+
+def show_slow_query_report(mongo_db, days=30):
+    try:
+        report = slow_query_report(mongo_db, days)
+    except Exception as e:
+        print(f"Ошибка при получении отчёта о медленных запросах: {e}")
+        return
+
+    print(f"\nМедленные запросы за {days} дн. по планам выполнения:")
+    if not report["plans"]:
+        print("Медленных запросов нет.")
+        return
+    for i, entry in enumerate(report["plans"], 1):
+        rows = f", строк ~{entry['avg_rows_examined']:.0f}" if entry["avg_rows_examined"] is not None else ""
+        print(f"{i}. {entry['type']}: запросов {entry['count']}, среднее {entry['avg_duration'] * 1000:.1f} мс, "
+              f"максимум {entry['max_duration'] * 1000:.1f} мс{rows}")
+        print(f"   План: {entry['plan_shape'] or 'не получен'}")
+        print(f"   Пример параметров: {json.dumps(entry['example'], ensure_ascii=False, default=str)}")
+
+    def per_day(value):
+        return f"{value:.1f}" if value is not None else "—"
+
+    def avg_ms(value):
+        return f"{value * 1000:.1f}" if value is not None else "—"
+
+    recent_days = min(RECENT_DAYS, days)
+    print(f"\nПоследние {recent_days} дн. против предыдущих:")
+    print(f"{'Тип':<12} {'В день было':>12} {'стало':>7} {'Ср., мс было':>13} {'стало':>7}")
+    for entry in report["regressions"]:
+        mark = "  ← хуже" if entry["regressed"] else "  (не с чем сравнить)" if entry["no_baseline"] else ""
+        print(f"{entry['type']:<12} {per_day(entry['baseline_per_day']):>12} {per_day(entry['recent_per_day']):>7} "
+              f"{avg_ms(entry['baseline_avg_duration']):>13} {avg_ms(entry['recent_avg_duration']):>7}{mark}")
+        for shape in entry["new_plans"]:
+            print(f"   новый план: {shape or 'не получен'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отчёт о медленных запросах из MongoDB")
+    parser.add_argument("--report", type=int, default=30, metavar="DAYS",
+                        help="за сколько дней строить отчёт (по умолчанию 30)")
+    args = parser.parse_args()
+
+    db = connect_mongo()
+    if db is None:
+        raise SystemExit("Не удалось подключиться к MongoDB.")
+    show_slow_query_report(db, args.report)
@@ -0,0 +1,7 @@
+-- Индекс для keyset-пагинации списка фильмов (pagination.PAGE_QUERY).
+-- В стандартной Sakila у film есть только PRIMARY, idx_title и индексы
+-- внешних ключей; без этого индекса каждая страница — полный просмотр
+-- таблицы с сортировкой, и дальние страницы не дешевле OFFSET.
+-- Выполняется один раз при развёртывании:
+--     mysql sakila < sql/film_listing_index.sql
+CREATE INDEX idx_film_listing ON film (release_year, title, film_id);
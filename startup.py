@@ -0,0 +1,119 @@
+"""
+Запуск без ожидания подключений. Пул MySQL и MongoDB открываются
+параллельно в фоновых потоках, а SearchService (справочники, каталог,
+индексы) собирается в фоне, как только готов пул. Лог запросов в MongoDB
+подключается к сервису отдельно, когда MongoDB ответит, поэтому
+недоступная MongoDB не задерживает поиск. Меню показывается сразу; ждать
+приходится только действию, которому подключение уже нужно.
+"""
+import threading
+from concurrent.futures import Future
+
+from log_retention import start_downsampler, stop_downsampler
+from mongo_logger import connect_mongo, ensure_indexes, ensure_rollup, start_log_buffer, stop_log_buffer
+from mysql_connector import create_pool
+from slow_queries import stop_slow_query_monitor
+
+
+class Backends:
+    """
+    Фоновое подключение к MySQL и MongoDB. pool(), mongo_db() и service()
+    ждут готовности нужной части и возвращают None, если подключиться не
+    удалось. Фоновые потоки — демоны: выход из программы их не ждёт.
+    """
+
+    def __init__(self):
+        self._closed = False
+        self._lock = threading.Lock()
+        self._attached = False
+        self._pool = self._background("startup-mysql", create_pool)
+        self._mongo = self._background("startup-mongo", self._open_mongo)
+        self._service = self._background("startup-service", self._create_service)
+        self._mongo.add_done_callback(self._attach_mongo)
+        self._service.add_done_callback(self._attach_mongo)
+
+    def pool(self):
+        return self._pool.result()
+
+    def mongo_db(self):
+        return self._mongo.result()
+
+    def service(self):
+        return self._service.result()
+
+    def close(self):
+        """
+        Останавливает фоновые задачи логирования и закрывает пул, не дожидаясь
+        подключений, которые ещё идут. Возвращает счётчики буфера логов.
+        """
+        with self._lock:
+            self._closed = True
+        stop_slow_query_monitor()
+        stop_downsampler()
+        stats = stop_log_buffer()
+        pool = self._done_result(self._pool)
+        if pool is not None:
+            pool.close()
+        return stats
+
+    @staticmethod
+    def _background(name, func):
+        future = Future()
+
+        def run():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(func())
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=name, daemon=True).start()
+        return future
+
+    @staticmethod
+    def _done_result(future):
+        """Результат завершившейся задачи; None, если она ещё идёт или упала."""
+        if not future.done() or future.exception() is not None:
+            return None
+        return future.result()
+
+    def _open_mongo(self):
+        mongo_db = connect_mongo()
+        if mongo_db is None:
+            print("Не удалось подключиться к MongoDB. Логирование и аналитика недоступны.")
+            return None
+        try:
+            ensure_indexes(mongo_db)
+        except Exception as e:
+            print(f"Не удалось создать индексы лога запросов в MongoDB: {e}")
+        try:
+            # Сводка для отчётов строится один раз по уже накопленному логу
+            ensure_rollup(mongo_db)
+        except Exception as e:
+            print(f"Не удалось построить сводку запросов в MongoDB: {e}")
+        with self._lock:
+            if self._closed:
+                return None
+            # Логи пишутся фоновым потоком пачками, не задерживая поиск
+            start_log_buffer(mongo_db)
+            start_downsampler(mongo_db)
+        return mongo_db
+
+    def _create_service(self):
+        pool = self._pool.result()
+        if pool is None:
+            return None
+        # search_api тянет за собой каталог, индексы и NumPy — импортируем в фоне
+        from search_api import create_service
+        return create_service(pool, None)
+
+    def _attach_mongo(self, _future):
+        """Подключает лог к сервису, когда готовы и сервис, и MongoDB (в любом порядке)."""
+        service, mongo_db = self._done_result(self._service), self._done_result(self._mongo)
+        if service is None or mongo_db is None:
+            return
+        with self._lock:
+            if self._attached or self._closed:
+                return
+            self._attached = True
+            service.attach_mongo(mongo_db)
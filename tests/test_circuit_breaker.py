@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def open_breaker(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, base_delay=0.01, max_delay=0.01)
+        with self.assertRaises(ConnectionError):
+            with breaker.guard():
+                raise ConnectionError
+        self.assertTrue(breaker.is_open)
+        time.sleep(0.02)
+        return breaker
+
+    def test_interrupted_probe_allows_next_probe(self):
+        breaker = self.open_breaker()
+        with self.assertRaises(KeyboardInterrupt):
+            with breaker.guard():
+                raise KeyboardInterrupt
+        self.assertTrue(breaker.is_open)
+        with self.assertRaises(CircuitOpenError):
+            with breaker.guard():
+                pass
+        time.sleep(0.02)
+        with breaker.guard():
+            pass
+        self.assertFalse(breaker.is_open)
+
+    def test_non_failure_error_closes_breaker(self):
+        breaker = self.open_breaker()
+        breaker.is_failure = lambda exception: not isinstance(exception, ValueError)
+        with self.assertRaises(ValueError):
+            with breaker.guard():
+                raise ValueError
+        self.assertFalse(breaker.is_open)
+
+
+if __name__ == "__main__":
+    unittest.main()
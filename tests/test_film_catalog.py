@@ -0,0 +1,74 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pymysql.cursors
+from benchmarks.sqlite_sakila import SQLiteConnection, build_database
+from film_catalog import FilmCatalog, _like_to_regex
+from film_record import to_records
+from search_api import TITLE_QUERY
+
+LATER_UPDATE = '2030-01-01 00:00:00'
+
+
+class FilmCatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = build_database(os.path.join(self.directory, "sakila.sqlite3"), 300)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("UPDATE film SET release_year = NULL WHERE film_id % 10 = 0")
+            conn.execute("UPDATE film SET title = 'ACE_GOLDFINGER 100%' WHERE film_id = 7")
+        self.connection = SQLiteConnection(self.path)
+        self.addCleanup(self.connection.close)
+        self.catalog = FilmCatalog(refresh_interval=0)
+        with self.connection.cursor() as cursor:
+            self.catalog.load(cursor)
+
+    def sql_search(self, keyword):
+        with self.connection.cursor(pymysql.cursors.Cursor) as cursor:
+            cursor.execute(TITLE_QUERY, (f"%{keyword}%",))
+            return to_records(cursor.fetchall())
+
+    def execute(self, query, args=()):
+        with self.connection.cursor() as cursor:
+            cursor.execute(query, args)
+        self.connection.commit()
+
+    def test_matches_sql_like(self):
+        # В SQLite LIKE без ESCAPE не знает '\\', поэтому экранирование проверяется отдельно
+        for keyword in ("ace", "ACE", "a", "", "zz", "gold finger", "e%r", "a_e", "100%", "_", "%"):
+            self.assertEqual(self.catalog.search_title(keyword), self.sql_search(keyword), keyword)
+
+    def test_like_escape(self):
+        self.assertTrue(_like_to_regex("ace\\_gold").fullmatch("ace_goldfinger 100%"))
+        self.assertFalse(_like_to_regex("ace\\_gold").fullmatch("acexgold"))
+        self.assertTrue(_like_to_regex("100\\%").fullmatch("ace_goldfinger 100%"))
+        self.assertFalse(_like_to_regex("100\\%").fullmatch("1000"))
+
+    def test_refresh_applies_changes_since_last_update(self):
+        self.execute("UPDATE film SET title = 'ZORRO QUUX', last_update = %s WHERE film_id = 3", (LATER_UPDATE,))
+        self.execute("INSERT INTO film VALUES (1001, 'QUUX NEW', NULL, 2001, 'G', %s)", (LATER_UPDATE,))
+        self.execute("INSERT INTO film_category VALUES (1001, 2, %s)", (LATER_UPDATE,))
+        with self.connection.cursor() as cursor:
+            self.catalog.refresh(cursor)
+        self.assertEqual({row.film_id for row in self.catalog.search_title("quux")}, {1001, 3})
+        self.assertEqual(self.catalog.search_title("quux"), self.sql_search("quux"))
+
+    def test_refresh_reloads_after_delete(self):
+        film_id = self.catalog.search_title("ace")[0].film_id
+        self.execute("DELETE FROM film_category WHERE film_id = %s", (film_id,))
+        self.execute("DELETE FROM film WHERE film_id = %s", (film_id,))
+        with self.connection.cursor() as cursor:
+            self.catalog.refresh(cursor)
+        self.assertEqual(self.catalog.search_title("ace"), self.sql_search("ace"))
+        self.assertNotIn(film_id, [row.film_id for row in self.catalog.search_title("ace")])
+
+
+if __name__ == "__main__":
+    unittest.main()
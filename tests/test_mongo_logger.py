@@ -0,0 +1,75 @@
+import os
+import sys
+import unittest
+from datetime import datetime
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mongo_logger
+from benchmarks.fake_mongo import FakeDatabase
+from config import MONGO_CONFIG
+from mongo_logger import last_unique_queries, log_query, popular_queries, query_fingerprint
+
+COLLECTIONS = {
+    'collection_name': 'logs',
+    'rollup_collection_name': 'logs_rollup',
+    'hourly_collection_name': 'logs_hourly',
+    'slow_collection_name': 'logs_slow',
+}
+
+
+class FingerprintTest(unittest.TestCase):
+    def test_case_whitespace_and_key_order_are_ignored(self):
+        self.assertEqual(
+            query_fingerprint("genre_year", {"genre": " Action", "year_from": 2000, "year_to": 2005}),
+            query_fingerprint("genre_year", {"year_to": 2005, "year_from": 2000, "genre": "ACTION "}),
+        )
+
+    def test_type_and_values_are_significant(self):
+        fingerprint = query_fingerprint("title", {"keyword": "ace"})
+        self.assertNotEqual(fingerprint, query_fingerprint("fulltext", {"query": "ace"}))
+        self.assertNotEqual(fingerprint, query_fingerprint("title", {"keyword": "ace gold"}))
+        self.assertNotEqual(query_fingerprint("pagination", {"page": 1}),
+                            query_fingerprint("pagination", {"page": "1"}))
+
+
+class QueryReportsTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(MONGO_CONFIG, COLLECTIONS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db = FakeDatabase()
+
+    def legacy_document(self, keyword, count=1):
+        # Записи, сделанные до появления отпечатков и сводки
+        for _ in range(count):
+            self.db['logs'].insert_one({"type": "title", "parameters": {"keyword": keyword}, "result_count": 1,
+                                        "duration_sec": 0.1, "timestamp": datetime.utcnow()})
+
+    def test_logged_variants_are_grouped(self):
+        for keyword in ("Ace", "ace ", "ACE"):
+            log_query(self.db, "title", {"keyword": keyword}, 3, 0.01)
+        log_query(self.db, "title", {"keyword": "gold"}, 1, 0.01)
+        self.assertEqual(len({doc["fingerprint"] for doc in self.db['logs'].find()}), 2)
+        self.assertEqual([entry["count"] for entry in popular_queries(self.db)], [3, 1])
+
+    def test_reports_keep_history_until_rollup_is_built(self):
+        for i in range(12):
+            self.legacy_document(f"k{i}", i + 1)
+        log_query(self.db, "title", {"keyword": "new"}, 1, 0.01)
+        self.assertEqual(popular_queries(self.db, 3)[0]["count"], 12)
+        self.assertEqual(len(popular_queries(self.db, 20)), 13)
+        self.assertEqual(len(last_unique_queries(self.db, 4)), 4)
+
+        mongo_logger.ensure_rollup(self.db)
+        self.assertEqual(mongo_logger.ensure_rollup(self.db), 0)
+        log_query(self.db, "title", {"keyword": "K11"}, 1, 0.01)
+        top = popular_queries(self.db, 3)
+        self.assertEqual([(entry["_id"]["parameters"]["keyword"].lower(), entry["count"]) for entry in top],
+                         [("k11", 13), ("k10", 11), ("k9", 10)])
+        self.assertEqual(len(last_unique_queries(self.db, 20)), 13)
+
+
+if __name__ == "__main__":
+    unittest.main()
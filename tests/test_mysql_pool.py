@@ -0,0 +1,136 @@
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mysql_connector import MySQLPool, PoolTimeoutError
+
+
+class FakeConnection:
+    """Соединение с интерфейсом pymysql.Connection в объёме, который использует пул."""
+
+    ids = 0
+
+    def __init__(self):
+        self.open = True
+        self.reconnect_on_ping = False
+        self.fail_ping = False
+        self.fail_rollback = False
+        self.new_thread_id()
+
+    def new_thread_id(self):
+        FakeConnection.ids += 1
+        self.server_thread_id = (FakeConnection.ids,)
+
+    def ping(self, reconnect=True):
+        if self.fail_ping:
+            raise ConnectionError("сервер недоступен")
+        if self.reconnect_on_ping:
+            self.new_thread_id()
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise ConnectionError("соединение потеряно")
+
+    def close(self):
+        self.open = False
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class MySQLPoolTest(unittest.TestCase):
+    def pool(self, **options):
+        pool = MySQLPool(connect=FakeConnection, **options)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_checkout_timeout(self):
+        pool = self.pool(max_size=1, checkout_timeout=0.05)
+        with pool.connection():
+            with self.assertRaises(PoolTimeoutError):
+                with pool.connection():
+                    pass
+        self.assertEqual(pool.snapshot()["timeouts"], 1)
+
+    def test_waiter_gets_released_connection(self):
+        pool = self.pool(max_size=1, checkout_timeout=5.0)
+        got = []
+
+        def wait_for_connection():
+            with pool.connection() as connection:
+                got.append(connection)
+
+        with pool.connection() as held:
+            worker = threading.Thread(target=wait_for_connection)
+            worker.start()
+            worker.join(0.1)  # даём потоку встать в ожидание
+            self.assertEqual(got, [])
+        worker.join(5.0)
+        self.assertEqual(got, [held])
+        self.assertEqual(pool.snapshot()["waits"], 1)
+
+    def test_ping_counts_reconnect(self):
+        pool = self.pool(max_size=1)
+        with pool.connection() as connection:
+            connection.reconnect_on_ping = True
+        with pool.connection() as again:
+            self.assertIs(again, connection)
+        self.assertEqual(pool.snapshot()["reconnects"], 1)
+
+    def test_failed_ping_discards_connection(self):
+        pool = self.pool(max_size=1)
+        with pool.connection() as connection:
+            connection.fail_ping = True
+        with self.assertRaises(ConnectionError):
+            with pool.connection():
+                pass
+        self.assertFalse(connection.open)
+        self.assertEqual(pool.snapshot()["size"], 0)
+        with pool.connection() as fresh:
+            self.assertIsNot(fresh, connection)
+
+    def test_idle_connections_above_min_size_are_closed(self):
+        clock = Clock()
+        with mock.patch("mysql_connector.time.monotonic", clock):
+            pool = self.pool(min_size=1, max_size=3, idle_timeout=10.0)
+            with pool.connection() as first, pool.connection() as second, pool.connection() as third:
+                pass
+            clock.now += 11
+            with pool.connection():
+                snapshot = pool.snapshot()
+        self.assertEqual((snapshot["size"], snapshot["idle_closed"]), (1, 2))
+        self.assertEqual(sum(not c.open for c in (first, second, third)), 2)
+
+    def test_broken_connections_are_discarded(self):
+        pool = self.pool(max_size=2)
+        with self.assertRaises(ConnectionError):
+            with pool.connection() as lost:
+                lost.open = False
+                raise ConnectionError("соединение потеряно")
+        with pool.connection() as dirty:
+            dirty.fail_rollback = True
+        snapshot = pool.snapshot()
+        self.assertEqual((snapshot["discarded"], snapshot["size"]), (2, 0))
+        self.assertFalse(dirty.open)
+
+    def test_error_inside_checkout_keeps_open_connection(self):
+        pool = self.pool(max_size=1)
+        with self.assertRaises(ValueError):
+            with pool.connection() as connection:
+                raise ValueError("ошибка запроса")
+        with pool.connection() as again:
+            self.assertIs(again, connection)
+        self.assertEqual(pool.snapshot()["discarded"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pymysql.cursors
+import pagination
+from benchmarks.sqlite_sakila import SQLiteConnection, build_database
+from mysql_connector import MySQLPool
+from pagination import FilmPager, fetch_page, row_key
+from result_cache import ResultCache
+
+
+class PaginationTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = build_database(os.path.join(cls.directory, "sakila.sqlite3"), 60)
+        with sqlite3.connect(cls.path) as conn:
+            # Фильмы без года и без жанра, которые раньше терялись или попадали в список
+            conn.execute("UPDATE film SET release_year = NULL WHERE film_id % 4 = 0")
+            conn.execute("DELETE FROM film_category WHERE film_id % 9 = 0")
+            cls.expected = [film_id for film_id, in conn.execute("""
+                SELECT film_id FROM film
+                WHERE EXISTS (SELECT 1 FROM film_category fc WHERE fc.film_id = film.film_id)
+                ORDER BY release_year, title, film_id
+            """)]
+        cls.pool = MySQLPool(min_size=1, max_size=2, connect=lambda: SQLiteConnection(cls.path))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+        shutil.rmtree(cls.directory)
+
+    def walk(self, page_size):
+        film_ids, after = [], None
+        with self.pool.cursor(pymysql.cursors.Cursor) as cursor:
+            while True:
+                rows = fetch_page(cursor, page_size, after)
+                film_ids.extend(row.film_id for row in rows)
+                if len(rows) < page_size:
+                    return film_ids
+                after = row_key(rows[-1])
+
+    def test_walk_includes_null_years_and_skips_films_without_genre(self):
+        self.assertIn(None, [row.release_year for row in self.pager(len(self.expected)).get_page(0)[0]])
+        for page_size in (1, 2, 3, 7, 10, len(self.expected), len(self.expected) + 1):
+            self.assertEqual(self.walk(page_size), self.expected, page_size)
+
+    def test_page_boundaries(self):
+        page_size = len(self.expected) // 2
+        pager = self.pager(page_size)
+        pages = [pager.get_page(page)[0] for page in range(4)]
+        self.assertEqual([row.film_id for row in pages[0] + pages[1]], self.expected[:2 * page_size])
+        self.assertEqual([row.film_id for row in pages[2]], self.expected[2 * page_size:])
+        self.assertEqual(pages[3], [])
+
+    def test_previous_page_is_served_from_memory(self):
+        pager = self.pager(5)
+        first, cached = pager.get_page(0)
+        self.assertFalse(cached)
+        pager.get_page(1)
+        with mock.patch.object(pagination, "fetch_page", wraps=fetch_page) as fetch:
+            rows, cached = pager.get_page(0)
+        self.assertTrue(cached)
+        self.assertIs(rows, first)
+        fetch.assert_not_called()
+
+    def test_pages_are_shared_through_result_cache(self):
+        cache = ResultCache()
+        self.pager(5, cache=cache).get_page(0)
+        with mock.patch.object(pagination, "fetch_page", wraps=fetch_page) as fetch:
+            rows, cached = self.pager(5, cache=cache).get_page(0)
+        self.assertTrue(cached)
+        self.assertEqual([row.film_id for row in rows], self.expected[:5])
+        fetch.assert_not_called()
+
+    def test_failed_prefetch_is_recorded_and_page_reloaded(self):
+        calls = []
+
+        def flaky_fetch(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise ConnectionError("соединение потеряно")
+            return fetch_page(*args, **kwargs)
+
+        pager = self.pager(5, prefetch=True)
+        with mock.patch.object(pagination, "fetch_page", side_effect=flaky_fetch), \
+                mock.patch("builtins.print") as output:
+            pager.get_page(0)
+            pager.prefetch(1)
+            rows, cached = pager.get_page(1)
+        self.assertEqual([row.film_id for row in rows], self.expected[5:10])
+        self.assertFalse(cached)
+        self.assertEqual(pager.stats, {"prefetched": 0, "prefetch_failed": 1})
+        self.assertIsInstance(pager.last_error, ConnectionError)
+        output.assert_not_called()
+
+    def pager(self, page_size, cache=None, prefetch=False):
+        pager = FilmPager(self.pool, page_size=page_size, prefetch=prefetch, cache=cache)
+        self.addCleanup(pager.close)
+        return pager
+
+
+if __name__ == "__main__":
+    unittest.main()
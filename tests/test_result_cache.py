@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_cache import ResultCache, estimate_size
+
+
+def rows(count):
+    return [{"film_id": i, "title": f"FILM {i}"} for i in range(count)]
+
+
+class ResultCacheTest(unittest.TestCase):
+    def test_keys_are_normalized(self):
+        cache = ResultCache()
+        cache.put("title", {"keyword": "Ace "}, rows(1))
+        self.assertEqual(cache.get("title", {"keyword": "ace"}), rows(1))
+        self.assertIsNone(cache.get("rating", {"keyword": "ace"}))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResultCache(max_entries=2)
+        cache.put("title", {"keyword": "a"}, rows(1))
+        cache.put("title", {"keyword": "b"}, rows(1))
+        cache.get("title", {"keyword": "a"})
+        cache.put("title", {"keyword": "c"}, rows(1))
+        self.assertIsNone(cache.get("title", {"keyword": "b"}))
+        self.assertIsNotNone(cache.get("title", {"keyword": "a"}))
+        self.assertIsNotNone(cache.get("title", {"keyword": "c"}))
+        self.assertEqual(cache.snapshot()["evictions"], 1)
+
+    def test_byte_bound(self):
+        size = estimate_size(rows(10))
+        cache = ResultCache(max_bytes=size * 2)
+        for keyword in "abc":
+            cache.put("title", {"keyword": keyword}, rows(10))
+        snapshot = cache.snapshot()
+        self.assertEqual(snapshot["entries"], 2)
+        self.assertLessEqual(snapshot["bytes"], cache.max_bytes)
+        self.assertIsNone(cache.get("title", {"keyword": "a"}))
+
+        # Результат больше всего кэша не сохраняется и не вытесняет остальные
+        cache.put("title", {"keyword": "big"}, rows(100))
+        self.assertIsNone(cache.get("title", {"keyword": "big"}))
+        self.assertEqual(cache.snapshot()["entries"], 2)
+
+    def test_ttl_per_query_type(self):
+        cache = ResultCache(ttl={"pagination": 10.0, "rating": 0}, default_ttl=100.0)
+        with mock.patch("result_cache.time.monotonic", return_value=1000.0):
+            cache.put("pagination", {"page": 1}, rows(1))
+            cache.put("title", {"keyword": "a"}, rows(1))
+            cache.put("rating", {"rating": "G"}, rows(1))
+        self.assertIsNone(cache.get("rating", {"rating": "G"}))
+        with mock.patch("result_cache.time.monotonic", return_value=1011.0):
+            self.assertIsNone(cache.get("pagination", {"page": 1}))
+            self.assertIsNotNone(cache.get("title", {"keyword": "a"}))
+        with mock.patch("result_cache.time.monotonic", return_value=1101.0):
+            self.assertIsNone(cache.get("title", {"keyword": "a"}))
+        snapshot = cache.snapshot()
+        self.assertEqual((snapshot["expired"], snapshot["entries"], snapshot["bytes"]), (2, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
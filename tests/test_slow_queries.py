@@ -0,0 +1,94 @@
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_mongo import FakeDatabase
+from config import MONGO_CONFIG
+from slow_queries import regressions, summarize_plan
+
+NOW = datetime(2026, 10, 1, 12, 0)
+
+PLAN = {"query_block": {
+    "select_id": 1,
+    "cost_info": {"query_cost": "1250.40"},
+    "grouping_operation": {
+        "using_temporary_table": True,
+        "using_filesort": True,
+        "nested_loop": [
+            {"table": {"table_name": "f", "access_type": "ALL", "rows_examined_per_scan": 1000}},
+            {"table": {"table_name": "fc", "access_type": "ref", "key": "PRIMARY", "rows_examined_per_scan": 1}},
+        ],
+    },
+}}
+
+
+class SummarizePlanTest(unittest.TestCase):
+    def test_shape_rows_and_cost(self):
+        summary = summarize_plan(PLAN)
+        self.assertEqual(summary["plan_shape"], "f:ALL → fc:ref(PRIMARY) +filesort +temporary")
+        self.assertEqual(summary["rows_examined"], 1001)
+        self.assertEqual(summary["query_cost"], 1250.4)
+        self.assertEqual(len(summary["plan_hash"]), 12)
+
+    def test_same_shape_same_hash(self):
+        other = {"query_block": {"table": {"table_name": "f", "access_type": "ALL", "rows_examined_per_scan": 5}}}
+        self.assertNotEqual(summarize_plan(PLAN)["plan_hash"], summarize_plan(other)["plan_hash"])
+        self.assertEqual(summarize_plan(other)["plan_hash"],
+                         summarize_plan({"query_block": {"table": {**other["query_block"]["table"],
+                                                                   "rows_examined_per_scan": 50}}})["plan_hash"])
+        self.assertIsNone(summarize_plan(other)["query_cost"])
+
+
+class RegressionsTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(MONGO_CONFIG, {'slow_collection_name': 'logs_slow'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db = FakeDatabase()
+
+    def slow(self, query_type, days_ago, duration, plan_hash="a"):
+        self.db['logs_slow'].insert_one({
+            "type": query_type, "plan_hash": plan_hash, "plan_shape": f"plan {plan_hash}",
+            "duration_sec": duration, "timestamp": NOW - timedelta(days=days_ago),
+        })
+
+    def by_type(self, **options):
+        return {entry["type"]: entry for entry in regressions(self.db, now=NOW, **options)}
+
+    def test_types_without_baseline_are_not_regressions(self):
+        self.slow("title", 1, 0.5)
+        self.slow("rating", 2, 0.5)
+        for entry in self.by_type().values():
+            self.assertFalse(entry["regressed"])
+            self.assertTrue(entry["no_baseline"])
+        self.slow("title", 20, 0.5)
+        entry = self.by_type(days=7, recent_days=7)["title"]
+        self.assertEqual((entry["regressed"], entry["no_baseline"]), (False, True))
+
+    def test_slower_more_frequent_or_new_plan(self):
+        for days_ago in (10, 20):
+            self.slow("title", days_ago, 0.5)
+            self.slow("rating", days_ago, 0.5)
+            self.slow("genre_year", days_ago, 0.5)
+            self.slow("fulltext", days_ago, 0.5)
+        self.slow("title", 1, 2.0)                      # вдвое медленнее в среднем
+        self.slow("rating", 1, 0.5, plan_hash="b")      # новый план
+        for _ in range(5):
+            self.slow("genre_year", 1, 0.5)             # чаще
+        self.slow("fulltext", 1, 0.5)                   # как раньше
+        report = self.by_type()
+        self.assertTrue(report["title"]["regressed"])
+        self.assertTrue(report["rating"]["regressed"])
+        self.assertEqual(report["rating"]["new_plans"], ["plan b"])
+        self.assertTrue(report["genre_year"]["regressed"])
+        self.assertFalse(report["fulltext"]["regressed"])
+        self.assertFalse(any(entry["no_baseline"] for entry in report.values()))
+        self.assertEqual(regressions(self.db, now=NOW)[-1]["type"], "fulltext")
+
+
+if __name__ == "__main__":
+    unittest.main()